@@ -0,0 +1,289 @@
+from __future__ import annotations
+
+import json
+import re
+import shutil
+import subprocess
+import threading
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.harness import Result, measure
+from benchmarks.synthetic import make_segments, vocabulary, write_file, write_search_files, write_wav
+from book_sync import catalog
+from book_sync.config import DATA_DIR, Settings
+from book_sync.convert import convert_to_wav
+from book_sync.download import download_audio
+from book_sync.index import tokenize
+from book_sync.mel import N_FFT, N_SAMPLES, WINDOW_SECONDS, log_mel_batch
+from book_sync.pipeline import list_books
+from book_sync.search import search_book
+from book_sync.segments import load_segments_file, save_segments_file
+from book_sync.segstore import store_path, write_segment_store
+from book_sync.transcribe import transcribe_audio, write_transcript
+
+
+@dataclass
+class Params:
+    workdir: Path
+    sizes: list[int]  # segments per synthetic book
+    books: list[int]  # library sizes for the catalog cases
+    audio_minutes: float
+    download_mb: int
+    repeats: int
+
+
+def _repeats(params: Params, size: int) -> int:
+    """Fewer samples for the big books, whose calls take seconds."""
+    return params.repeats if size < 100_000 else max(1, params.repeats // 3)
+
+
+def _book(params: Params, size: int) -> Path:
+    """A finished synthetic book of ``size`` segments, generated once per run."""
+    path = params.workdir / f"book-{size}"
+    if not (path / "segments.json").exists():
+        path.mkdir(parents=True, exist_ok=True)
+        save_segments_file(make_segments(size), path / "segments.json")
+    return path
+
+
+def _remove(book: Path, *names: str) -> None:
+    for name in names:
+        (book / name).unlink(missing_ok=True)
+
+
+def _queries(book: Path) -> dict[str, str]:
+    sf = load_segments_file(book / "segments.json")
+    middle = tokenize(sf.segments[len(sf.segments) // 2].text)
+    phrase = " ".join(middle[:3])
+    # One edit per word, the kind of typo fuzzy search is for
+    typo = " ".join(w[:-1] + ("x" if w[-1] != "x" else "y") for w in middle[:3])
+    return {"phrase": phrase, "common": vocabulary()[0], "typo": typo}
+
+
+def bench_search(params: Params) -> Iterator[Result]:
+    for size in params.sizes:
+        book = _book(params, size)
+        queries = _queries(book)
+        repeats = _repeats(params, size)
+
+        def cold() -> None:
+            _remove(book, "segments.bin", "index.bin", "trigrams.bin")
+
+        yield measure(
+            f"search_book.cold/{size}",
+            lambda: list(search_book(book, queries["phrase"], limit=50)),
+            repeats, setup=cold,
+        )
+        write_search_files(book)  # searches never write them; the other cases read them
+        for case, query, kwargs in (
+            ("phrase", queries["phrase"], {}),
+            ("common", queries["common"], {}),
+            ("substring", queries["phrase"], {"substring": True}),
+            ("fuzzy", queries["typo"], {"fuzzy": True}),
+        ):
+            yield measure(
+                f"search_book.{case}/{size}",
+                partial(lambda q, kw: list(search_book(book, q, limit=50, **kw)), query, kwargs),
+                repeats,
+            )
+
+
+def bench_segments(params: Params) -> Iterator[Result]:
+    for size in params.sizes:
+        book = _book(params, size)
+        path = book / "segments.json"
+        repeats = _repeats(params, size)
+        nbytes = path.stat().st_size
+        _remove(book, "segments.bin")
+        sf = load_segments_file(path)  # a plain list, for write_transcript.list
+        segments = {"segments": size}
+
+        yield measure(
+            f"load_segments_file.json/{size}",
+            lambda: load_segments_file(path),
+            repeats, setup=lambda: _remove(book, "segments.bin"), work={**segments, "bytes": nbytes},
+        )
+        write_segment_store(sf, store_path(path), source=path)
+        yield measure(
+            f"load_segments_file.store/{size}",
+            lambda: load_segments_file(path),
+            repeats, work=segments,
+        )
+        out = params.workdir / f"save-{size}"
+        out.mkdir(exist_ok=True)
+        yield measure(
+            f"save_segments_file/{size}",
+            lambda: save_segments_file(sf, out / "segments.json"),
+            repeats, work={**segments, "bytes": nbytes},
+        )
+        store_sf = load_segments_file(path)
+        for kind, source in (("list", sf), ("store", store_sf)):
+            yield measure(
+                f"write_transcript.{kind}/{size}",
+                lambda source=source: write_transcript(source, out),
+                repeats, work=segments,
+            )
+
+
+def _add_books(start: int, stop: int) -> None:
+    for i in range(start, stop):
+        book = DATA_DIR / f"Book {i:06d}"
+        book.mkdir(parents=True, exist_ok=True)
+        (book / "feed.json").write_text(json.dumps({
+            "title": book.name, "audio_url": f"http://example.invalid/{i}.m4b", "duration_seconds": 36000.0,
+        }))
+        stage = "done" if i % 4 else "transcribing"
+        (book / "state.json").write_text(json.dumps({"stage": stage, "last_segment": 9000, "checksums": {}}))
+
+
+def bench_catalog(params: Params) -> Iterator[Result]:
+    have = 0
+    for count in sorted(params.books):
+        _add_books(have, count)
+        have = count
+        yield measure(f"catalog.rebuild/{count}", catalog.rebuild, params.repeats, work={"books": count})
+        yield measure(f"list_books/{count}", list_books, params.repeats, work={"books": count})
+
+
+class _RangeHandler(SimpleHTTPRequestHandler):
+    """Static files with single-range requests, like an Audiobookshelf server."""
+
+    def send_head(self):
+        m = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if not m:
+            return super().send_head()
+        path = Path(self.translate_path(self.path))
+        size = path.stat().st_size
+        start = int(m.group(1))
+        end = min(int(m.group(2)) if m.group(2) else size - 1, size - 1)
+        if start >= size:
+            self.send_error(416)
+            return None
+        f = open(path, "rb")
+        f.seek(start)
+        self.send_response(206)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        self._remaining = end - start + 1
+        return f
+
+    def copyfile(self, source, outputfile) -> None:
+        remaining = getattr(self, "_remaining", None)
+        if remaining is None:
+            return super().copyfile(source, outputfile)
+        while remaining:
+            chunk = source.read(min(remaining, 1 << 20))
+            if not chunk:
+                break
+            outputfile.write(chunk)
+            remaining -= len(chunk)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def bench_download(params: Params) -> Iterator[Result]:
+    root = params.workdir / "www"
+    root.mkdir(exist_ok=True)
+    size = params.download_mb << 20
+    write_file(root / "book.m4b", size)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(_RangeHandler, directory=str(root)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/book.m4b"
+    dest = params.workdir / "download" / "book.m4b"
+
+    def fresh() -> None:
+        shutil.rmtree(dest.parent, ignore_errors=True)
+
+    try:
+        for connections in (1, 4):
+            yield measure(
+                f"download_audio.c{connections}/{params.download_mb}MB",
+                lambda: download_audio(url, dest, connections),
+                params.repeats, setup=fresh, work={"bytes": size},
+            )
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def _speech_wav(params: Params) -> Path:
+    wav = params.workdir / "speech.wav"
+    if not wav.exists():
+        write_wav(wav, params.audio_minutes * 60)
+    return wav
+
+
+def bench_convert(params: Params) -> Iterator[Result]:
+    """Decoding an MP3 of the synthetic audio, in one ffmpeg process and as parallel time ranges."""
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        return  # nothing to measure without ffmpeg
+    mp3 = params.workdir / "speech.mp3"
+    if not mp3.exists():
+        cmd = [ffmpeg, "-nostdin", "-v", "error", "-i", str(_speech_wav(params)), "-b:a", "64k", str(mp3)]
+        subprocess.run(cmd, check=True)
+    out = params.workdir / "convert" / "book.wav"
+    seconds = params.audio_minutes * 60
+
+    def fresh() -> None:
+        out.unlink(missing_ok=True)
+
+    for workers in (1, 4):
+        settings = Settings(ffmpeg_path=ffmpeg, convert_workers=workers)
+        yield measure(
+            f"convert_to_wav.w{workers}/{params.audio_minutes:g}min",
+            lambda settings=settings: convert_to_wav(mp3, out, settings),
+            max(1, params.repeats // 2), setup=fresh, work={"audio_seconds": seconds},
+        )
+
+
+def bench_transcribe(params: Params) -> Iterator[Result]:
+    wav = _speech_wav(params)
+    seconds = params.audio_minutes * 60
+    book = params.workdir / "transcribe"
+
+    def fresh() -> None:
+        shutil.rmtree(book, ignore_errors=True)
+        book.mkdir()
+
+    for name, settings in (
+        ("stub", Settings(backend="stub", workers=1)),
+        ("stub_novad", Settings(backend="stub", workers=1, vad=False)),
+        ("stub_batch8", Settings(backend="stub", workers=1, batch_size=8)),
+    ):
+        yield measure(
+            f"transcribe_audio.{name}/{params.audio_minutes:g}min",
+            lambda settings=settings: transcribe_audio(wav, book, settings),
+            max(1, params.repeats // 2), setup=fresh, work={"audio_seconds": seconds},
+        )
+
+    # Feature extraction for batched decoding, with a large-v3 sized filterbank
+    rng = np.random.default_rng(0)
+    filters = np.abs(rng.standard_normal((128, N_FFT // 2 + 1))).astype(np.float32)
+    for batch in (1, 8):
+        windows = rng.standard_normal((batch, N_SAMPLES)).astype(np.float32)
+        yield measure(
+            f"log_mel_batch/{batch}",
+            partial(log_mel_batch, windows, filters),
+            params.repeats, work={"audio_seconds": batch * WINDOW_SECONDS},
+        )
+
+
+CASES: dict[str, Callable[[Params], Iterator[Result]]] = {
+    "search": bench_search,
+    "segments": bench_segments,
+    "catalog": bench_catalog,
+    "download": bench_download,
+    "convert": bench_convert,
+    "transcribe": bench_transcribe,
+}
+
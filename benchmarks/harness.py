@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import fnmatch
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from collections.abc import Callable
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import TextIO
+
+
+MIN_SAMPLE_SECONDS = 0.05  # fast operations are looped until one sample takes this long
+
+
+@dataclass
+class Result:
+    name: str  # "<case>/<size>", the key baselines are matched on
+    seconds: float  # median per call
+    min_seconds: float
+    samples: int
+    peak_bytes: int | None = None  # peak Python heap (tracemalloc) during one call
+    rates: dict[str, float] = field(default_factory=dict)  # throughput, per second of the median call
+
+
+def _loops(fn: Callable[[], object]) -> int:
+    """Calls per sample, doubling until a sample lasts ``MIN_SAMPLE_SECONDS``."""
+    loops = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        if time.perf_counter() - t0 >= MIN_SAMPLE_SECONDS or loops >= 1 << 16:
+            return loops
+        loops *= 2
+
+
+def measure(
+    name: str,
+    fn: Callable[[], object],
+    repeats: int = 5,
+    setup: Callable[[], object] | None = None,
+    work: dict[str, float] | None = None,
+    memory: bool = True,
+) -> Result:
+    """Time ``fn`` and record its peak Python allocation.
+
+    With ``setup`` (run untimed before every call, e.g. to delete caches)
+    each sample is a single call; otherwise fast calls are looped. ``work``
+    maps a unit ("segments", "bytes") to how much one call processes, and
+    becomes a per-second rate.
+    """
+    if setup is None:
+        loops = _loops(fn)
+    else:
+        loops = 1
+    times = []
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        times.append((time.perf_counter() - t0) / loops)
+
+    peak = None
+    if memory:
+        if setup is not None:
+            setup()
+        tracemalloc.start()
+        try:
+            fn()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    median = statistics.median(times)
+    rates = {f"{unit}_per_second": amount / median for unit, amount in (work or {}).items() if median > 0}
+    return Result(name, median, min(times), repeats * loops, peak, rates)
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=Path(__file__).parent
+        ).stdout.strip()
+    except FileNotFoundError:
+        commit = ""
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def save_results(path: Path, results: list[Result], params: dict, extra: dict | None = None) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = {"environment": environment(), "params": params, **(extra or {})}
+    data["results"] = {r.name: asdict(r) for r in results}
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(data, indent=2))
+    tmp.rename(path)
+
+
+def load_results(path: Path) -> dict:
+    return json.loads(path.read_text())
+
+
+def _threshold(name: str, default: float, overrides: dict[str, float]) -> float:
+    """The most specific override whose glob matches ``name``, else the default."""
+    matches = [pattern for pattern in overrides if fnmatch.fnmatchcase(name, pattern)]
+    return overrides[max(matches, key=len)] if matches else default
+
+
+def compare(
+    results: list[Result],
+    baseline: dict,
+    threshold: float,
+    memory_threshold: float,
+) -> list[str]:
+    """Print each result against the baseline; return descriptions of the regressions.
+
+    A result regresses when its median time (or peak memory) exceeds the
+    baseline's by more than the threshold fraction. The baseline file can
+    hold ``"thresholds"`` and ``"memory_thresholds"`` maps of name globs to
+    fractions, for cases noisier than the rest.
+    """
+    base = baseline.get("results", {})
+    overrides = baseline.get("thresholds", {})
+    memory_overrides = baseline.get("memory_thresholds", {})
+    regressions = []
+    print(f"{'benchmark':<40} {'baseline':>11} {'current':>11} {'change':>8}")
+    for r in results:
+        old = base.get(r.name)
+        if old is None:
+            print(f"{r.name:<40} {'-':>11} {_duration(r.seconds):>11} {'new':>8}")
+            continue
+        change = r.seconds / old["seconds"] - 1 if old["seconds"] else 0.0
+        limit = _threshold(r.name, threshold, overrides)
+        flag = ""
+        if change > limit:
+            flag = "  REGRESSION"
+            regressions.append(f"{r.name}: {change:+.0%} time (limit {limit:+.0%})")
+        print(f"{r.name:<40} {_duration(old['seconds']):>11} {_duration(r.seconds):>11} {change:>+8.0%}{flag}")
+        if r.peak_bytes and old.get("peak_bytes"):
+            mem_change = r.peak_bytes / old["peak_bytes"] - 1
+            mem_limit = _threshold(r.name, memory_threshold, memory_overrides)
+            if mem_change > mem_limit:
+                regressions.append(
+                    f"{r.name}: {mem_change:+.0%} peak memory "
+                    f"({old['peak_bytes']} -> {r.peak_bytes} bytes, limit {mem_limit:+.0%})"
+                )
+    return regressions
+
+
+def _duration(seconds: float) -> str:
+    if seconds >= 1:
+        return f"{seconds:.2f} s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds * 1e6:.1f} us"
+
+
+def print_result(r: Result, file: TextIO | None = None) -> None:
+    mem = f"  peak {r.peak_bytes / (1 << 20):8.1f} MB" if r.peak_bytes is not None else ""
+    rates = "".join(f"  {v:,.0f} {k.replace('_per_second', '/s')}" for k, v in r.rates.items())
+    print(f"{r.name:<40} {_duration(r.seconds):>11}{mem}{rates}", file=file, flush=True)
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent.parent
+BUDGET_MS = 100.0
+# Modules a read-only command must never load
+FORBIDDEN = ("mlx_whisper", "faster_whisper", "torch", "feedparser", "httpx")
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+@dataclass
+class Imports:
+    total_us: int  # cumulative time of the command's own top-level imports
+    modules: dict[str, int]  # every module imported -> cumulative microseconds
+    top: list[tuple[str, int]]  # top-level imports, heaviest first
+
+
+def parse_importtime(stderr: str, skip: set[str] = frozenset()) -> Imports:
+    """Read ``-X importtime`` output; top-level modules in ``skip`` don't count."""
+    modules: dict[str, int] = {}
+    top = []
+    for line in stderr.splitlines():
+        m = _LINE.match(line)
+        if not m:
+            continue
+        cumulative, indent, name = int(m.group(2)), len(m.group(3)), m.group(4)
+        modules[name] = cumulative
+        if indent == 0 and name not in skip:
+            top.append((name, cumulative))
+    top.sort(key=lambda item: -item[1])
+    return Imports(sum(us for _, us in top), modules, top)
+
+
+def _importtime(args: list[str], env: dict[str, str]) -> str:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", *args], cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    return proc.stderr
+
+
+def interpreter_modules(env: dict[str, str]) -> set[str]:
+    """Top-level modules Python imports before running anything (site, encodings, ...)."""
+    return {name for name, _ in parse_importtime(_importtime(["-c", "pass"], env)).top}
+
+
+def command_imports(command: list[str], env: dict[str, str], runs: int = 5) -> Imports:
+    """The fastest of ``runs`` timings of ``cli.py <command>``, minus interpreter startup."""
+    skip = interpreter_modules(env)
+    return min(
+        (parse_importtime(_importtime(["cli.py", *command], env), skip) for _ in range(runs)),
+        key=lambda imports: imports.total_us,
+    )
+
+
+def make_library(data_dir: Path, segments: int = 1_000) -> str:
+    """A one-book library with a finished transcript and its search files; returns a phrase that occurs in it."""
+    from benchmarks.synthetic import make_segments, write_search_files
+    from book_sync.segments import save_segments_file
+
+    book = data_dir / "Synthetic Book"
+    book.mkdir(parents=True)
+    sf = make_segments(segments)
+    save_segments_file(sf, book / "segments.json")
+    write_search_files(book)
+    (book / "feed.json").write_text('{"title": "Synthetic Book", "audio_url": "http://example.invalid/a.m4b"}')
+    (book / "state.json").write_text(f'{{"stage": "done", "last_segment": {segments}, "checksums": {{}}}}')
+    return " ".join(sf.segments[segments // 2].text.rstrip(".").lower().split()[:2])
+
+
+def read_only_commands(data_dir: Path, env: dict[str, str]) -> dict[str, list[str]]:
+    """Make a library in ``data_dir`` and return the commands to time, by name.
+
+    The catalog is built first and the library comes with its search files,
+    so the timed runs only read them.
+    """
+    phrase = make_library(data_dir)
+    subprocess.run([sys.executable, "cli.py", "rebuild"], cwd=ROOT, env=env, capture_output=True, check=True)
+    return {"list": ["list"], "status": ["status"], "search": ["search", phrase]}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.importtime",
+        description="Check that the read-only commands start within their import-time budget",
+    )
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS, help="Allowed import time per command")
+    parser.add_argument("--runs", type=int, default=5, help="Timings per command (the fastest counts)")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="book-sync-importtime-"))
+    env = {**os.environ, "BOOK_SYNC_DATA": str(workdir / "data")}
+    try:
+        commands = read_only_commands(workdir / "data", env)
+        failed = False
+        for name, command in commands.items():
+            imports = command_imports(command, env, args.runs)
+            over = imports.total_us / 1e3 > args.budget_ms
+            forbidden = [m for m in FORBIDDEN if m in imports.modules]
+            verdict = "FAIL" if over or forbidden else "ok"
+            print(f"{name:<8} {imports.total_us / 1e3:7.1f} ms  (budget {args.budget_ms:g} ms)  {verdict}")
+            if forbidden:
+                print(f"         imports {', '.join(forbidden)}")
+            if over or forbidden:
+                for module, us in imports.top[:8]:
+                    print(f"         {us / 1e3:7.1f} ms  {module}")
+            failed = failed or over or bool(forbidden)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+from contextlib import redirect_stdout
+from datetime import datetime
+from pathlib import Path
+
+
+BENCH_DIR = Path(__file__).resolve().parent
+DEFAULT_BASELINE = BENCH_DIR / "baseline.json"
+RESULTS_DIR = BENCH_DIR / "results"
+
+
+def _sizes(value: str) -> list[int]:
+    return [int(float(v)) for v in value.split(",") if v]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.run",
+        description="Benchmark book-sync on synthetic books and compare against a baseline",
+    )
+    parser.add_argument("--only", action="append", default=[], help="Only these case groups (repeatable)")
+    parser.add_argument("--sizes", type=_sizes, default=[1_000, 10_000, 100_000, 1_000_000], help="Segments per book")
+    parser.add_argument("--books", type=_sizes, default=[100, 1_000, 10_000], help="Library sizes for catalog cases")
+    parser.add_argument("--audio-minutes", type=float, default=60, help="Length of the synthetic WAV")
+    parser.add_argument("--download-mb", type=int, default=256, help="Size of the file to download")
+    parser.add_argument("--repeats", type=int, default=5, help="Timed samples per case")
+    parser.add_argument("--quick", action="store_true", help="Small sizes, for a fast smoke run")
+    parser.add_argument("--output", type=Path, help="Results file (default benchmarks/results/<time>.json)")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="Baseline results to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown, as a fraction")
+    parser.add_argument("--memory-threshold", type=float, default=0.25, help="Allowed peak memory growth")
+    parser.add_argument("--workdir", type=Path, help="Keep generated books here instead of a temp dir")
+    args = parser.parse_args()
+    if args.quick:
+        args.sizes, args.books, args.audio_minutes, args.download_mb = [1_000, 10_000], [100, 1_000], 5, 32
+
+    workdir = args.workdir or Path(tempfile.mkdtemp(prefix="book-sync-bench-"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    # Must be set before book_sync is imported: the library lives under the work dir
+    os.environ["BOOK_SYNC_DATA"] = str(workdir / "data")
+    from benchmarks.cases import CASES, Params
+    from benchmarks.harness import compare, load_results, print_result, save_results
+
+    unknown = set(args.only) - set(CASES)
+    if unknown:
+        parser.error(f"unknown case group(s): {', '.join(sorted(unknown))} (choose from {', '.join(CASES)})")
+
+    params = Params(workdir, args.sizes, args.books, args.audio_minutes, args.download_mb, args.repeats)
+    results = []
+    out = sys.stdout
+    try:
+        for group, case in CASES.items():
+            if args.only and group not in args.only:
+                continue
+            # The pipeline's progress lines would bury the results
+            with open(os.devnull, "w") as null, redirect_stdout(null):
+                for result in case(params):
+                    print_result(result, file=out)
+                    results.append(result)
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output = args.output or RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    recorded = {k: v for k, v in vars(args).items() if k not in ("output", "baseline", "workdir", "save_baseline")}
+    save_results(output, results, recorded)
+    print(f"Results written to {output}")
+
+    if args.save_baseline:
+        # Hand-tuned per-case thresholds survive re-recording the numbers
+        old = load_results(args.baseline) if args.baseline.exists() else {}
+        keep = {k: old[k] for k in ("thresholds", "memory_thresholds") if k in old}
+        save_results(args.baseline, results, recorded, keep)
+        print(f"Baseline written to {args.baseline}")
+        return
+    if not args.baseline.exists():
+        print("No baseline to compare with (store one with --save-baseline)")
+        return
+    print()
+    regressions = compare(results, load_results(args.baseline), args.threshold, args.memory_threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s):")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print("\nNo regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+
+from book_sync.fuzzy import TrigramIndex, trigram_path
+from book_sync.index import build_index
+from book_sync.models import SegmentEntry, SegmentsFile
+from book_sync.segments import load_segments_file
+from book_sync.segstore import store_path, write_segment_store
+from book_sync.wav import WavWriter
+
+
+VOCAB_SIZE = 20_000
+SEGMENT_SECONDS = 4.0
+_SYLLABLES = [c + v for c in "bdfghklmnprstvwz" for v in ("a", "e", "i", "o", "u", "ai", "ou")]
+
+
+def vocabulary(seed: int = 0) -> list[str]:
+    """Pronounceable made-up words; index 0 is the most frequent once sampled with Zipf."""
+    rng = np.random.default_rng(seed)
+    words = set()
+    out = []
+    while len(out) < VOCAB_SIZE:
+        n = int(rng.integers(1, 4))
+        word = "".join(_SYLLABLES[i] for i in rng.integers(0, len(_SYLLABLES), n))
+        if word not in words:
+            words.add(word)
+            out.append(word)
+    return out
+
+
+def make_segments(count: int, seed: int = 0) -> SegmentsFile:
+    """``count`` segments of 6-20 Zipf-distributed words, about four seconds each."""
+    rng = np.random.default_rng(seed)
+    vocab = np.array(vocabulary(seed), dtype=object)
+    lengths = rng.integers(6, 21, count)
+    ranks = np.minimum(rng.zipf(1.3, int(lengths.sum())), VOCAB_SIZE) - 1
+    words = vocab[ranks]
+    bounds = np.concatenate(([0], np.cumsum(lengths)))
+    starts = np.arange(count) * SEGMENT_SECONDS
+    segments = []
+    for i in range(count):
+        text = " ".join(words[bounds[i] : bounds[i + 1]])
+        segments.append(SegmentEntry(start=float(starts[i]), end=float(starts[i] + SEGMENT_SECONDS), text=text.capitalize() + "."))
+    return SegmentsFile(
+        model="synthetic",
+        audio_file="book.wav",
+        created_at="2000-01-01T00:00:00+00:00",
+        segments=segments,
+        transcribed_until=count * SEGMENT_SECONDS,
+    )
+
+
+def write_search_files(book: Path) -> None:
+    """Write segments.bin, index.bin and trigrams.bin for a book's segments.json.
+
+    Transcription writes these when it finishes; searches only read them.
+    """
+    path = book / "segments.json"
+    sf = load_segments_file(path)
+    texts = [s.text for s in sf.segments]
+    write_segment_store(sf, store_path(path), source=path)
+    build_index(book, sf.created_at, texts)
+    TrigramIndex.build(sf.created_at, texts).save(trigram_path(book))
+
+
+def write_wav(path: Path, seconds: float, sample_rate: int = 16000, seed: int = 0) -> Path:
+    """Noise bursts of 1-8 s separated by 0.2-4 s of near-silence, so VAD has pauses to find."""
+    rng = np.random.default_rng(seed)
+    writer = WavWriter(path, sample_rate)
+    total = int(seconds * sample_rate)
+    written = 0
+    speech = True
+    while written < total:
+        length = rng.uniform(1.0, 8.0) if speech else rng.uniform(0.2, 4.0)
+        n = min(int(length * sample_rate), total - written)
+        amplitude = 6000 if speech else 30
+        samples = (rng.standard_normal(n) * amplitude).clip(-32768, 32767).astype("<i2")
+        writer.write(samples.tobytes())
+        written += n
+        speech = not speech
+    writer.close()
+    return path
+
+
+def write_file(path: Path, size: int, seed: int = 0) -> Path:
+    """``size`` random bytes, written a block at a time."""
+    rng = np.random.default_rng(seed)
+    with open(path, "wb") as f:
+        left = size
+        while left:
+            n = min(left, 1 << 24)
+            f.write(rng.integers(0, 256, n, dtype=np.uint8).tobytes())
+            left -= n
+    return path
@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import os
+from collections.abc import Sequence
+from typing import Protocol
+
+import numpy as np
+
+from book_sync.config import Settings
+from book_sync.mel import TIME_PRECISION, log_mel_batch
+
+
+STUB_SEGMENT_SECONDS = 10.0
+MAX_DECODE_TOKENS = 448  # Whisper's text context
+
+
+class Backend(Protocol):
+    batch_size: int  # windows per transcribe_batch call; 1 = transcribe() decodes sequentially
+
+    def transcribe(self, audio: np.ndarray) -> list[dict]:
+        """Transcribe 16 kHz float32 audio into ``{"start", "end", "text"}`` dicts.
+
+        Times are relative to the start of ``audio``.
+        """
+        ...
+
+    def transcribe_batch(self, windows: np.ndarray, durations: Sequence[float]) -> list[list[dict]]:
+        """Transcribe a ``(batch, N_SAMPLES)`` array of zero-padded windows of at most 30 s.
+
+        ``durations`` are the windows' lengths before padding; times in each
+        list are relative to the start of its window.
+        """
+        ...
+
+
+def timestamped_segments(tokens: Sequence[int], tokenizer, duration: float) -> list[dict]:
+    """Split one window's decoded tokens into segments at its timestamp tokens.
+
+    Segments starting in the zero padding past ``duration`` are dropped.
+    """
+    begin = tokenizer.timestamp_begin
+    segments = []
+    start = None
+    text: list[int] = []
+    for token in tokens:
+        if token >= begin:
+            t = (token - begin) * TIME_PRECISION
+            if start is not None and text:
+                if start < duration:
+                    segments.append({"start": start, "end": min(t, duration), "text": tokenizer.decode(text)})
+                start, text = None, []
+            else:
+                start = t
+        elif token < tokenizer.eot:
+            if start is None:
+                start = segments[-1]["end"] if segments else 0.0
+            text.append(token)
+    # A window cut mid-sentence can end without a closing timestamp
+    if text and start < duration:
+        segments.append({"start": start, "end": duration, "text": tokenizer.decode(text)})
+    return segments
+
+
+class MlxBackend:
+    """mlx-whisper on Apple silicon."""
+
+    def __init__(self, settings: Settings):
+        import mlx_whisper
+
+        self._mlx_whisper = mlx_whisper
+        self.model = settings.model
+        self.batch_size = settings.batch_size
+
+    def transcribe(self, audio: np.ndarray) -> list[dict]:
+        result = self._mlx_whisper.transcribe(
+            audio,
+            path_or_hf_repo=self.model,
+            language="en",
+            verbose=False,
+        )
+        return result.get("segments", [])
+
+    def transcribe_batch(self, windows: np.ndarray, durations: Sequence[float]) -> list[list[dict]]:
+        import mlx.core as mx
+        from mlx_whisper.audio import mel_filters
+        from mlx_whisper.decoding import DecodingOptions, decode
+        from mlx_whisper.tokenizer import get_tokenizer
+        from mlx_whisper.transcribe import ModelHolder
+
+        # The same cached model transcribe() uses
+        model = ModelHolder.get_model(self.model, mx.float16)
+        tokenizer = get_tokenizer(
+            model.is_multilingual, num_languages=model.num_languages, language="en", task="transcribe"
+        )
+        # mlx-whisper takes (batch, frames, n_mels)
+        mel = log_mel_batch(windows, np.array(mel_filters(model.dims.n_mels)))
+        mel = mx.array(np.ascontiguousarray(mel.transpose(0, 2, 1))).astype(mx.float16)
+        results = decode(model, mel, DecodingOptions(language="en", without_timestamps=False))
+        return [timestamped_segments(r.tokens, tokenizer, d) for r, d in zip(results, durations)]
+
+
+class FasterWhisperBackend:
+    """CTranslate2 Whisper on the CPU via faster-whisper."""
+
+    def __init__(self, settings: Settings):
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError as e:
+            raise RuntimeError("The faster-whisper backend needs: pip install faster-whisper") from e
+
+        # Accept the MLX repo names used in settings.yaml as plain model sizes
+        model = settings.model.removeprefix("mlx-community/whisper-")
+        self.model = WhisperModel(model, device="cpu", compute_type="int8", cpu_threads=settings.cpu_threads)
+        self.batch_size = settings.batch_size
+        if self.batch_size > 1:
+            from faster_whisper.tokenizer import Tokenizer
+
+            self._tokenizer = Tokenizer(
+                self.model.hf_tokenizer, self.model.model.is_multilingual, task="transcribe", language="en"
+            )
+
+    def transcribe(self, audio: np.ndarray) -> list[dict]:
+        segments, _ = self.model.transcribe(audio, language="en")
+        return [{"start": s.start, "end": s.end, "text": s.text} for s in segments]
+
+    def transcribe_batch(self, windows: np.ndarray, durations: Sequence[float]) -> list[list[dict]]:
+        features = log_mel_batch(windows, self.model.feature_extractor.mel_filters)
+        # One encoder pass and one decoder pass for the whole batch; timestamps
+        # are predicted because the prompt leaves out <|notimestamps|>
+        encoded = self.model.encode(features)
+        results = self.model.model.generate(
+            encoded,
+            [list(self._tokenizer.sot_sequence)] * len(windows),
+            beam_size=5,
+            max_length=MAX_DECODE_TOKENS,
+            suppress_blank=True,
+            suppress_tokens=[-1],
+        )
+        return [
+            timestamped_segments(r.sequences_ids[0], self._tokenizer, d) for r, d in zip(results, durations)
+        ]
+
+
+class StubBackend:
+    """Deterministic fake transcription for tests and dry runs."""
+
+    def __init__(self, settings: Settings):
+        self.sample_rate = settings.sample_rate
+        self.batch_size = settings.batch_size
+
+    def transcribe(self, audio: np.ndarray) -> list[dict]:
+        duration = len(audio) / self.sample_rate
+        segments = []
+        t = 0.0
+        while t < duration:
+            end = min(t + STUB_SEGMENT_SECONDS, duration)
+            segments.append({"start": t, "end": end, "text": f" Segment at {t:.2f} seconds."})
+            t = end
+        return segments
+
+    def transcribe_batch(self, windows: np.ndarray, durations: Sequence[float]) -> list[list[dict]]:
+        return [self.transcribe(w[: int(round(d * self.sample_rate))]) for w, d in zip(windows, durations)]
+
+
+BACKENDS: dict[str, type] = {
+    "mlx": MlxBackend,
+    "faster-whisper": FasterWhisperBackend,
+    "stub": StubBackend,
+}
+
+
+def load_backend(settings: Settings) -> Backend:
+    try:
+        cls = BACKENDS[settings.backend]
+    except KeyError:
+        raise ValueError(
+            f"Unknown transcription backend {settings.backend!r} (choose from {', '.join(BACKENDS)})"
+        ) from None
+    return cls(settings)
+
+
+def worker_count(settings: Settings) -> int:
+    """Processes to transcribe chunks with; ``workers: 0`` sizes the pool to the cores."""
+    if settings.workers > 0:
+        return settings.workers
+    if settings.backend == "mlx":
+        return 1  # one GPU; extra processes would only contend for it
+    return max(1, (os.cpu_count() or 1) // max(1, settings.cpu_threads))
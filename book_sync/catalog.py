@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+from book_sync.config import DATA_DIR
+from book_sync.models import CatalogEntry, State, WatchedFeed
+
+
+CATALOG_NAME = "catalog.db"
+BUSY_TIMEOUT = 30.0  # seconds to wait for another process's write transaction
+SCHEMA_VERSION = 2  # PRAGMA user_version; bump with a step in _migrate
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS books (
+    name TEXT PRIMARY KEY,
+    title TEXT,
+    audio_url TEXT,
+    duration_seconds REAL,
+    stage TEXT NOT NULL DEFAULT 'downloading',
+    model TEXT,
+    checksums TEXT NOT NULL DEFAULT '{}',
+    segment_count INTEGER NOT NULL DEFAULT 0,
+    regions TEXT NOT NULL DEFAULT '[]',
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+)
+"""
+_FEEDS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS feeds (
+    url TEXT PRIMARY KEY,
+    interval_seconds REAL NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    known TEXT NOT NULL DEFAULT '[]',
+    failures INTEGER NOT NULL DEFAULT 0,
+    checked_at TEXT
+)
+"""
+_COLUMNS = (
+    "name", "title", "audio_url", "duration_seconds", "stage", "model",
+    "checksums", "segment_count", "regions", "created_at", "updated_at",
+)
+_FEED_COLUMNS = ("url", "interval_seconds", "etag", "last_modified", "known", "failures", "checked_at")
+
+
+def catalog_path() -> Path:
+    return DATA_DIR / CATALOG_NAME
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+@contextmanager
+def connect() -> Iterator[sqlite3.Connection]:
+    """Open the catalog inside a transaction, committed on normal exit."""
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(catalog_path(), timeout=BUSY_TIMEOUT)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")  # readers never block the pipeline's writes
+        conn.execute(_SCHEMA)
+        conn.execute(_FEEDS_SCHEMA)
+        _migrate(conn)
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    """Bring a catalog written by an older version up to ``SCHEMA_VERSION``."""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(books)")}
+    if "regions" not in columns:
+        conn.execute("ALTER TABLE books ADD COLUMN regions TEXT NOT NULL DEFAULT '[]'")
+    if version < 2:
+        # Stat fingerprints used to be stored alongside the checksums
+        for name, checksums in conn.execute("SELECT name, checksums FROM books").fetchall():
+            kept = {k: v for k, v in json.loads(checksums).items() if not k.endswith("_fingerprint")}
+            conn.execute("UPDATE books SET checksums = ? WHERE name = ?", (json.dumps(kept), name))
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+def _upsert(conn: sqlite3.Connection, name: str, fields: dict) -> None:
+    now = _now()
+    cols = ", ".join(fields)
+    marks = ", ".join("?" for _ in fields)
+    updates = ", ".join(f"{c} = excluded.{c}" for c in fields)
+    conn.execute(
+        f"INSERT INTO books (name, {cols}, created_at, updated_at) VALUES (?, {marks}, ?, ?) "
+        f"ON CONFLICT(name) DO UPDATE SET {updates}, updated_at = excluded.updated_at",
+        (name, *fields.values(), now, now),
+    )
+
+
+def record_feed(name: str, title: str, audio_url: str, duration_seconds: float | None) -> None:
+    with connect() as conn:
+        _upsert(conn, name, {"title": title, "audio_url": audio_url, "duration_seconds": duration_seconds})
+
+
+def record_state(name: str, state: State) -> None:
+    with connect() as conn:
+        _upsert(conn, name, {
+            "stage": state.stage,
+            "model": state.model,
+            "checksums": json.dumps(state.checksums),
+            "segment_count": state.last_segment,
+            "regions": json.dumps(state.regions),
+        })
+
+
+def _entry(row: sqlite3.Row) -> CatalogEntry:
+    fields = dict(zip(_COLUMNS, row))
+    fields["checksums"] = json.loads(fields["checksums"])
+    fields["regions"] = json.loads(fields["regions"])
+    return CatalogEntry(**fields)
+
+
+def entries(filters: Sequence[str] = (), stages: Sequence[str] = ()) -> list[CatalogEntry]:
+    """Catalogued books by name, optionally only names containing a filter or in given stages.
+
+    A library from before the catalog existed is catalogued on first use.
+    """
+    if not DATA_DIR.exists():
+        return []
+    if not catalog_path().exists():
+        rebuild()
+    where = []
+    args: list[str] = []
+    if filters:
+        where.append("(" + " OR ".join("instr(lower(name), ?) > 0" for _ in filters) + ")")
+        args += [f.lower() for f in filters]
+    if stages:
+        where.append(f"stage IN ({', '.join('?' for _ in stages)})")
+        args += list(stages)
+    sql = f"SELECT {', '.join(_COLUMNS)} FROM books"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    with connect() as conn:
+        return [_entry(row) for row in conn.execute(sql + " ORDER BY name", args)]
+
+
+def get_entry(name: str) -> CatalogEntry | None:
+    with connect() as conn:
+        row = conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM books WHERE name = ?", (name,)).fetchone()
+    return _entry(row) if row else None
+
+
+def watch_feed(url: str, interval_seconds: float, replace: bool = True) -> None:
+    """Start watching ``url``; with ``replace`` an already watched feed takes the new interval."""
+    conflict = "DO UPDATE SET interval_seconds = excluded.interval_seconds" if replace else "DO NOTHING"
+    with connect() as conn:
+        conn.execute(
+            f"INSERT INTO feeds (url, interval_seconds) VALUES (?, ?) ON CONFLICT(url) {conflict}",
+            (url, interval_seconds),
+        )
+
+
+def unwatch_feed(url: str) -> bool:
+    with connect() as conn:
+        return conn.execute("DELETE FROM feeds WHERE url = ?", (url,)).rowcount > 0
+
+
+def watched_feeds() -> list[WatchedFeed]:
+    with connect() as conn:
+        rows = conn.execute(f"SELECT {', '.join(_FEED_COLUMNS)} FROM feeds ORDER BY url").fetchall()
+    feeds = []
+    for row in rows:
+        fields = dict(zip(_FEED_COLUMNS, row))
+        fields["known"] = json.loads(fields["known"])
+        feeds.append(WatchedFeed(**fields))
+    return feeds
+
+
+def record_poll(feed: WatchedFeed) -> None:
+    """Save a feed's validators, known entries and failure count after a poll."""
+    with connect() as conn:
+        conn.execute(
+            "UPDATE feeds SET etag = ?, last_modified = ?, known = ?, failures = ?, checked_at = ? WHERE url = ?",
+            (feed.etag, feed.last_modified, json.dumps(feed.known), feed.failures, feed.checked_at, feed.url),
+        )
+
+
+def entries_with_audio(audio_url: str) -> list[CatalogEntry]:
+    with connect() as conn:
+        rows = conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM books WHERE audio_url = ?", (audio_url,))
+        return [_entry(row) for row in rows]
+
+
+def _read_json(path: Path) -> dict:
+    return json.loads(path.read_text()) if path.exists() else {}
+
+
+def _mtime(path: Path) -> str:
+    return datetime.fromtimestamp(path.stat().st_mtime, timezone.utc).isoformat()
+
+
+def rebuild() -> int:
+    """Regenerate the catalog from every book's feed.json and state.json.
+
+    Watched feeds are left alone; they have no files to be rebuilt from.
+    """
+    rows = []
+    for child in sorted(DATA_DIR.iterdir()) if DATA_DIR.exists() else []:
+        if not child.is_dir() or child.name.startswith("."):
+            continue
+        feed = _read_json(child / "feed.json")
+        state = State(**_read_json(child / "state.json"))
+        stamps = [_mtime(p) for p in (child / "feed.json", child / "state.json") if p.exists()] or [_mtime(child)]
+        rows.append((
+            child.name,
+            feed.get("title"),
+            feed.get("audio_url"),
+            feed.get("duration_seconds"),
+            state.stage,
+            state.model,
+            json.dumps(state.checksums),
+            state.last_segment,
+            json.dumps(state.regions),
+            min(stamps),
+            max(stamps),
+        ))
+    with connect() as conn:
+        conn.execute("DELETE FROM books")
+        conn.executemany(f"INSERT INTO books ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' for _ in _COLUMNS)})", rows)
+    return len(rows)
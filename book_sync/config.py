@@ -1,30 +1,78 @@
 from __future__ import annotations
 
+import os
 from dataclasses import dataclass, field
 from pathlib import Path
 
-import yaml
-
 DEFAULTS = {
     "model": "mlx-community/whisper-large-v3-turbo",
+    "draft_model": "",
     "ffmpeg_path": "ffmpeg",
     "sample_rate": 16000,
+    "download_connections": 4,
+    "convert_workers": 1,
+    "stream": False,
+    "chunk_seconds": 7200,
+    "vad": True,
+    "skip_silence": 3.0,
+    "backend": "mlx",
+    "workers": 0,
+    "cpu_threads": 4,
+    "batch_size": 1,
+    "checkpoint_seconds": 300,
+    "parallel_downloads": 4,
+    "parallel_conversions": 2,
+    "parallel_transcriptions": 1,
+    "max_pending_books": 4,
+    "min_free_gb": 5.0,
+    "watch_interval": 900,
+    "metrics_dir": "",
+    "profile_stages": "",
+    "model_worker": False,
+    "worker_socket": "",
+    "worker_max_jobs": 500,
 }
 
 CONFIG_PATH = Path(__file__).resolve().parent.parent / "config" / "settings.yaml"
-DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+# BOOK_SYNC_DATA points the whole tool at another library (benchmarks use a scratch one)
+DATA_DIR = Path(os.environ.get("BOOK_SYNC_DATA") or Path(__file__).resolve().parent.parent / "data")
 
 
 @dataclass
 class Settings:
     model: str = DEFAULTS["model"]
+    draft_model: str = DEFAULTS["draft_model"]  # fast model for a searchable draft before `model` runs; "" = one pass
     ffmpeg_path: str = DEFAULTS["ffmpeg_path"]
     sample_rate: int = DEFAULTS["sample_rate"]
+    download_connections: int = DEFAULTS["download_connections"]
+    convert_workers: int = DEFAULTS["convert_workers"]  # ffmpeg processes per conversion, one time range each; 0 = one per core
+    stream: bool = DEFAULTS["stream"]  # decode straight into the transcriber, no book.wav
+    chunk_seconds: float = DEFAULTS["chunk_seconds"]  # target chunk length (MLX int32 shape limit ~2h)
+    vad: bool = DEFAULTS["vad"]  # cut chunks at pauses and skip long silences
+    skip_silence: float = DEFAULTS["skip_silence"]  # silences at least this long are not transcribed
+    backend: str = DEFAULTS["backend"]  # mlx | faster-whisper | stub
+    workers: int = DEFAULTS["workers"]  # transcription processes; 0 = auto
+    cpu_threads: int = DEFAULTS["cpu_threads"]  # threads per CPU-backend worker
+    batch_size: int = DEFAULTS["batch_size"]  # 30 s windows decoded together; 1 = the backend's own sequential decoding
+    checkpoint_seconds: float = DEFAULTS["checkpoint_seconds"]  # persist progress per window this long; 0 = per chunk
+    parallel_downloads: int = DEFAULTS["parallel_downloads"]  # scheduler: books downloading at once
+    parallel_conversions: int = DEFAULTS["parallel_conversions"]  # scheduler: ffmpeg conversions at once
+    parallel_transcriptions: int = DEFAULTS["parallel_transcriptions"]  # scheduler: books transcribing at once
+    max_pending_books: int = DEFAULTS["max_pending_books"]  # scheduler: downloaded books awaiting transcription
+    min_free_gb: float = DEFAULTS["min_free_gb"]  # scheduler: keep this much disk free in the data directory
+    watch_interval: float = DEFAULTS["watch_interval"]  # seconds between polls of a newly watched feed
+    metrics_dir: str = DEFAULTS["metrics_dir"]  # Prometheus textfile directory; "" = data/.metrics
+    profile_stages: str = DEFAULTS["profile_stages"]  # comma-separated stages (or "all") to run under cProfile
+    model_worker: bool = DEFAULTS["model_worker"]  # send chunks to a running `transcribe worker`
+    worker_socket: str = DEFAULTS["worker_socket"]  # the worker's Unix socket; "" = data/.worker.sock
+    worker_max_jobs: int = DEFAULTS["worker_max_jobs"]  # chunks before a model process is replaced; 0 = never
 
 
 def load_settings(path: Path | None = None) -> Settings:
     path = path or CONFIG_PATH
     if path.exists():
+        import yaml  # only commands that need settings pay for it
+
         raw = yaml.safe_load(path.read_text()) or {}
         merged = {**DEFAULTS, **raw}
         return Settings(**{k: merged[k] for k in DEFAULTS})
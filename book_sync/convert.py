@@ -1,10 +1,25 @@
 from __future__ import annotations
 
+import os
+import queue
 import re
 import subprocess
+import threading
+from collections.abc import Iterator
 from pathlib import Path
 
+import numpy as np
+
+from book_sync import metrics
 from book_sync.config import Settings
+from book_sync.utils import HASH_BLOCK_SIZE, tmp_path
+from book_sync.wav import SAMPLE_WIDTH, WAV_HEADER_SIZE, WavRangeWriter, WavWriter, finish_wav
+
+
+STREAM_QUEUE_DEPTH = 2  # decoded windows buffered ahead of the transcriber
+MIN_RANGE_SECONDS = 300  # shorter inputs aren't worth splitting across processes
+PREROLL_SECONDS = 2  # decoded before each range and discarded, so the decoder has settled
+LAST_RANGE_TOLERANCE_SECONDS = 1.0  # how far the last range may end from the probed duration
 
 
 def _probe_duration(input_path: Path, ffmpeg_path: str) -> float | None:
@@ -23,45 +38,333 @@ def _probe_duration(input_path: Path, ffmpeg_path: str) -> float | None:
         return None
 
 
-def convert_to_wav(input_path: Path, output_path: Path, settings: Settings) -> Path:
+class _Progress:
+    """Sums the seconds decoded by one or more ffmpeg processes into "Converting: N%" lines."""
+
+    def __init__(self, total_duration: float | None, parts: int = 1):
+        self.total_duration = total_duration
+        self._done = [0.0] * parts
+        self._last_pct = -1
+        self._lock = threading.Lock()
+
+    def update(self, part: int, seconds: float) -> None:
+        if not self.total_duration:
+            return
+        with self._lock:
+            self._done[part] = max(seconds, 0.0)
+            pct = min(int(sum(self._done) * 100 / self.total_duration), 100)
+            pct -= pct % 5
+            if pct > self._last_pct:
+                print(f"Converting: {pct}%")
+                self._last_pct = pct
+
+
+def _watch_progress(stderr, progress: _Progress, errors: list[str]) -> None:
+    """Report ffmpeg -progress output; keep any other stderr lines for error reports."""
+    for line in stderr:
+        m = re.match(r"out_time_ms=(\d+)", line)
+        if m:
+            progress.update(0, int(m.group(1)) / 1_000_000)
+        elif not re.match(r"\w+=", line):
+            errors.append(line)
+
+
+def convert_to_wav(input_path: Path, output_path: Path, settings: Settings) -> str | None:
+    """Convert to 16-bit mono WAV; return its checksum, or None if it already existed.
+
+    With ``settings.convert_workers`` above 1, a long input is decoded as
+    that many time ranges at once (see ``_convert_ranges``).
+    """
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
     if output_path.exists():
         print(f"WAV already exists: {output_path}")
-        return output_path
+        return None
+
+    with metrics.timer("probe"):
+        total_duration = _probe_duration(input_path, settings.ffmpeg_path)
+
+    print(f"Converting: {input_path.name} -> {output_path.name}")
+    if total_duration:
+        print(f"Duration: {total_duration:.0f}s")
 
-    total_duration = _probe_duration(input_path, settings.ffmpeg_path)
+    tmp = tmp_path(output_path)
+    result = None
+    ranges = _plan_ranges(total_duration, settings) if total_duration else []
+    if len(ranges) > 1:
+        print(f"Decoding {len(ranges)} time ranges in parallel")
+        result = _convert_ranges(input_path, tmp, ranges, total_duration, settings)
+    if result is None:
+        result = _convert_whole(input_path, tmp, total_duration, settings)
+    digest, data_size = result
 
+    metrics.count("audio_seconds", data_size / SAMPLE_WIDTH / settings.sample_rate)
+    tmp.rename(output_path)
+    print(f"Conversion complete: {output_path}")
+    return digest
+
+
+def _convert_whole(
+    input_path: Path, tmp: Path, total_duration: float | None, settings: Settings
+) -> tuple[str, int]:
+    """Decode the whole input in one ffmpeg process; return the WAV's checksum and data size."""
+    # ffmpeg emits raw PCM on stdout so the WAV can be hashed while it is written
     cmd = [
         settings.ffmpeg_path,
+        "-nostdin",
+        "-v", "error",
         "-i", str(input_path),
         "-ar", str(settings.sample_rate),
         "-ac", "1",
-        "-c:a", "pcm_s16le",
-        "-progress", "pipe:1",
-        "-y",
-        str(output_path),
+        "-f", "s16le",
+        "-progress", "pipe:2",
+        "pipe:1",
     ]
 
-    print(f"Converting: {input_path.name} -> {output_path.name}")
-    if total_duration:
-        print(f"Duration: {total_duration:.0f}s")
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    errors: list[str] = []
+    stderr = (line.decode(errors="replace") for line in proc.stderr)
+    watcher = threading.Thread(target=_watch_progress, args=(stderr, _Progress(total_duration), errors), daemon=True)
+    watcher.start()
 
-    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    last_pct = -1
-    for line in proc.stdout:
-        m = re.match(r"out_time_ms=(\d+)", line)
-        if m and total_duration:
-            current = int(m.group(1)) / 1_000_000
-            pct = min(int(current * 100 / total_duration), 100)
-            if pct != last_pct and pct % 5 == 0:
-                print(f"Converting: {pct}%")
-                last_pct = pct
+    writer = WavWriter(tmp, settings.sample_rate)
+    try:
+        with metrics.timer("decode"):
+            while True:
+                data = proc.stdout.read(1 << 20)
+                if not data:
+                    break
+                writer.write(data)
+            proc.wait()
+    except BaseException:
+        proc.kill()
+        writer.abort()
+        raise
+
+    watcher.join()
+    if proc.returncode != 0:
+        writer.abort()
+        raise RuntimeError(f"ffmpeg failed (exit {proc.returncode}):\n{''.join(errors)}")
+
+    with metrics.timer("hash"):
+        digest = writer.close()
+    return digest, writer.data_size
+
+
+def _plan_ranges(total_duration: float, settings: Settings) -> list[tuple[int, int | None]]:
+    """Split the output into ``(start_sample, end_sample)`` ranges for parallel decoding.
+
+    Every range is at least ``MIN_RANGE_SECONDS`` long and starts on a hash
+    block of book.wav; the last one runs to the end of the input, whatever
+    its exact length.
+    """
+    workers = settings.convert_workers if settings.convert_workers > 0 else os.cpu_count() or 1
+    count = max(1, min(workers, int(total_duration // MIN_RANGE_SECONDS)))
+    blocks = (WAV_HEADER_SIZE + total_duration * settings.sample_rate * SAMPLE_WIDTH) / HASH_BLOCK_SIZE
+    starts = [0]
+    for i in range(1, count):
+        start = (round(i * blocks / count) * HASH_BLOCK_SIZE - WAV_HEADER_SIZE) // SAMPLE_WIDTH
+        if start > starts[-1]:
+            starts.append(start)
+    return list(zip(starts, [*starts[1:], None]))
+
+
+def _convert_ranges(
+    input_path: Path,
+    tmp: Path,
+    ranges: list[tuple[int, int | None]],
+    total_duration: float,
+    settings: Settings,
+) -> tuple[str, int] | None:
+    """Decode each range in its own ffmpeg process, straight into its place in ``tmp``.
+
+    Ranges are cut by atrim on the resampled timestamps (whose unit is one
+    output sample), so they join with no gap or overlap. Each process seeks
+    to a whole second at least ``PREROLL_SECONDS`` before its range: the
+    decoder and resampler settle in the preroll, and a whole second lies on
+    the sample grid of any input rate, so the result matches a single-pass
+    decode (exactly for MP3). Each range hashes its own blocks as it
+    writes. Returns the checksum and data size, or None (after removing
+    ``tmp``) if a process or a write fails or a range comes out the wrong
+    length, so the caller can fall back to one pass.
+    """
+    sr = settings.sample_rate
+    progress = _Progress(total_duration, len(ranges))
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    writers = [WavRangeWriter(fd, start) for start, _ in ranges]
+    procs: list[subprocess.Popen] = []
+    threads: list[threading.Thread] = []
+    errors: list[str] = [""] * len(ranges)
+    write_errors: list[OSError | None] = [None] * len(ranges)
+
+    # Progress is counted in samples written: -progress times are unreliable with -copyts
+    def copy(part: int, proc: subprocess.Popen) -> None:
+        writer = writers[part]
+        try:
+            while data := proc.stdout.read(1 << 20):
+                writer.write(data)
+                progress.update(part, writer.size / SAMPLE_WIDTH / sr)
+        except OSError as e:
+            # e.g. a full disk; nothing would read ffmpeg's stdout any more, so stop it
+            write_errors[part] = e
+            proc.kill()
+
+    def drain(part: int, proc: subprocess.Popen) -> None:
+        errors[part] = proc.stderr.read().decode(errors="replace")
+
+    try:
+        with metrics.timer("decode"):
+            for part, (start, end) in enumerate(ranges):
+                cmd = _range_command(input_path, start, end, settings)
+                proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                procs.append(proc)
+                for target in (copy, drain):
+                    threads.append(threading.Thread(target=target, args=(part, proc), daemon=True))
+                    threads[-1].start()
+            for thread in threads:
+                thread.join()
+            for proc in procs:
+                proc.wait()
+    except BaseException:
+        for proc in procs:
+            proc.kill()
+        os.close(fd)
+        tmp.unlink(missing_ok=True)
+        raise
+
+    try:
+        problem = _range_problem(ranges, procs, writers, errors, write_errors, total_duration, sr)
+        if problem is None:
+            with metrics.timer("hash"):
+                digest = finish_wav(fd, sr, writers)
+    finally:
+        os.close(fd)
+    if problem is not None:
+        tmp.unlink(missing_ok=True)
+        print(f"Parallel conversion failed ({problem}); converting in one pass")
+        return None
+    return digest, sum(w.size for w in writers)
+
+
+def _range_command(input_path: Path, start: int, end: int | None, settings: Settings) -> list[str]:
+    sr = settings.sample_rate
+    seek = ["-ss", str(max(0, start // sr - PREROLL_SECONDS))] if start else []
+    trim = f"atrim=start_pts={start}" + (f":end_pts={end}" if end is not None else "")
+    return [
+        settings.ffmpeg_path,
+        "-nostdin",
+        "-v", "error",
+        *seek,
+        "-copyts", "-start_at_zero",  # timestamps stay on the whole book's timeline
+        "-i", str(input_path),
+        # One resampler for rate, channels and format, like -ar/-ac; its timestamps count output samples
+        "-af", f"aresample=osr={sr}:ochl=mono:osf=s16,{trim}",
+        "-f", "s16le",
+        "pipe:1",
+    ]
+
+
+def _range_problem(
+    ranges: list[tuple[int, int | None]],
+    procs: list[subprocess.Popen],
+    writers: list[WavRangeWriter],
+    errors: list[str],
+    write_errors: list[OSError | None],
+    total_duration: float,
+    sample_rate: int,
+) -> str | None:
+    """Why the decoded ranges can't be joined as they are, if they can't.
+
+    Inner ranges must come out exactly as long as planned. The last one
+    runs to the end of the input, so it is only checked against the probed
+    duration, within ``LAST_RANGE_TOLERANCE_SECONDS``.
+    """
+    total_samples = total_duration * sample_rate
+    tolerance = LAST_RANGE_TOLERANCE_SECONDS * sample_rate
+    for part, ((start, end), proc, writer) in enumerate(zip(ranges, procs, writers)):
+        if write_errors[part] is not None:
+            return f"writing range {part + 1} failed: {write_errors[part]}"
+        if proc.returncode != 0:
+            return f"ffmpeg failed (exit {proc.returncode}): {errors[part].strip()}"
+        samples = writer.size // SAMPLE_WIDTH
+        if end is not None and samples != end - start:
+            return f"range {part + 1} decoded to {samples} samples, expected {end - start}"
+        if end is None and abs(samples - (total_samples - start)) > tolerance:
+            return f"last range decoded to {samples} samples, expected about {round(total_samples - start)}"
+    return None
+
+
+def stream_pcm(
+    input_path: Path, settings: Settings, window_seconds: float, start: float = 0.0
+) -> Iterator[tuple[float, np.ndarray]]:
+    """Decode ``input_path`` and yield ``(window_start, samples)`` float32 windows.
+
+    ffmpeg runs ahead of the consumer by at most STREAM_QUEUE_DEPTH windows;
+    beyond that it blocks on the pipe, so memory stays bounded while decoding
+    overlaps with whatever the caller does with each window.
+    """
+    cmd = [
+        settings.ffmpeg_path,
+        "-nostdin",
+        "-v", "error",
+        "-ss", str(start),
+        "-i", str(input_path),
+        "-ar", str(settings.sample_rate),
+        "-ac", "1",
+        "-f", "s16le",
+        "pipe:1",
+    ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    window_bytes = int(window_seconds * settings.sample_rate) * 2
+    windows: queue.Queue[np.ndarray | None] = queue.Queue(maxsize=STREAM_QUEUE_DEPTH)
+    stop = threading.Event()
+
+    def read_windows() -> None:
+        try:
+            while not stop.is_set():
+                data = _read_exact(proc.stdout, window_bytes)
+                if not data:
+                    break
+                samples = np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
+                while not stop.is_set():
+                    try:
+                        windows.put(samples, timeout=0.5)
+                        break
+                    except queue.Full:
+                        pass
+        finally:
+            windows.put(None)
+
+    reader = threading.Thread(target=read_windows, daemon=True)
+    reader.start()
+
+    offset = start
+    finished = False
+    try:
+        while (samples := windows.get()) is not None:
+            yield offset, samples
+            offset += len(samples) / settings.sample_rate
+        finished = True
+    finally:
+        stop.set()
+        if not finished:
+            proc.kill()
+            while windows.get() is not None:
+                pass
+        reader.join()
+        stderr = proc.stderr.read().decode(errors="replace")
+        proc.wait()
 
-    proc.wait()
     if proc.returncode != 0:
-        stderr = proc.stderr.read()
         raise RuntimeError(f"ffmpeg failed (exit {proc.returncode}):\n{stderr}")
 
-    print(f"Conversion complete: {output_path}")
-    return output_path
+
+def _read_exact(stream, size: int) -> bytearray:
+    """Read up to ``size`` bytes, short only at end of stream."""
+    buf = bytearray()
+    while len(buf) < size:
+        data = stream.read(size - len(buf))
+        if not data:
+            break
+        buf += data
+    return buf
@@ -1,12 +1,79 @@
 from __future__ import annotations
 
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import httpx
 
+from book_sync import metrics
+from book_sync.utils import HASH_BLOCK_SIZE, BlockHasher, blocks_digest, hash_file_blocks, tmp_path
 
-def download_audio(url: str, dest: Path) -> Path:
+
+def download_audio(url: str, dest: Path, connections: int = 1) -> str:
+    """Download ``url`` to ``dest`` and return its block checksum.
+
+    Range-capable servers are fetched as block-aligned byte ranges (one per
+    connection) whose progress and block digests live in a parts file, so a
+    resumed download only re-fetches the unfinished tail of each range.
+    Resumed ranges carry the file's validator in If-Range; if the file has
+    changed since, the download starts over.
+    """
     dest.parent.mkdir(parents=True, exist_ok=True)
+    connections = max(connections, 1)
+
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    with httpx.Client(follow_redirects=True, timeout=30.0, limits=limits) as client:
+        with metrics.timer("probe"):
+            probe = _probe_size(client, url)
+        if probe is not None:
+            try:
+                return _download_segmented(client, url, dest, *probe, connections)
+            except RemoteChanged:
+                print("Remote file changed during the download, restarting")
+                _discard_partial(dest)
+                with metrics.timer("probe"):
+                    probe = _probe_size(client, url)
+                if probe is not None:
+                    return _download_segmented(client, url, dest, *probe, connections)
+
+    if connections > 1:
+        print("Server does not support range requests, using a single connection")
+    if _parts_path(dest).exists():
+        # The preallocated file has holes; only a fresh download is safe
+        _discard_partial(dest)
+
+    return _download_stream(url, dest)
+
+
+class RemoteChanged(Exception):
+    """The file behind a URL changed while a ranged download of it was in progress."""
+
+
+def _discard_partial(dest: Path) -> None:
+    _parts_path(dest).unlink(missing_ok=True)
+    dest.unlink(missing_ok=True)
+
+
+def _unshare(dest: Path) -> None:
+    """Give ``dest`` an inode of its own before it is written in place.
+
+    A file hard-linked into the store (or to another book) shares its bytes
+    with those links; appending to or truncating it would rewrite them too.
+    """
+    if dest.exists() and dest.stat().st_nlink > 1:
+        tmp = tmp_path(dest)
+        shutil.copyfile(dest, tmp)
+        os.replace(tmp, dest)
+
+
+def _download_stream(url: str, dest: Path) -> str:
+    _unshare(dest)
     existing_size = dest.stat().st_size if dest.exists() else 0
 
     headers = {}
@@ -17,7 +84,7 @@ def download_audio(url: str, dest: Path) -> Path:
     with httpx.stream("GET", url, headers=headers, follow_redirects=True, timeout=30.0) as resp:
         if resp.status_code == 416:
             print("Download already complete")
-            return dest
+            return _finish_manifest(dest, hash_file_blocks(dest))
 
         if resp.status_code == 200:
             # Server doesn't support range; restart
@@ -34,11 +101,21 @@ def download_audio(url: str, dest: Path) -> Path:
         content_length = resp.headers.get("content-length")
         total = int(content_length) + existing_size if content_length else None
 
+        hasher = BlockHasher()
+        blocks: list[str] = []
+        if existing_size:
+            # No manifest for this prefix: hash it once from disk
+            blocks = hash_file_blocks(dest, existing_size - existing_size % HASH_BLOCK_SIZE)
+            with open(dest, "rb") as f:
+                f.seek(len(blocks) * HASH_BLOCK_SIZE)
+                hasher.update(f.read())
+
         downloaded = existing_size
         last_pct = -1
-        with open(dest, mode) as f:
+        with metrics.timer("fetch"), open(dest, mode) as f:
             for chunk in resp.iter_bytes(chunk_size=1 << 20):
                 f.write(chunk)
+                blocks += hasher.update(chunk)
                 downloaded += len(chunk)
                 if total:
                     pct = int(downloaded * 100 / total)
@@ -46,5 +123,232 @@ def download_audio(url: str, dest: Path) -> Path:
                         print(f"Downloading: {pct}% ({downloaded}/{total} bytes)")
                         last_pct = pct
 
+    metrics.count("bytes_downloaded", downloaded - existing_size)
     print(f"Download complete: {dest} ({downloaded} bytes)")
-    return dest
+    return _finish_manifest(dest, blocks + hasher.flush())
+
+
+def _parts_path(dest: Path) -> Path:
+    return dest.with_name(dest.name + ".parts.json")
+
+
+def _manifest_path(dest: Path) -> Path:
+    return dest.with_name(dest.name + ".blocks.json")
+
+
+def _write_json(path: Path, data: dict) -> None:
+    tmp = tmp_path(path)
+    tmp.write_text(json.dumps(data, indent=2))
+    tmp.rename(path)
+
+
+def _finish_manifest(dest: Path, blocks: list[str]) -> str:
+    """Persist the block manifest of a completed download and return its checksum."""
+    digest = blocks_digest(blocks)
+    _write_json(_manifest_path(dest), {
+        "size": dest.stat().st_size,
+        "block_size": HASH_BLOCK_SIZE,
+        "checksum": digest,
+        "blocks": blocks,
+    })
+    return digest
+
+
+def _manifest_checksum(dest: Path, total: int) -> str | None:
+    path = _manifest_path(dest)
+    if not path.exists():
+        return None
+    raw = json.loads(path.read_text())
+    if raw.get("size") != total or raw.get("block_size") != HASH_BLOCK_SIZE:
+        return None
+    return raw["checksum"]
+
+
+def _probe_size(client: httpx.Client, url: str) -> tuple[int, str | None] | None:
+    """Return ``(total size, validator)`` if the server honours Range requests, else None.
+
+    The validator is a strong ETag, or else Last-Modified: what If-Range accepts.
+    """
+    with client.stream("GET", url, headers={"Range": "bytes=0-0"}) as resp:
+        if resp.status_code != 206:
+            if resp.status_code != 200:
+                resp.raise_for_status()
+            return None
+        m = re.match(r"bytes\s+\d+-\d+/(\d+)", resp.headers.get("content-range", ""))
+        if not m:
+            return None
+        etag = resp.headers.get("etag")
+        validator = etag if etag and not etag.startswith("W/") else resp.headers.get("last-modified")
+        return int(m.group(1)), validator
+
+
+def _split_ranges(total: int, connections: int) -> list[dict]:
+    """Split into at most ``connections`` ranges starting on hash block boundaries."""
+    total_blocks = max(1, -(-total // HASH_BLOCK_SIZE))
+    count = min(connections, total_blocks)
+    step = -(-total_blocks // count) * HASH_BLOCK_SIZE
+    return [
+        {"start": start, "end": min(start + step, total), "done": 0, "blocks": []}
+        for start in range(0, max(total, 1), step)
+    ]
+
+
+def _load_ranges(dest: Path, url: str, total: int, validator: str | None) -> list[dict] | None:
+    """The ranges of an unfinished download of the same file, or None to start afresh."""
+    parts_path = _parts_path(dest)
+    if not parts_path.exists():
+        return None
+    if not dest.exists():
+        print("Partial download is missing, restarting download")
+        return None
+    raw = json.loads(parts_path.read_text())
+    if raw.get("size") != total or raw.get("block_size") != HASH_BLOCK_SIZE:
+        print("Remote file changed, restarting download")
+        return None
+    if raw.get("validator") != validator:
+        print("Remote file changed, restarting download")
+        return None
+    if raw.get("url") != url:
+        if validator is None:
+            # Nothing to tell a different file of the same size apart by
+            print("Download URL changed, restarting download")
+            return None
+        print("Download URL changed, resuming ranges against the new URL")
+    return raw["ranges"]
+
+
+def _save_ranges(parts_path: Path, url: str, total: int, validator: str | None, ranges: list[dict]) -> None:
+    _write_json(parts_path, {
+        "url": url,
+        "size": total,
+        "validator": validator,
+        "block_size": HASH_BLOCK_SIZE,
+        "ranges": ranges,
+    })
+
+
+def _verify_tail_block(dest: Path, rng: dict) -> None:
+    """Re-check the last persisted block of an unfinished range, dropping it if the write was torn."""
+    if not rng["blocks"] or rng["start"] + rng["done"] >= rng["end"]:
+        return
+    offset = rng["start"] + (len(rng["blocks"]) - 1) * HASH_BLOCK_SIZE
+    with open(dest, "rb") as f:
+        f.seek(offset)
+        data = f.read(HASH_BLOCK_SIZE)
+    if hashlib.sha256(data).hexdigest() != rng["blocks"][-1]:
+        print(f"Block at byte {offset} failed verification, re-fetching it")
+        rng["blocks"].pop()
+        rng["done"] = len(rng["blocks"]) * HASH_BLOCK_SIZE
+
+
+class _RangeProgress:
+    """Shared progress for concurrent range workers; persists each range's finished blocks."""
+
+    def __init__(self, parts_path: Path, url: str, total: int, validator: str | None, ranges: list[dict]):
+        self.parts_path = parts_path
+        self.url = url
+        self.total = total
+        self.validator = validator
+        self.ranges = ranges
+        self.downloaded = sum(r["done"] for r in ranges)
+        self._last_pct = -1
+        self._lock = threading.Lock()
+
+    def advance(self, nbytes: int) -> None:
+        with self._lock:
+            self.downloaded += nbytes
+            pct = int(self.downloaded * 100 / self.total) if self.total else 100
+            if pct != self._last_pct and pct % 5 == 0:
+                print(f"Downloading: {pct}% ({self.downloaded}/{self.total} bytes)")
+                self._last_pct = pct
+
+    def blocks_done(self, rng: dict, digests: list[str]) -> None:
+        if not digests:
+            return
+        with self._lock:
+            rng["blocks"] += digests
+            rng["done"] = min(len(rng["blocks"]) * HASH_BLOCK_SIZE, rng["end"] - rng["start"])
+            _save_ranges(self.parts_path, self.url, self.total, self.validator, self.ranges)
+
+
+def _download_segmented(
+    client: httpx.Client, url: str, dest: Path, total: int, validator: str | None, connections: int
+) -> str:
+    _unshare(dest)
+    parts_path = _parts_path(dest)
+    ranges = _load_ranges(dest, url, total, validator)
+
+    if ranges is None:
+        if parts_path.exists():
+            _discard_partial(dest)
+        existing_size = dest.stat().st_size if dest.exists() else 0
+        if existing_size == total:
+            print("Download already complete")
+            return _manifest_checksum(dest, total) or _finish_manifest(dest, hash_file_blocks(dest))
+        ranges = _split_ranges(total, connections)
+        if existing_size:
+            # Keep whole blocks left behind by an earlier single-connection download
+            prefix = hash_file_blocks(dest, existing_size - existing_size % HASH_BLOCK_SIZE)
+            for rng in ranges:
+                first = rng["start"] // HASH_BLOCK_SIZE
+                count = -(-(rng["end"] - rng["start"]) // HASH_BLOCK_SIZE)
+                rng["blocks"] = prefix[first : first + count]
+                rng["done"] = min(len(rng["blocks"]) * HASH_BLOCK_SIZE, rng["end"] - rng["start"])
+        with open(dest, "ab") as f:
+            f.truncate(total)
+        _save_ranges(parts_path, url, total, validator, ranges)
+    else:
+        for rng in ranges:
+            _verify_tail_block(dest, rng)
+        done = sum(r["done"] for r in ranges)
+        print(f"Resuming {len(ranges)}-range download from {done}/{total} bytes")
+
+    print(f"Downloading {total} bytes over {len(ranges)} connection(s)")
+    already = sum(r["done"] for r in ranges)
+    progress = _RangeProgress(parts_path, url, total, validator, ranges)
+    fd = os.open(dest, os.O_WRONLY)
+    try:
+        with metrics.timer("fetch"), ThreadPoolExecutor(max_workers=connections) as pool:
+            futures = [pool.submit(_fetch_range, client, url, fd, rng, progress, validator) for rng in ranges]
+            for fut in futures:
+                fut.result()
+    finally:
+        os.close(fd)
+    metrics.count("bytes_downloaded", total - already)
+
+    digest = _finish_manifest(dest, [b for rng in ranges for b in rng["blocks"]])
+    parts_path.unlink(missing_ok=True)
+    print(f"Download complete: {dest} ({total} bytes)")
+    return digest
+
+
+def _fetch_range(
+    client: httpx.Client, url: str, fd: int, rng: dict, progress: _RangeProgress, validator: str | None
+) -> None:
+    pos = rng["start"] + rng["done"]
+    end = rng["end"]
+    if pos >= end:
+        return
+
+    hasher = BlockHasher()
+    headers = {"Range": f"bytes={pos}-{end - 1}"}
+    if validator is not None:
+        headers["If-Range"] = validator  # a changed file comes back whole, with 200
+    with client.stream("GET", url, headers=headers) as resp:
+        if resp.status_code == 200 and validator is not None:
+            raise RemoteChanged(url)
+        if resp.status_code != 206:
+            resp.raise_for_status()
+            raise RuntimeError(f"Server ignored range {pos}-{end - 1} (HTTP {resp.status_code})")
+        for chunk in resp.iter_bytes(chunk_size=1 << 20):
+            chunk = chunk[: end - pos]
+            os.pwrite(fd, chunk, pos)
+            pos += len(chunk)
+            progress.blocks_done(rng, hasher.update(chunk))
+            progress.advance(len(chunk))
+            if pos >= end:
+                break
+
+    if pos < end:
+        raise RuntimeError(f"Range {rng['start']}-{end - 1} ended early at byte {pos}")
+    progress.blocks_done(rng, hasher.flush())
@@ -1,70 +1,71 @@
 from __future__ import annotations
 
 import json
+from dataclasses import replace
 from pathlib import Path
+from typing import TYPE_CHECKING
 from urllib.parse import urlparse
 
-import feedparser
-
+from book_sync import catalog
 from book_sync.models import FeedInfo
-from book_sync.utils import book_dir
+from book_sync.utils import book_dir, tmp_path
+
+if TYPE_CHECKING:
+    import feedparser
 
 
 def parse_feed(url: str) -> FeedInfo:
+    """The first book in the feed at ``url``, named after the feed as ``transcribe rss`` always has."""
+    import feedparser
+
     feed = feedparser.parse(url)
+    return replace(feed_books(feed)[0], title=feed.feed.get("title", "Untitled"))
+
+
+def feed_books(feed: feedparser.FeedParserDict) -> list[FeedInfo]:
+    """One book per entry with an audio enclosure, in feed order.
+
+    A feed with a single audio entry is named after the feed; entries of a
+    multi-episode feed (as ``watch`` queues them) are named
+    "<feed title> - <entry title>". Each
+    ``rss_item`` carries the entry's guid as ``id`` for telling entries apart.
+    """
     if feed.bozo and not feed.entries:
         raise ValueError(f"Failed to parse RSS feed: {feed.bozo_exception}")
 
     title = feed.feed.get("title", "Untitled")
-
-    audio_url = None
-    duration_seconds = None
-    rss_item = {}
-
-    for entry in feed.entries:
-        for link in entry.get("links", []):
-            if link.get("rel") == "enclosure" or link.get("type", "").startswith("audio/"):
-                audio_url = link["href"]
-                rss_item = {
-                    "title": entry.get("title", ""),
-                    "link": entry.get("link", ""),
-                    "published": entry.get("published", ""),
-                }
-                break
-        if audio_url:
-            break
-
-    if not audio_url:
-        # Fall back: check enclosures directly
-        for entry in feed.entries:
-            for enc in entry.get("enclosures", []):
-                audio_url = enc.get("href") or enc.get("url")
-                if audio_url:
-                    rss_item = {
-                        "title": entry.get("title", ""),
-                        "link": entry.get("link", ""),
-                        "published": entry.get("published", ""),
-                    }
-                    break
-            if audio_url:
-                break
-
-    if not audio_url:
+    found = [(entry, url) for entry in feed.entries if (url := _enclosure_url(entry))]
+    if not found:
         raise ValueError("No audio enclosure found in RSS feed")
 
-    # Try to get duration from itunes:duration
-    for entry in feed.entries:
+    books = []
+    for entry, audio_url in found:
+        entry_title = entry.get("title", "")
         dur = entry.get("itunes_duration")
-        if dur:
-            duration_seconds = _parse_duration(dur)
-            break
-
-    return FeedInfo(
-        title=title,
-        audio_url=audio_url,
-        duration_seconds=duration_seconds,
-        rss_item=rss_item,
-    )
+        books.append(FeedInfo(
+            title=title if len(found) == 1 else f"{title} - {entry_title or audio_url}",
+            audio_url=audio_url,
+            duration_seconds=_parse_duration(dur) if dur else None,
+            rss_item={
+                "id": entry.get("id") or audio_url,
+                "title": entry_title,
+                "link": entry.get("link", ""),
+                "published": entry.get("published", ""),
+            },
+        ))
+    return books
+
+
+def _enclosure_url(entry: feedparser.FeedParserDict) -> str | None:
+    for link in entry.get("links", []):
+        if link.get("rel") == "enclosure" or link.get("type", "").startswith("audio/"):
+            return link["href"]
+    # Fall back: check enclosures directly
+    for enc in entry.get("enclosures", []):
+        url = enc.get("href") or enc.get("url")
+        if url:
+            return url
+    return None
 
 
 def _parse_duration(raw: str) -> float | None:
@@ -97,8 +98,9 @@ def save_feed_json(info: FeedInfo) -> Path:
         "duration_seconds": info.duration_seconds,
         "rss_item": info.rss_item,
     }
-    tmp = out.with_suffix(".tmp")
+    tmp = tmp_path(out)
     tmp.write_text(json.dumps(data, indent=2))
     tmp.rename(out)
+    catalog.record_feed(bdir.name, info.title, info.audio_url, info.duration_seconds)
     print(f"Saved feed info: {out}")
     return out
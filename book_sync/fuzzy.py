@@ -0,0 +1,289 @@
+from __future__ import annotations
+
+import json
+import mmap
+import re
+import struct
+from collections.abc import Sequence
+from pathlib import Path
+
+import numpy as np
+
+from book_sync.utils import tmp_path
+
+
+MAGIC = b"BTRI"
+VERSION = 1
+_HEADER = struct.Struct("<4sIQQQI")  # magic, version, segments, trigrams, characters, metadata bytes
+ERROR_RATE = 0.25  # edits allowed per query character
+VERIFY_BATCH = 20000  # candidate windows checked per vectorised pass
+_WORD_BITS = 63  # longest pattern the vectorised check handles in uint64 lanes
+_NON_WORD_RE = re.compile(r"[\W_]+")
+
+
+def normalize(text: str) -> str:
+    """Lowercase, with punctuation and runs of whitespace folded to single spaces."""
+    return _NON_WORD_RE.sub(" ", text.lower()).strip()
+
+
+def trigram_path(book_path: Path) -> Path:
+    return book_path / "trigrams.bin"
+
+
+def _codes(text: str) -> np.ndarray:
+    return np.frombuffer(text.encode("utf-32-le"), dtype="<u4")
+
+
+def _trigram_keys(codes: np.ndarray) -> np.ndarray:
+    """Pack every character trigram into one int64 (21 bits per code point)."""
+    if len(codes) < 3:
+        return np.zeros(0, dtype=np.int64)
+    codes = codes.astype(np.int64)
+    return (codes[:-2] << 42) | (codes[1:-1] << 21) | codes[2:]
+
+
+class TrigramIndex:
+    """Character trigram -> segments containing it, plus the normalised text itself.
+
+    Segments are normalised and joined with single spaces; ``seg_starts[i]``
+    is where segment i begins in that text, which is kept as UTF-32 code
+    points so candidate windows can be checked in bulk with numpy. Trigrams
+    spanning a boundary are credited to the segment they start in.
+    """
+
+    def __init__(
+        self,
+        created_at: str,
+        keys: np.ndarray,
+        starts: np.ndarray,
+        postings: np.ndarray,
+        seg_starts: np.ndarray,
+        codes: np.ndarray,
+    ):
+        self.created_at = created_at
+        self._keys = keys
+        self._starts = starts
+        self._postings = postings
+        self._seg_starts = seg_starts
+        self._codes = codes
+
+    @property
+    def n_segments(self) -> int:
+        return len(self._seg_starts) - 1
+
+    @classmethod
+    def build(cls, created_at: str, texts: Sequence[str]) -> TrigramIndex:
+        norm = [normalize(t) for t in texts]
+        seg_starts = np.zeros(len(norm) + 1, dtype=np.int64)
+        np.cumsum([len(t) + 1 for t in norm], out=seg_starts[1:])
+        codes = _codes(" ".join(norm)).copy()
+        keys = _trigram_keys(codes)
+        seg = np.searchsorted(seg_starts, np.arange(len(keys)), side="right") - 1
+        order = np.lexsort((seg, keys))
+        keys, seg = keys[order], seg[order]
+        keep = np.ones(len(keys), dtype=bool)
+        keep[1:] = (keys[1:] != keys[:-1]) | (seg[1:] != seg[:-1])
+        keys, seg = keys[keep], seg[keep]
+        uniq, first = np.unique(keys, return_index=True)
+        starts = np.append(first, len(keys)).astype(np.int64)
+        return cls(created_at, uniq, starts, seg.astype(np.int32), seg_starts, codes)
+
+    def counts(self, pattern: str) -> np.ndarray:
+        """Number of the pattern's distinct trigrams found in each segment."""
+        qk = np.unique(_trigram_keys(_codes(pattern)))
+        idx = np.searchsorted(self._keys, qk)
+        idx = idx[idx < len(self._keys)]
+        idx = idx[np.isin(self._keys[idx], qk)]
+        hits = [self._postings[self._starts[i] : self._starts[i + 1]] for i in idx.tolist()]
+        if not hits:
+            return np.zeros(self.n_segments, dtype=np.int64)
+        return np.bincount(np.concatenate(hits), minlength=self.n_segments)
+
+    def search(self, pattern: str, max_dist: int, window: int) -> list[tuple[int, int, int]]:
+        """``(first_segment, last_segment, distance)`` for windows matching within ``max_dist``.
+
+        Windows of ``window`` segments are shortlisted by trigram count: each
+        edit destroys at most three of the pattern's trigrams, so a window
+        with fewer than ``len - 2 - 3 * max_dist`` of them cannot match.
+        """
+        counts = self.counts(pattern)
+        n = len(counts)
+        cum = np.concatenate(([0], np.cumsum(counts)))
+        in_window = cum[np.minimum(np.arange(n) + window, n)] - cum[:-1]
+        need = max(1, len(pattern) - 2 - 3 * max_dist)
+        candidates = np.flatnonzero((in_window >= need) & (counts > 0))
+
+        found = []
+        for lo in range(0, len(candidates), VERIFY_BATCH):
+            batch = candidates[lo : lo + VERIFY_BATCH]
+            first = self._seg_starts[batch]
+            last = self._seg_starts[np.minimum(batch + window, n)] - 1
+            if len(pattern) > _WORD_BITS:
+                found.extend(self._search_slow(pattern, max_dist, first, last))
+                continue
+            dist, end = _batch_distance(pattern, self._rows(first, last))
+            keep = dist <= max_dist
+            first, end, dist = first[keep], first[keep] + end[keep], dist[keep]
+            # Running backwards from each best end finds where that alignment starts
+            _, length = _batch_distance(pattern[::-1], self._rows(end - 1, first - 1, step=-1))
+            start = end - length
+            a = np.searchsorted(self._seg_starts, start, side="right") - 1
+            b = np.searchsorted(self._seg_starts, np.maximum(start, end - 1), side="right") - 1
+            found.extend(zip(a.tolist(), b.tolist(), dist.tolist()))
+        return found
+
+    def _search_slow(
+        self, pattern: str, max_dist: int, first: np.ndarray, last: np.ndarray
+    ) -> list[tuple[int, int, int]]:
+        found = []
+        for lo, hi in zip(first.tolist(), last.tolist()):
+            hit = approximate_find(pattern, self._codes[lo:hi].tobytes().decode("utf-32-le"), max_dist)
+            if hit is not None:
+                dist, start, end = hit
+                a, b = np.searchsorted(self._seg_starts, [lo + start, lo + max(start, end - 1)], side="right") - 1
+                found.append((int(a), int(b), dist))
+        return found
+
+    def _rows(self, first: np.ndarray, stop: np.ndarray, step: int = 1) -> np.ndarray:
+        """``codes[first:stop:step]`` for each window as rows of a 2-D array, zero-padded."""
+        width = int(np.abs(stop - first).max()) if len(first) else 0
+        idx = first[:, None] + step * np.arange(width)[None, :]
+        rows = self._codes[np.clip(idx, 0, len(self._codes) - 1)]
+        return np.where(step * idx < step * stop[:, None], rows, 0)
+
+    def save(self, path: Path) -> None:
+        meta = json.dumps({"created_at": self.created_at}).encode("utf-8")
+        meta += b" " * (-(_HEADER.size + len(meta)) % 8)
+        tmp = tmp_path(path)
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, self.n_segments, len(self._keys), len(self._codes), len(meta)))
+            f.write(meta)
+            f.write(self._keys.astype("<i8").tobytes())
+            f.write(self._starts.astype("<i8").tobytes())
+            f.write(self._seg_starts.astype("<i8").tobytes())
+            f.write(self._postings.astype("<i4").tobytes())
+            f.write(self._codes.astype("<u4").tobytes())
+        tmp.rename(path)
+
+    @classmethod
+    def load(cls, path: Path) -> TrigramIndex:
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, n_segments, n_keys, n_chars, meta_len = _HEADER.unpack_from(mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a trigram index: {path}")
+        pos = _HEADER.size
+        meta = json.loads(mm[pos : pos + meta_len])
+        pos += meta_len
+        keys = np.frombuffer(mm, dtype="<i8", count=n_keys, offset=pos)
+        pos += 8 * n_keys
+        starts = np.frombuffer(mm, dtype="<i8", count=n_keys + 1, offset=pos)
+        pos += 8 * (n_keys + 1)
+        seg_starts = np.frombuffer(mm, dtype="<i8", count=n_segments + 1, offset=pos)
+        pos += 8 * (n_segments + 1)
+        n_postings = int(starts[-1])
+        postings = np.frombuffer(mm, dtype="<i4", count=n_postings, offset=pos)
+        pos += 4 * n_postings
+        codes = np.frombuffer(mm, dtype="<u4", count=n_chars, offset=pos)
+        return cls(meta["created_at"], keys, starts, postings, seg_starts, codes)
+
+
+def load_trigrams(book_path: Path, created_at: str, n_segments: int) -> TrigramIndex | None:
+    """Load the book's trigram index if it covers exactly this transcription."""
+    path = trigram_path(book_path)
+    if not path.exists():
+        return None
+    try:
+        index = TrigramIndex.load(path)
+    except (ValueError, struct.error):
+        return None
+    if index.created_at != created_at or index.n_segments != n_segments:
+        return None
+    return index
+
+
+def approximate_find(pattern: str, text: str, max_dist: int) -> tuple[int, int, int] | None:
+    """Best approximate occurrence of ``pattern`` in ``text`` as ``(distance, start, end)``.
+
+    Myers' bit-parallel edit distance, with the match free to start anywhere
+    in ``text``; None when every alignment needs more than ``max_dist`` edits.
+    """
+    m = len(pattern)
+    if not m:
+        return None
+    end, dist = _best_end(pattern, text)
+    if dist > max_dist:
+        return None
+    # Running backwards from the best end finds where that alignment starts
+    back, _ = _best_end(pattern[::-1], text[end - 1 :: -1] if end else "")
+    return dist, end - back, end
+
+
+def _batch_distance(pattern: str, rows: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """``(distance, end)`` of the best approximate match of ``pattern`` in each row.
+
+    The same recurrence as ``_best_end``, run across all rows at once with
+    one uint64 lane per row; zero (padding) columns are ignored.
+    """
+    m = len(pattern)
+    chars = np.array(sorted({ord(c) for c in pattern}), dtype=np.uint32)
+    masks = np.zeros(len(chars), dtype=np.uint64)
+    for i, c in enumerate(pattern):
+        masks[np.searchsorted(chars, ord(c))] |= np.uint64(1 << i)
+    mask = np.uint64((1 << m) - 1)
+    high = np.uint64(1 << (m - 1))
+    one = np.uint64(1)
+    zero = np.uint64(0)
+
+    n = len(rows)
+    pv = np.full(n, mask, dtype=np.uint64)
+    mv = np.zeros(n, dtype=np.uint64)
+    score = np.full(n, m, dtype=np.int64)
+    best = score.copy()
+    best_end = np.zeros(n, dtype=np.int64)
+    for j in range(rows.shape[1]):
+        col = rows[:, j]
+        k = np.minimum(np.searchsorted(chars, col), len(chars) - 1)
+        eq = np.where(chars[k] == col, masks[k], zero)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & mask)
+        mh = pv & xh
+        score += (ph & high != 0).astype(np.int64) - (mh & high != 0).astype(np.int64)
+        ph = (ph << one) & mask
+        mh = (mh << one) & mask
+        pv = mh | (~(xv | ph) & mask)
+        mv = ph & xv
+        better = (score < best) & (col != 0)
+        best = np.where(better, score, best)
+        best_end = np.where(better, j + 1, best_end)
+    return best, best_end
+
+
+def _best_end(pattern: str, text: str) -> tuple[int, int]:
+    """Return ``(end, distance)`` of the lowest-cost alignment ending earliest."""
+    m = len(pattern)
+    mask = (1 << m) - 1
+    high = 1 << (m - 1)
+    peq: dict[str, int] = {}
+    for i, c in enumerate(pattern):
+        peq[c] = peq.get(c, 0) | (1 << i)
+    pv, mv, score = mask, 0, m
+    best, best_end = m, 0
+    for j, c in enumerate(text, 1):
+        eq = peq.get(c, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & mask)
+        mh = pv & xh
+        if ph & high:
+            score += 1
+        elif mh & high:
+            score -= 1
+        ph = (ph << 1) & mask
+        mh = (mh << 1) & mask
+        pv = mh | (~(xv | ph) & mask)
+        mv = ph & xv
+        if score < best:
+            best, best_end = score, j
+    return best_end, best
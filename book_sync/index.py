@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import json
+import mmap
+import re
+import struct
+from collections.abc import Iterable
+from pathlib import Path
+
+import numpy as np
+
+from book_sync.utils import tmp_path
+
+
+MAGIC = b"BIDX"
+VERSION = 1
+_HEADER = struct.Struct("<4sIQQI")  # magic, version, segments, postings, metadata bytes
+TOKEN_RE = re.compile(r"\w+(?:'\w+)*")
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased word tokens; punctuation and spacing are ignored."""
+    return TOKEN_RE.findall(text.lower())
+
+
+def index_path(book_path: Path) -> Path:
+    return book_path / "index.bin"
+
+
+class BookIndex:
+    """Inverted index of a book's transcript: token -> sorted token positions.
+
+    Positions count tokens across the whole book, and ``seg_offsets[i]`` is
+    the position of segment i's first token, so positions map back to
+    segments with a binary search. Segments only ever append, so new ones
+    extend the postings without touching what is already indexed.
+    """
+
+    def __init__(self, created_at: str):
+        self.created_at = created_at
+        self._vocab: dict[str, tuple[int, int]] = {}
+        self._postings = np.zeros(0, dtype=np.int64)
+        self._pending: dict[str, list[int]] = {}
+        self._seg_offsets = np.zeros(1, dtype=np.int64)
+        self._pending_offsets: list[int] = []
+
+    @property
+    def n_segments(self) -> int:
+        return len(self._seg_offsets) - 1 + len(self._pending_offsets)
+
+    @property
+    def n_tokens(self) -> int:
+        return self._pending_offsets[-1] if self._pending_offsets else int(self._seg_offsets[-1])
+
+    def add_segments(self, texts: Iterable[str]) -> None:
+        pos = self.n_tokens
+        for text in texts:
+            for tok in tokenize(text):
+                self._pending.setdefault(tok, []).append(pos)
+                pos += 1
+            self._pending_offsets.append(pos)
+
+    def seg_offsets(self) -> np.ndarray:
+        if self._pending_offsets:
+            self._compact()
+        return self._seg_offsets
+
+    def positions(self, token: str) -> np.ndarray:
+        start, count = self._vocab.get(token, (0, 0))
+        base = self._postings[start : start + count]
+        extra = self._pending.get(token)
+        if extra:
+            return np.concatenate((base, np.asarray(extra, dtype=np.int64)))
+        return base
+
+    def find_phrase(self, query: str, limit: int | None = None) -> tuple[np.ndarray, np.ndarray, int]:
+        """First and last segment of each occurrence of the phrase, and the count.
+
+        Occurrences are in book order; with ``limit`` only the first ``limit``
+        are mapped back to segments, though all of them are counted.
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), 0
+        postings = [self.positions(t) for t in tokens]
+        # Start from the rarest token; every other token must sit at its offset from it
+        rarest = min(range(len(tokens)), key=lambda j: len(postings[j]))
+        cand = postings[rarest] - rarest
+        for j, p in enumerate(postings):
+            if j != rarest and len(cand):
+                cand = _intersect_sorted(cand, p - j)
+        total = len(cand)
+        cand = cand[:limit]
+        offsets = self.seg_offsets()
+        first = np.searchsorted(offsets, cand, side="right") - 1
+        last = np.searchsorted(offsets, cand + len(tokens) - 1, side="right") - 1
+        return first, last, total
+
+    def _compact(self) -> None:
+        """Fold pending postings into the packed arrays."""
+        tokens = set(self._vocab) | set(self._pending)
+        vocab: dict[str, tuple[int, int]] = {}
+        parts = []
+        pos = 0
+        for tok in sorted(tokens):
+            p = self.positions(tok)
+            vocab[tok] = (pos, len(p))
+            parts.append(p)
+            pos += len(p)
+        self._postings = np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+        self._vocab = vocab
+        self._pending = {}
+        self._seg_offsets = np.concatenate(
+            (self._seg_offsets, np.asarray(self._pending_offsets, dtype=np.int64))
+        )
+        self._pending_offsets = []
+
+    def save(self, path: Path) -> None:
+        self._compact()
+        meta = json.dumps({"created_at": self.created_at, "vocab": self._vocab}).encode("utf-8")
+        meta += b" " * (-(_HEADER.size + len(meta)) % 8)
+        tmp = tmp_path(path)
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, self.n_segments, len(self._postings), len(meta)))
+            f.write(meta)
+            f.write(self._seg_offsets.astype("<i8").tobytes())
+            f.write(self._postings.astype("<i8").tobytes())
+        tmp.rename(path)
+
+    @classmethod
+    def load(cls, path: Path) -> BookIndex:
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, n_segments, n_postings, meta_len = _HEADER.unpack_from(mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a book index: {path}")
+        pos = _HEADER.size
+        meta = json.loads(mm[pos : pos + meta_len])
+        pos += meta_len
+        index = cls(meta["created_at"])
+        index._vocab = {tok: tuple(v) for tok, v in meta["vocab"].items()}
+        index._seg_offsets = np.frombuffer(mm, dtype="<i8", count=n_segments + 1, offset=pos)
+        pos += 8 * (n_segments + 1)
+        index._postings = np.frombuffer(mm, dtype="<i8", count=n_postings, offset=pos)
+        return index
+
+
+def _intersect_sorted(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Values in both sorted, duplicate-free arrays, with ``len(a) <= len(b)``."""
+    if not len(b):
+        return a[:0]
+    if len(a) * 16 < len(b):
+        # Few candidates: binary-search each in the long list
+        idx = np.minimum(np.searchsorted(b, a), len(b) - 1)
+        return a[b[idx] == a]
+    # Comparable sizes: a stable sort of two sorted runs is a linear merge
+    merged = np.concatenate((a, b))
+    merged.sort(kind="stable")
+    return merged[:-1][merged[1:] == merged[:-1]]
+
+
+def load_index(book_path: Path, created_at: str, n_segments: int) -> BookIndex | None:
+    """Load the book's index if it was built from this transcription, else None."""
+    path = index_path(book_path)
+    if not path.exists():
+        return None
+    try:
+        index = BookIndex.load(path)
+    except (ValueError, struct.error):
+        return None
+    if index.created_at != created_at or index.n_segments > n_segments:
+        return None
+    return index
+
+
+def build_index(book_path: Path, created_at: str, texts: Iterable[str]) -> BookIndex:
+    index = BookIndex(created_at)
+    index.add_segments(texts)
+    index.save(index_path(book_path))
+    return index
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+
+from book_sync.models import SegmentEntry, SegmentsFile
+
+
+FSYNC_INTERVAL = 50  # fsync the journal every N appended segments
+
+
+def journal_path(segments_path: Path) -> Path:
+    return segments_path.with_suffix(".jsonl")
+
+
+def read_journal(path: Path) -> tuple[dict | None, list[dict], int]:
+    """Return ``(header, entries, valid_bytes)`` from a segments journal.
+
+    A torn final line (a crash mid-write) is ignored; ``valid_bytes`` is the
+    length of the intact prefix, so a writer can truncate back to it.
+    """
+    header = None
+    entries = []
+    valid = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            if header is None:
+                header = record
+            else:
+                entries.append(record)
+            valid += len(line)
+    return header, entries, valid
+
+
+def apply_journal(sf: SegmentsFile | None, path: Path) -> SegmentsFile | None:
+    """Overlay journalled segments on ``sf`` (the last compacted segments.json)."""
+    header, entries, _ = read_journal(path)
+    if header is None:
+        return sf
+    base = header.get("base_segments", 0)
+    if sf is not None and len(sf.segments) != base:
+        return sf  # compacted after this journal was written; it is stale
+    if sf is None:
+        sf = SegmentsFile(model=header["model"], audio_file=header["audio_file"], created_at=header["created_at"])
+    for record in entries:
+        if "text" in record:
+            sf.segments.append(SegmentEntry(start=record["start"], end=record["end"], text=record["text"]))
+        elif "transcribed_until" in record:
+            sf.transcribed_until = max(sf.transcribed_until, record["transcribed_until"])
+    return sf
+
+
+class SegmentsJournal:
+    """Append-only JSON-lines log of new segments and window checkpoints.
+
+    The first line is a header recording how many segments segments.json
+    held when the journal was started, so a journal left behind by a crash
+    after compaction is recognised as stale rather than replayed twice.
+    """
+
+    def __init__(self, segments_path: Path, sf: SegmentsFile, base_segments: int):
+        self.path = journal_path(segments_path)
+        valid = 0
+        if self.path.exists():
+            header, _, valid = read_journal(self.path)
+            if header is None or header.get("base_segments") != base_segments:
+                valid = 0
+        self._f = open(self.path, "r+b" if valid else "wb")
+        self._f.truncate(valid)
+        self._f.seek(valid)
+        if not valid:
+            self._write({
+                "model": sf.model,
+                "audio_file": sf.audio_file,
+                "created_at": sf.created_at,
+                "base_segments": base_segments,
+            })
+            self.sync()
+        self._unsynced = 0
+
+    def _write(self, record: dict) -> None:
+        self._f.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+
+    def append(self, seg: SegmentEntry) -> None:
+        self._write({"start": seg.start, "end": seg.end, "text": seg.text})
+        self._unsynced += 1
+        if self._unsynced >= FSYNC_INTERVAL:
+            self.sync()
+
+    def checkpoint(self, transcribed_until: float) -> None:
+        self._write({"transcribed_until": transcribed_until})
+        self.sync()
+
+    def sync(self) -> None:
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._unsynced = 0
+
+    def close(self) -> None:
+        self.sync()
+        self._f.close()
+
+    def discard(self) -> None:
+        self._f.close()
+        self.path.unlink(missing_ok=True)
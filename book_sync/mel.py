@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+SAMPLE_RATE = 16000
+N_FFT = 400
+HOP_LENGTH = 160
+WINDOW_SECONDS = 30  # Whisper's fixed input length
+N_SAMPLES = WINDOW_SECONDS * SAMPLE_RATE
+N_FRAMES = N_SAMPLES // HOP_LENGTH
+TIME_PRECISION = 0.02  # seconds per Whisper timestamp token
+N_BINS = N_FFT // 2 + 1
+
+
+def _dft_basis() -> np.ndarray:
+    """Hann-windowed real DFT as an ``(N_FFT, 2 * N_BINS)`` matrix: cosines, then sines."""
+    window = np.hanning(N_FFT + 1)[:-1]  # periodic, like torch.hann_window
+    angle = 2 * np.pi * np.outer(np.arange(N_FFT), np.arange(N_BINS)) / N_FFT
+    basis = np.concatenate((np.cos(angle), -np.sin(angle)), axis=1) * window[:, None]
+    return basis.astype(np.float32)
+
+
+_BASIS = _dft_basis()
+
+
+def log_mel_batch(windows: np.ndarray, filters: np.ndarray) -> np.ndarray:
+    """Whisper's log-mel spectrogram for a ``(batch, N_SAMPLES)`` array, in one pass.
+
+    ``filters`` is the model's ``(n_mels, N_BINS)`` filterbank. The STFT of
+    every frame of every window is one float32 matrix product with a
+    windowed DFT basis, which BLAS spreads over all cores (and which beats a
+    per-frame FFT at this size). Each window is normalised against its own
+    peak, as Whisper does. Returns ``(batch, n_mels, N_FRAMES)`` float32.
+    """
+    windows = np.asarray(windows, dtype=np.float32)
+    padded = np.pad(windows, ((0, 0), (N_FFT // 2, N_FFT // 2)), mode="reflect")
+    # Whisper drops the last frame
+    frames = sliding_window_view(padded, N_FFT, axis=1)[:, ::HOP_LENGTH][:, :-1]
+    spectrum = np.square(frames @ _BASIS)
+    power = spectrum[..., :N_BINS] + spectrum[..., N_BINS:]
+    mel = power @ np.asarray(filters, dtype=np.float32).T
+    log_spec = np.log10(np.maximum(mel, 1e-10))
+    log_spec = np.maximum(log_spec, log_spec.max(axis=(1, 2), keepdims=True) - 8.0)
+    return np.ascontiguousarray(((log_spec + 4.0) / 4.0).transpose(0, 2, 1))
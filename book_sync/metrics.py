@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import cProfile
+import json
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pathlib import Path
+
+from book_sync.config import DATA_DIR, Settings
+
+
+METRICS_NAME = "metrics.json"
+PROM_DIR_NAME = ".metrics"  # hidden, so the catalog doesn't mistake it for a book
+PROM_PREFIX = "book_sync"
+
+
+class StageMetrics:
+    """Timers and counters collected while one stage of one book runs.
+
+    Timers add up across calls, and across worker processes when they
+    report back, so a step's seconds can exceed the stage's wall time.
+    """
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.timers: dict[str, list[float]] = {}  # step -> [seconds, calls]
+        self.counters: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add_time(self, step: str, seconds: float, calls: int = 1) -> None:
+        with self._lock:
+            entry = self.timers.setdefault(step, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += calls
+
+    def count(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def to_dict(self, seconds: float, status: str, started_at: str) -> dict:
+        counters = dict(self.counters)
+        rates = {}
+        if seconds > 0:
+            if "bytes_downloaded" in counters:
+                rates["bytes_per_second"] = counters["bytes_downloaded"] / seconds
+            if "audio_seconds" in counters:
+                rates["audio_seconds_per_second"] = counters["audio_seconds"] / seconds
+        inference = self.timers.get("inference", [0.0])[0]
+        if inference > 0 and "inference_audio_seconds" in counters:
+            rates["inference_audio_seconds_per_second"] = counters["inference_audio_seconds"] / inference
+        return {
+            "status": status,
+            "started_at": started_at,
+            "seconds": seconds,
+            "timers": {step: {"seconds": s, "calls": n} for step, (s, n) in self.timers.items()},
+            "counters": counters,
+            "rates": rates,
+        }
+
+
+_current: ContextVar[StageMetrics | None] = ContextVar("stage_metrics", default=None)
+_profiling = threading.Lock()  # held by the one profiled stage; Python 3.12+ allows one profiler at a time
+
+
+@contextmanager
+def timer(step: str) -> Iterator[None]:
+    """Time a sub-step of the stage being recorded (a no-op outside one)."""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add_time(step, time.perf_counter() - t0)
+
+
+def add_time(step: str, seconds: float, calls: int = 1) -> None:
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.add_time(step, seconds, calls)
+
+
+def count(name: str, value: float = 1) -> None:
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.count(name, value)
+
+
+def _profiled(settings: Settings, stage: str) -> bool:
+    stages = {s.strip() for s in settings.profile_stages.split(",") if s.strip()}
+    return stage in stages or "all" in stages
+
+
+@contextmanager
+def record_stage(book_path: Path, stage: str, settings: Settings) -> Iterator[StageMetrics]:
+    """Collect metrics for a stage and save them when it ends, even if it fails.
+
+    They go into the book's metrics.json (last run of each stage) and a
+    Prometheus textfile. Stages listed in ``settings.profile_stages`` are
+    also run under cProfile, saved as ``profile-<stage>.pstats``; profiled
+    stages run one at a time, so concurrent scheduler workers wait here.
+    """
+    profiler = cProfile.Profile() if _profiled(settings, stage) else None
+    if profiler is not None:
+        _profiling.acquire()
+    metrics = StageMetrics(stage)
+    token = _current.set(metrics)
+    started_at = datetime.now(timezone.utc).isoformat()
+    status = "failed"
+    t0 = time.perf_counter()
+    try:
+        if profiler is not None:
+            profiler.enable()
+        yield metrics
+        status = "ok"
+    finally:
+        seconds = time.perf_counter() - t0
+        if profiler is not None:
+            profiler.disable()
+            _profiling.release()
+            profiler.dump_stats(book_path / f"profile-{stage}.pstats")
+        _current.reset(token)
+        write_metrics(book_path, stage, metrics.to_dict(seconds, status, started_at), settings)
+
+
+def load_metrics(book_path: Path) -> dict:
+    path = book_path / METRICS_NAME
+    if not path.exists():
+        return {"stages": {}}
+    return json.loads(path.read_text())
+
+
+def write_metrics(book_path: Path, stage: str, result: dict, settings: Settings) -> None:
+    from book_sync.utils import tmp_path  # utils imports this module
+
+    data = load_metrics(book_path)
+    data["stages"][stage] = result
+    path = book_path / METRICS_NAME
+    tmp = tmp_path(path)
+    tmp.write_text(json.dumps(data, indent=2))
+    tmp.rename(path)
+    write_textfile(book_path.name, data, prom_dir(settings))
+
+
+def prom_dir(settings: Settings) -> Path:
+    return Path(settings.metrics_dir) if settings.metrics_dir else DATA_DIR / PROM_DIR_NAME
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _prom_name(name: str) -> str:
+    return f"{PROM_PREFIX}_{name}"
+
+
+def render_textfile(book: str, data: dict) -> str:
+    """Prometheus exposition text for a book's metrics.json, one series per stage and step."""
+    series: dict[str, list[str]] = {}
+
+    def add(name: str, value: float, **labels: str) -> None:
+        text = ",".join(f'{k}="{_label(v)}"' for k, v in {"book": book, **labels}.items())
+        series.setdefault(_prom_name(name), []).append(f"{_prom_name(name)}{{{text}}} {value:.6g}")
+
+    for stage, result in data["stages"].items():
+        add("stage_seconds", result["seconds"], stage=stage)
+        add("stage_ok", 1 if result["status"] == "ok" else 0, stage=stage)
+        for step, t in result["timers"].items():
+            add("step_seconds", t["seconds"], stage=stage, step=step)
+            add("step_calls", t["calls"], stage=stage, step=step)
+        for name, value in {**result["counters"], **result["rates"]}.items():
+            add(name, value, stage=stage)
+
+    lines = []
+    for name, samples in series.items():
+        lines.append(f"# TYPE {name} gauge")
+        lines += samples
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(book: str, data: dict, directory: Path) -> Path:
+    """Write ``<book>.prom`` for node_exporter's textfile collector, atomically."""
+    from book_sync.utils import tmp_path
+
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{book}.prom"
+    tmp = tmp_path(directory / f".{book}.prom")  # hidden and not *.prom, so the collector skips it
+    tmp.write_text(render_textfile(book, data))
+    tmp.rename(path)
+    return path
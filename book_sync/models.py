@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from collections.abc import Sequence
 from dataclasses import dataclass, field
 
 
@@ -16,7 +17,16 @@ class State:
     stage: str = "downloading"
     last_segment: int = 0
     model: str = "mlx-community/whisper-large-v3-turbo"
+    # Block checksums by role ("audio_original", "audio_wav"): the hex sha256 of the
+    # concatenated sha256 digests of the file's 4 MiB blocks (utils.checksum_file)
     checksums: dict[str, str] = field(default_factory=dict)
+    fingerprints: dict[str, str] = field(default_factory=dict)  # stat fingerprint of each checksummed file
+    regions: list[dict] = field(default_factory=list)  # {"start", "end", "model", "draft"} per transcribed range
+
+    def __post_init__(self) -> None:
+        # Older state.json files kept fingerprints in checksums as "<key>_fingerprint"
+        for key in [k for k in self.checksums if k.endswith("_fingerprint")]:
+            self.fingerprints.setdefault(key.removesuffix("_fingerprint"), self.checksums.pop(key))
 
 
 @dataclass
@@ -31,4 +41,32 @@ class SegmentsFile:
     model: str
     audio_file: str
     created_at: str
-    segments: list[SegmentEntry] = field(default_factory=list)
+    segments: Sequence[SegmentEntry] = field(default_factory=list)  # a list, a lazy SegmentStore or DraftOverlay
+    transcribed_until: float = 0.0  # end of the last fully transcribed window
+    draft_from: int | None = None  # segments from here on are draft text (see segments.load_segments_file)
+
+
+@dataclass
+class CatalogEntry:
+    name: str  # book directory name
+    title: str | None = None
+    audio_url: str | None = None
+    duration_seconds: float | None = None
+    stage: str = "downloading"
+    model: str | None = None
+    checksums: dict[str, str] = field(default_factory=dict)
+    segment_count: int = 0
+    regions: list[dict] = field(default_factory=list)
+    created_at: str = ""
+    updated_at: str = ""
+
+
+@dataclass
+class WatchedFeed:
+    url: str
+    interval_seconds: float
+    etag: str | None = None
+    last_modified: str | None = None
+    known: list[str] = field(default_factory=list)  # ids of entries already queued as books
+    failures: int = 0  # consecutive failed polls, for backoff
+    checked_at: str | None = None
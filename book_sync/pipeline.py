@@ -1,15 +1,14 @@
 from __future__ import annotations
 
 import json
+from dataclasses import replace
 from pathlib import Path
 
-from book_sync.config import Settings, DATA_DIR
-from book_sync.convert import convert_to_wav
-from book_sync.download import download_audio
+from book_sync import catalog, metrics, store
+from book_sync.config import Settings
 from book_sync.feed import audio_extension, parse_feed, save_feed_json
 from book_sync.models import State
-from book_sync.transcribe import load_segments_file, transcribe_audio, write_transcript
-from book_sync.utils import book_dir, sha256_file
+from book_sync.utils import book_dir, format_timestamp, record_checksum, tmp_path
 
 
 def load_state(book_path: Path) -> State:
@@ -27,48 +26,149 @@ def save_state(state: State, book_path: Path) -> None:
         "last_segment": state.last_segment,
         "model": state.model,
         "checksums": state.checksums,
+        "fingerprints": state.fingerprints,
+        "regions": state.regions,
     }
-    tmp = path.with_suffix(".tmp")
+    tmp = tmp_path(path)
     tmp.write_text(json.dumps(data, indent=2))
     tmp.rename(path)
+    catalog.record_state(book_path.name, state)
 
 
-def run_rss(url: str, settings: Settings) -> None:
-    print(f"Parsing RSS feed: {url}")
-    info = parse_feed(url)
-    print(f"Book: {info.title}")
-    save_feed_json(info)
+def _tiered(settings: Settings) -> bool:
+    return bool(settings.draft_model) and settings.draft_model != settings.model
+
+
+def final_regions(regions: list[dict], until: float, model: str) -> list[dict]:
+    """``regions`` once the final pass has transcribed up to ``until`` with ``model``."""
+    upgraded = [{"start": 0.0, "end": until, "model": model, "draft": False}]
+    for r in regions:
+        if r["draft"] and r["end"] > until:
+            upgraded.append({**r, "start": max(r["start"], until)})
+    return upgraded
 
-    bdir = book_dir(info.title)
-    ext = audio_extension(info.audio_url)
+
+def run_stage(bdir: Path, audio_url: str, state: State, settings: Settings) -> None:
+    """Run the book's current stage and advance ``state.stage`` to the next one.
+
+    The new stage is saved before returning, so a crash repeats at most the
+    stage that was in progress (and each stage resumes its own partial work).
+    Timings and throughput go to the book's metrics.json. Each stage imports
+    its own module, so commands that never run one skip httpx, numpy and the
+    Whisper backends.
+
+    With ``settings.draft_model`` a "drafting" stage first transcribes the
+    book with that (fast) model, so it can be searched within minutes. The
+    transcribing stage then replaces the draft as far as it has got at each
+    checkpoint, and ``state.regions`` records which model wrote what.
+    """
+    ext = audio_extension(audio_url)
     audio_path = bdir / f"book{ext}"
     wav_path = bdir / "book.wav"
+    state.model = settings.model
 
+    with metrics.record_stage(bdir, state.stage, settings):
+        if state.stage == "downloading":
+            digest = store.link_known_audio(audio_url, audio_path)
+            if digest is None:
+                from book_sync.download import download_audio
+
+                digest = download_audio(audio_url, audio_path, settings.download_connections)
+            store.add_object(audio_path, digest)
+            record_checksum(state, "audio_original", audio_path, digest)
+            state.stage = "converting"
+
+        # Identical audio already transcribed with this model (e.g. the same book in another feed)
+        elif (cached := store.restore_transcript(bdir, state.checksums.get("audio_original"), settings)) is not None:
+            from book_sync.segments import remove_draft
+
+            remove_draft(bdir / "segments.json")
+            state.last_segment = cached
+            state.regions = []
+            metrics.count("segments", cached)
+            state.stage = "done"
+
+        # Stream mode decodes during transcription instead
+        elif state.stage == "converting":
+            if not settings.stream:
+                _convert(audio_path, wav_path, state, settings)
+            state.stage = "drafting" if _tiered(settings) else "transcribing"
+
+        elif state.stage == "drafting" and not _tiered(settings):
+            state.stage = "transcribing"  # draft_model was cleared since the book was converted
+
+        elif state.stage == "drafting":
+            from book_sync.segments import draft_path, read_segments_json, set_aside_draft
+            from book_sync.transcribe import transcribe_audio, write_transcript
+
+            source = _transcription_source(audio_path, wav_path, state, settings)
+            segments_path = bdir / "segments.json"
+            if draft_path(segments_path).exists():
+                sf = read_segments_json(draft_path(segments_path))  # drafted before a crash
+            else:
+                sf = transcribe_audio(source, bdir, replace(settings, model=settings.draft_model))
+                write_transcript(sf, bdir)
+                set_aside_draft(segments_path)
+            state.last_segment = len(sf.segments)
+            state.regions = [{"start": 0.0, "end": sf.transcribed_until, "model": sf.model, "draft": True}]
+            state.stage = "transcribing"
+
+        elif state.stage == "transcribing":
+            from book_sync.segments import remove_draft
+            from book_sync.transcribe import transcribe_audio, write_transcript
+
+            def checkpoint(until: float) -> None:
+                state.regions = final_regions(state.regions, until, settings.model)
+                save_state(state, bdir)
+
+            source = _transcription_source(audio_path, wav_path, state, settings)
+            sf = transcribe_audio(source, bdir, settings, checkpoint if state.regions else None)
+            state.last_segment = len(sf.segments)
+            state.regions = final_regions([], sf.transcribed_until, settings.model)
+            write_transcript(sf, bdir)
+            remove_draft(bdir / "segments.json")
+            store.save_transcript(bdir, state.checksums.get("audio_original"), settings, state.last_segment)
+            state.stage = "done"
+
+        else:
+            raise ValueError(f"No stage to run for {bdir.name}: {state.stage}")
+    save_state(state, bdir)
+
+
+def _convert(audio_path: Path, wav_path: Path, state: State, settings: Settings) -> None:
+    from book_sync.convert import convert_to_wav
+
+    digest = convert_to_wav(audio_path, wav_path, settings) or record_checksum(state, "audio_wav", wav_path)
+    store.add_object(wav_path, digest)
+    record_checksum(state, "audio_wav", wav_path, digest)
+
+
+def _transcription_source(audio_path: Path, wav_path: Path, state: State, settings: Settings) -> Path:
+    """The original audio in stream mode, else book.wav.
+
+    A book converted while stream mode was on has no book.wav, so it is
+    made now if stream mode has since been turned off.
+    """
+    if settings.stream:
+        return audio_path
+    if not wav_path.exists():
+        _convert(audio_path, wav_path, state, settings)
+    return wav_path
+
+
+def _run_stages(bdir: Path, audio_url: str, settings: Settings) -> None:
     state = load_state(bdir)
-    state.model = settings.model
+    while state.stage != "done":
+        run_stage(bdir, audio_url, state, settings)
 
-    # Stage: downloading
-    if state.stage == "downloading":
-        download_audio(info.audio_url, audio_path)
-        state.checksums["audio_original"] = sha256_file(audio_path)
-        state.stage = "converting"
-        save_state(state, bdir)
-
-    # Stage: converting
-    if state.stage == "converting":
-        convert_to_wav(audio_path, wav_path, settings)
-        state.checksums["audio_wav"] = sha256_file(wav_path)
-        state.stage = "transcribing"
-        save_state(state, bdir)
-
-    # Stage: transcribing
-    if state.stage == "transcribing":
-        sf = transcribe_audio(wav_path, bdir, settings)
-        state.last_segment = len(sf.segments)
-        write_transcript(sf, bdir)
-        state.stage = "done"
-        save_state(state, bdir)
 
+def run_rss(url: str, settings: Settings) -> None:
+    print(f"Parsing RSS feed: {url}")
+    info = parse_feed(url)
+    print(f"Book: {info.title}")
+    save_feed_json(info)
+
+    _run_stages(book_dir(info.title), info.audio_url, settings)
     print(f"Pipeline complete: {info.title}")
 
 
@@ -82,42 +182,20 @@ def run_process(title: str, settings: Settings) -> None:
         raise FileNotFoundError(f"No feed.json in {bdir}")
 
     feed_data = json.loads(feed_path.read_text())
-    ext = audio_extension(feed_data["audio_url"])
-    audio_path = bdir / f"book{ext}"
-    wav_path = bdir / "book.wav"
-
-    state = load_state(bdir)
-    state.model = settings.model
-
-    if state.stage == "downloading":
-        download_audio(feed_data["audio_url"], audio_path)
-        state.checksums["audio_original"] = sha256_file(audio_path)
-        state.stage = "converting"
-        save_state(state, bdir)
-
-    if state.stage == "converting":
-        convert_to_wav(audio_path, wav_path, settings)
-        state.checksums["audio_wav"] = sha256_file(wav_path)
-        state.stage = "transcribing"
-        save_state(state, bdir)
+    _run_stages(bdir, feed_data["audio_url"], settings)
+    print(f"Book already complete: {title}")
 
-    if state.stage == "transcribing":
-        sf = transcribe_audio(wav_path, bdir, settings)
-        state.last_segment = len(sf.segments)
-        write_transcript(sf, bdir)
-        state.stage = "done"
-        save_state(state, bdir)
 
-    if state.stage == "done":
-        print(f"Book already complete: {title}")
+def describe_stage(stage: str, regions: list[dict]) -> str:
+    """The stage, plus how far the final pass has replaced the draft."""
+    drafts = [r for r in regions if r["draft"]]
+    if not drafts:
+        return stage
+    final_until = drafts[0]["start"]
+    if not final_until:
+        return f"{stage} (draft text)"
+    return f"{stage} (final to {format_timestamp(final_until)}, draft after)"
 
 
 def list_books() -> list[tuple[str, str]]:
-    if not DATA_DIR.exists():
-        return []
-    results = []
-    for child in sorted(DATA_DIR.iterdir()):
-        if child.is_dir():
-            state = load_state(child)
-            results.append((child.name, state.stage))
-    return results
+    return [(e.name, describe_stage(e.stage, e.regions)) for e in catalog.entries()]
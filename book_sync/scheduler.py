@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import shutil
+import threading
+from collections.abc import Sequence
+from dataclasses import dataclass
+from pathlib import Path
+
+from book_sync import catalog
+from book_sync.config import DATA_DIR, Settings
+from book_sync.feed import parse_feed, save_feed_json
+from book_sync.models import State
+from book_sync.pipeline import load_state, run_stage
+from book_sync.utils import book_dir
+
+
+DISK_POLL_SECONDS = 30.0  # re-check free space this often while work waits on it
+AUDIO_BYTES_PER_SECOND = 16_000  # ~128 kbit/s, to estimate a download's size from its duration
+
+
+@dataclass
+class Job:
+    bdir: Path
+    audio_url: str
+    state: State
+    priority: int = 0
+    duration_seconds: float | None = None
+    reserved: int = 0  # estimated bytes the running stage will still write
+
+
+class Scheduler:
+    """Run a queue of books through their stages, one worker pool per stage.
+
+    Each stage has its own concurrency limit, so books download while
+    another converts and a third transcribes. Within a stage, waiting books
+    run highest priority first, then in the order they were added. Drafting
+    has a pool of its own (with the transcription limit), so a new book's
+    draft never waits behind another book's hours-long final pass.
+
+    Downloads are held back while ``max_pending_books`` books are downloaded
+    but not yet transcribed, and downloads and conversions wait while their
+    estimated output would leave less than ``min_free_gb`` free. Each stage
+    saves state.json as it finishes, so an interrupted run resumes from the
+    stage that was in progress.
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.limits = {
+            "downloading": max(settings.parallel_downloads, 1),
+            "converting": max(settings.parallel_conversions, 1),
+            "drafting": max(settings.parallel_transcriptions, 1),
+            "transcribing": max(settings.parallel_transcriptions, 1),
+        }
+        self.completed: list[str] = []
+        self.failed: list[tuple[str, str]] = []
+        self._ready: dict[str, list[tuple[int, int, Job]]] = {stage: [] for stage in self.limits}
+        self._running = {stage: 0 for stage in self.limits}
+        self._outstanding = 0
+        self._reserved = 0
+        self._stopping = False
+        self._disk_waits: set[str] = set()  # stages held back by free space
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def add(self, bdir: Path, audio_url: str, priority: int = 0, duration_seconds: float | None = None) -> bool:
+        """Queue a book at the stage its state.json records; False if it is already done."""
+        state = load_state(bdir)
+        if state.stage == "done":
+            return False
+        with self._cond:
+            self._outstanding += 1
+            self._push(Job(bdir, audio_url, state, priority, duration_seconds))
+            self._cond.notify_all()
+        return True
+
+    def run(self) -> None:
+        threads = [
+            threading.Thread(target=self._worker, args=(stage,), name=f"{stage}-{i}", daemon=True)
+            for stage, limit in self.limits.items()
+            for i in range(limit)
+        ]
+        for t in threads:
+            t.start()
+        try:
+            for t in threads:
+                t.join()
+        except KeyboardInterrupt:
+            with self._cond:
+                self._stopping = True
+                self._cond.notify_all()
+            print("Interrupted; run schedule again to resume", flush=True)
+            raise
+
+    def _push(self, job: Job) -> None:
+        heapq.heappush(self._ready[job.state.stage], (-job.priority, next(self._seq), job))
+
+    def _worker(self, stage: str) -> None:
+        while True:
+            job = self._take(stage)
+            if job is None:
+                return
+            name = job.bdir.name
+            print(f"[{name}] {stage}", flush=True)
+            try:
+                run_stage(job.bdir, job.audio_url, job.state, self.settings)
+            except Exception as e:
+                print(f"[{name}] {stage} failed: {e}", flush=True)
+                with self._cond:
+                    self._finish(stage, job)
+                    self.failed.append((name, f"{stage}: {e}"))
+                    self._outstanding -= 1
+                    self._cond.notify_all()
+                continue
+            with self._cond:
+                self._finish(stage, job)
+                if job.state.stage == "done":
+                    print(f"[{name}] done", flush=True)
+                    self.completed.append(name)
+                    self._outstanding -= 1
+                else:
+                    self._push(job)
+                self._cond.notify_all()
+
+    def _take(self, stage: str) -> Job | None:
+        """Block until a book may start ``stage``; None once there is no work left."""
+        with self._cond:
+            while not self._stopping and self._outstanding:
+                job = self._admit(stage)
+                if job is not None:
+                    return job
+                self._cond.wait(DISK_POLL_SECONDS if stage in self._disk_waits else None)
+            return None
+
+    def _admit(self, stage: str) -> Job | None:
+        ready = self._ready[stage]
+        if not ready:
+            return None
+        job = ready[0][2]
+        if stage == "downloading" and self.settings.max_pending_books > 0:
+            if self._pending() >= self.settings.max_pending_books:
+                return None
+        if stage in ("downloading", "converting") and self.settings.min_free_gb > 0:
+            need = self._estimate(stage, job)
+            free = shutil.disk_usage(DATA_DIR).free - self._reserved
+            if free - need < self.settings.min_free_gb * (1 << 30):
+                if stage not in self._disk_waits:
+                    print(f"Waiting for disk space: {free >> 20} MB free, keeping {self.settings.min_free_gb} GB", flush=True)
+                    self._disk_waits.add(stage)
+                return None
+            self._disk_waits.discard(stage)
+            job.reserved = need
+            self._reserved += need
+        heapq.heappop(ready)
+        self._running[stage] += 1
+        return job
+
+    def _finish(self, stage: str, job: Job) -> None:
+        self._running[stage] -= 1
+        self._reserved -= job.reserved
+        job.reserved = 0
+
+    def _pending(self) -> int:
+        """Books downloading or downloaded whose transcription has not finished."""
+        return (
+            self._running["downloading"]
+            + sum(self._running[s] + len(self._ready[s]) for s in ("converting", "drafting", "transcribing"))
+        )
+
+    def _estimate(self, stage: str, job: Job) -> int:
+        """Rough bytes ``stage`` will write for this book (0 when unknown)."""
+        if not job.duration_seconds:
+            return 0
+        if stage == "downloading":
+            return int(job.duration_seconds * AUDIO_BYTES_PER_SECOND)
+        if stage == "converting" and not self.settings.stream:
+            return int(job.duration_seconds * self.settings.sample_rate * 2)
+        return 0
+
+
+def _priority(name: str, priorities: Sequence[tuple[str, int]]) -> int:
+    matches = [p for text, p in priorities if text.lower() in name.lower()]
+    return max(matches, default=0)
+
+
+def run_schedule(
+    filters: Sequence[str],
+    settings: Settings,
+    feeds: Sequence[str] = (),
+    priorities: Sequence[tuple[str, int]] = (),
+) -> Scheduler:
+    """Process unfinished books concurrently, stage by stage.
+
+    Books are those whose names contain one of ``filters``, plus those of
+    any RSS ``feeds`` (added to the library first); with neither, every
+    unfinished book. ``priorities`` are ``(text, priority)`` pairs applied
+    to books whose names contain ``text``.
+    """
+    names = []
+    for url in feeds:
+        print(f"Parsing RSS feed: {url}")
+        info = parse_feed(url)
+        save_feed_json(info)
+        names.append(book_dir(info.title).name)
+
+    # Stages come from each book's state.json, which is written before the catalog
+    entries = catalog.entries(filters) if filters or not feeds else []
+    entries += [e for e in map(catalog.get_entry, names) if e is not None and e not in entries]
+
+    scheduler = Scheduler(settings)
+    queued = 0
+    for e in entries:
+        if not e.audio_url:
+            print(f"Skipping {e.name}: no feed.json")
+            continue
+        queued += scheduler.add(DATA_DIR / e.name, e.audio_url, _priority(e.name, priorities), e.duration_seconds)
+    if not queued:
+        print("No unfinished books to process")
+        return scheduler
+    print(f"Scheduling {queued} book(s)", flush=True)
+    scheduler.run()
+    print(f"Finished {len(scheduler.completed)} of {queued} book(s)")
+    for name, error in scheduler.failed:
+        print(f"  Failed: {name} ({error})")
+    return scheduler
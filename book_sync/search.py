@@ -1,40 +1,319 @@
 from __future__ import annotations
 
+import heapq
+import re
+import threading
 from bisect import bisect_right
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from dataclasses import dataclass, field
+from itertools import islice
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-from book_sync.models import SegmentEntry
-from book_sync.transcribe import load_segments_file
+from book_sync import catalog
+from book_sync.config import DATA_DIR
+from book_sync.models import SegmentEntry, SegmentsFile
+from book_sync.segments import DRAFT_NAME, load_segments_file
+from book_sync.segstore import SegmentStore
 from book_sync.utils import format_timestamp
 
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+
+    from book_sync.fuzzy import TrigramIndex
+    from book_sync.index import BookIndex
+
 
 CONTEXT_SEGMENTS = 2
+MAX_SEARCH_WORKERS = 8
+FUZZY_WINDOW_SEGMENTS = 2  # a fuzzy match may straddle one segment boundary
+
+
+@dataclass
+class Match:
+    """One search hit. Its context segments are only read when asked for."""
+
+    segments: Sequence[SegmentEntry] = field(repr=False)
+    seg_start: int
+    seg_end: int
+    score: float = 1.0
+    book: str | None = None
+    draft_from: int | None = None  # the book's first draft segment, if it has draft text
+
+    @property
+    def draft(self) -> bool:
+        """Whether any of the matched text comes from the draft model."""
+        return self.draft_from is not None and self.seg_end >= self.draft_from
+
+    @property
+    def timestamp_start(self) -> float:
+        return self.segments[self.seg_start].start
+
+    @property
+    def timestamp_end(self) -> float:
+        return self.segments[self.seg_end].end
+
+    @property
+    def context_start(self) -> int:
+        return max(0, self.seg_start - CONTEXT_SEGMENTS)
+
+    @property
+    def context_end(self) -> int:
+        return min(len(self.segments) - 1, self.seg_end + CONTEXT_SEGMENTS)
+
+    def context(self) -> list[SegmentEntry]:
+        return list(self.segments[self.context_start : self.context_end + 1])
+
+    def to_dict(self) -> dict:
+        return {
+            "book": self.book,
+            "timestamp_start": self.timestamp_start,
+            "timestamp_end": self.timestamp_end,
+            "seg_start": self.seg_start,
+            "seg_end": self.seg_end,
+            "context": [{"start": c.start, "end": c.end, "text": c.text} for c in self.context()],
+            "context_start": self.context_start,
+            "match_start": self.seg_start,
+            "match_end": self.seg_end,
+            "score": self.score,
+            "draft": self.draft,
+        }
+
+
+def search_book(
+    book_path: Path,
+    query: str,
+    substring: bool = False,
+    fuzzy: bool = False,
+    limit: int | None = None,
+    offset: int = 0,
+) -> Iterator[Match]:
+    """Search transcript for a phrase, yielding matches best first.
+
+    By default whole-word phrases are looked up in the book's inverted
+    index (case and punctuation are ignored). ``substring=True`` scans the
+    joined transcript instead, which also finds partial words, and
+    ``fuzzy=True`` tolerates misspellings and split words (see
+    ``_fuzzy_matches``). Exact matches come in book order; fuzzy ones by
+    score. ``offset`` and ``limit`` page through them, and matches past the
+    page are never mapped to segments. While the final model is still
+    replacing a draft transcript, ``Match.draft`` tells which text a match
+    comes from.
+    """
+    book = open_book(book_path)
+    stop = None if limit is None else offset + limit
+    matches, _ = book.find(query, substring, fuzzy, stop)
+    draft_from = book.sf.draft_from
+    return (Match(book.segments, a, b, score, draft_from=draft_from) for a, b, score in islice(matches, offset, stop))
 
 
-def search_book(book_path: Path, query: str) -> list[dict]:
-    """Search transcript for a phrase, returning matches with timestamps."""
+class OpenBook:
+    """A book's transcript opened for searching; its indexes load on first use.
+
+    Safe to share between threads once opened, so callers that search
+    repeatedly (the search server) can keep instances around.
+    """
+
+    def __init__(self, path: Path, sf: SegmentsFile):
+        self.path = path
+        self.sf = sf
+        self._index: BookIndex | None = None
+        self._trigrams: TrigramIndex | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def title(self) -> str:
+        return self.path.name
+
+    @property
+    def segments(self) -> Sequence[SegmentEntry]:
+        return self.sf.segments
+
+    def find(
+        self, query: str, substring: bool = False, fuzzy: bool = False, limit: int | None = None
+    ) -> tuple[Iterator[tuple[int, int, float]], int]:
+        """``(first_segment, last_segment, score)`` per match best first, and the match count.
+
+        Exact matches score 1.0; fuzzy ones score lower the more edits they
+        need. Ties are broken by position. With ``limit``, matches past the
+        first ``limit`` are counted but not produced.
+        """
+        if not self.segments:
+            return iter(()), 0
+        if fuzzy:
+            matches = _fuzzy_matches(self.trigrams(), query)
+            best = heapq.nsmallest(limit, matches, key=_rank) if limit is not None else sorted(matches, key=_rank)
+            return iter(best), len(matches)
+        if substring:
+            found, total = _scan_matches(self.segments, query)
+            return ((a, b, 1.0) for a, b in islice(found, limit)), total
+        first, last, total = self.index().find_phrase(query, limit)
+        return ((a, b, 1.0) for a, b in zip(first.tolist(), last.tolist())), total
+
+    def index(self) -> BookIndex:
+        with self._lock:
+            if self._index is None:
+                self._index = _book_index(self.path, self.sf)
+            return self._index
+
+    def trigrams(self) -> TrigramIndex:
+        with self._lock:
+            if self._trigrams is None:
+                self._trigrams = _book_trigrams(self.path, self.sf)
+            return self._trigrams
+
+
+def open_book(book_path: Path) -> OpenBook:
+    """Open a book for searching. Reading never writes: transcription owns the book's files."""
     sf = load_segments_file(book_path / "segments.json")
     if sf is None:
         raise FileNotFoundError(f"No segments.json in {book_path}")
+    return OpenBook(book_path, sf)
+
+
+def transcribed_books(filters: Sequence[str] = ()) -> list[Path]:
+    """Book directories with a transcript, optionally only titles containing a filter."""
+    books = []
+    for entry in catalog.entries(filters, stages=("drafting", "transcribing", "done")):
+        path = DATA_DIR / entry.name
+        if any((path / name).exists() for name in ("segments.json", "segments.jsonl", DRAFT_NAME)):
+            books.append(path)
+    return books
+
+
+def search_library(
+    query: str,
+    books: Sequence[Path],
+    limit: int | None = None,
+    substring: bool = False,
+    fuzzy: bool = False,
+    offset: int = 0,
+    workers: int = 0,
+    opener: Callable[[Path], OpenBook] = open_book,
+    executor: Executor | None = None,
+) -> tuple[list[Match], int]:
+    """Search several books at once; returns one page of the ranked hits and the total count.
+
+    Books are searched on a thread pool (index lookups are mmap reads and
+    numpy set operations, which release the GIL). Hits are ranked by score,
+    then by how densely the phrase occurs in its book, then by position, and
+    each book only produces the hits that could reach the requested page
+    (``offset`` onwards, at most ``limit``). ``opener`` and
+    ``executor`` let a long-running caller supply cached books and a
+    shared pool.
+    """
+
+    stop = None if limit is None else offset + limit
+
+    def search(path: Path) -> tuple[OpenBook, list[tuple[int, int, float]], int]:
+        book = opener(path)
+        # A book can contribute at most ``stop`` hits, so only its best are needed
+        matches, count = book.find(query, substring, fuzzy, stop)
+        return book, list(matches), count
+
+    if executor is not None:
+        found = list(executor.map(search, books))
+    elif len(books) <= 1 or workers == 1:
+        found = [search(path) for path in books]
+    else:
+        from concurrent.futures import ThreadPoolExecutor
+
+        workers = workers or min(MAX_SEARCH_WORKERS, len(books))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            found = list(pool.map(search, books))
+
+    hits = []
+    total = 0
+    for i, (book, matches, count) in enumerate(found):
+        if count:
+            total += count
+            density = count / len(book.segments)
+            hits.extend((-score, -density, book.title, a, b, i) for a, b, score in matches)
+    top = heapq.nsmallest(stop, hits) if stop is not None else sorted(hits)
+
+    results = []
+    for neg_score, _, title, a, b, i in top[offset:]:
+        book = found[i][0]
+        results.append(Match(book.segments, a, b, -neg_score, title, book.sf.draft_from))
+    return results, total
+
+
+def _book_index(book_path: Path, sf: SegmentsFile) -> BookIndex:
+    """Load the book's index, catching up on segments added since it was saved."""
+    from book_sync.index import BookIndex, load_index
 
     segments = sf.segments
-    if not segments:
+    index = load_index(book_path, sf.created_at, len(segments))
+    if index is None:
+        index = BookIndex(sf.created_at)
+    if index.n_segments < len(segments):
+        index.add_segments(_texts(segments, index.n_segments))
+        index.seg_offsets()  # fold the new postings in so lookups never mutate it
+    return index
+
+
+def _book_trigrams(book_path: Path, sf: SegmentsFile) -> TrigramIndex:
+    from book_sync.fuzzy import TrigramIndex, load_trigrams
+
+    trigrams = load_trigrams(book_path, sf.created_at, len(sf.segments))
+    if trigrams is None:
+        trigrams = TrigramIndex.build(sf.created_at, list(_texts(sf.segments)))
+    return trigrams
+
+
+def _texts(segments: Sequence[SegmentEntry], start: int = 0, end: int | None = None) -> Iterator[str]:
+    end = len(segments) if end is None else min(end, len(segments))
+    if isinstance(segments, SegmentStore):
+        return (segments.text(i) for i in range(start, end))
+    return (segments[i].text for i in range(start, end))
+
+
+def _fuzzy_matches(trigrams: TrigramIndex, query: str) -> list[tuple[int, int, float]]:
+    """Approximate matches of ``query`` allowing about ``fuzzy.ERROR_RATE`` edits per character."""
+    from book_sync.fuzzy import ERROR_RATE, normalize
+
+    pattern = normalize(query)
+    if not pattern:
         return []
+    max_dist = max(1, round(len(pattern) * ERROR_RATE))
+    best: dict[tuple[int, int], int] = {}
+    for a, b, dist in trigrams.search(pattern, max_dist, FUZZY_WINDOW_SEGMENTS):
+        best[a, b] = min(best.get((a, b), dist), dist)
 
+    # Neighbouring windows can report overlapping alignments; keep the best of each run
+    taken: set[int] = set()
+    matches = []
+    for (a, b), dist in sorted(best.items(), key=lambda kv: (kv[1], kv[0])):
+        if taken.isdisjoint(range(a, b + 1)):
+            taken.update(range(a, b + 1))
+            matches.append((a, b, 1.0 - dist / len(pattern)))
+    matches.sort()
+    return matches
+
+
+def _scan_matches(segments: Sequence[SegmentEntry], query: str) -> tuple[Iterator[tuple[int, int]], int]:
+    """Lazily map each (possibly overlapping) occurrence to segments; also count them."""
     # Build joined text and offset index
-    texts = [s.text.strip() for s in segments]
-    offsets: list[int] = []  # start char offset per segment
-    pos = 0
-    for t in texts:
-        offsets.append(pos)
-        pos += len(t) + 1  # +1 for the space join
-
-    joined = " ".join(texts)
+    if isinstance(segments, SegmentStore) and segments.stripped:
+        # The store already holds the space-joined text and its char offsets
+        joined = segments.joined_text()
+        offsets = segments.char_offsets[:-1]
+    else:
+        texts = [s.text.strip() for s in segments]
+        offsets = []  # start char offset per segment
+        pos = 0
+        for t in texts:
+            offsets.append(pos)
+            pos += len(t) + 1  # +1 for the space join
+        joined = " ".join(texts)
+
     joined_lower = joined.lower()
     query_lower = query.lower()
+    total = sum(1 for _ in re.finditer(f"(?={re.escape(query_lower)})", joined_lower))
+    return _scan(joined_lower, query_lower, offsets), total
 
-    # Find all matches
-    results = []
+
+def _scan(joined_lower: str, query_lower: str, offsets: Sequence[int]) -> Iterator[tuple[int, int]]:
     start = 0
     while True:
         idx = joined_lower.find(query_lower, start)
@@ -48,38 +327,37 @@ def search_book(book_path: Path, query: str) -> list[dict]:
         end_char = idx + len(query_lower)
         seg_end_idx = bisect_right(offsets, end_char - 1) - 1
 
-        # Build context window
-        ctx_start = max(0, seg_idx - CONTEXT_SEGMENTS)
-        ctx_end = min(len(segments) - 1, seg_end_idx + CONTEXT_SEGMENTS)
-
-        results.append({
-            "timestamp_start": segments[seg_idx].start,
-            "timestamp_end": segments[seg_end_idx].end,
-            "seg_start": seg_idx,
-            "seg_end": seg_end_idx,
-            "context": segments[ctx_start : ctx_end + 1],
-            "context_start": ctx_start,
-            "match_start": seg_idx,
-            "match_end": seg_end_idx,
-        })
-
+        yield seg_idx, seg_end_idx
         start = idx + 1
 
-    return results
 
+def _rank(match: tuple[int, int, float]) -> tuple[float, int]:
+    return -match[2], match[0]
 
-def print_results(query: str, results: list[dict]) -> None:
-    if not results:
-        print(f"No matches found for: {query!r}")
-        return
-
-    print(f"{len(results)} match(es) for: {query!r}\n")
-    for i, r in enumerate(results, 1):
-        ts_start = format_timestamp(r["timestamp_start"])
-        ts_end = format_timestamp(r["timestamp_end"])
-        print(f"── Match {i} [{ts_start} → {ts_end}] ──")
-        for seg in r["context"]:
-            marker = "  "
+
+def print_results(query: str, results: Iterable[Match], total: int | None = None) -> None:
+    """Print matches as they arrive; ``total`` (if known) is the count before paging."""
+    shown = 0
+    for r in results:
+        if not shown:
+            print(f"{total} match(es) for: {query!r}\n" if total is not None else f"Matches for: {query!r}\n")
+        shown += 1
+        ts_start = format_timestamp(r.timestamp_start)
+        ts_end = format_timestamp(r.timestamp_end)
+        book = f" {r.book}" if r.book else ""
+        score = f" ({r.score:.0%})" if r.score < 1.0 else ""
+        draft = " draft" if r.draft else ""
+        print(f"── Match {shown}{book} [{ts_start} → {ts_end}]{score}{draft} ──")
+        for i, seg in enumerate(r.context(), r.context_start):
+            # "~" marks draft text, which the final model has yet to replace
+            marker = "~ " if r.draft_from is not None and i >= r.draft_from else "  "
             ts = format_timestamp(seg.start)
             print(f"{marker}[{ts}] {seg.text.strip()}")
         print()
+
+    if not shown:
+        print(f"No matches found for: {query!r}")
+    elif total is None:
+        print(f"{shown} match(es)")
+    elif total > shown:
+        print(f"Showing {shown} of {total} match(es)")
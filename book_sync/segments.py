@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import json
+from bisect import bisect_left
+from collections.abc import Sequence
+from pathlib import Path
+
+import numpy as np
+
+from book_sync.journal import apply_journal, journal_path
+from book_sync.models import SegmentEntry, SegmentsFile
+from book_sync.segstore import SegmentStore, load_segment_store, store_path
+from book_sync.utils import tmp_path
+
+
+DRAFT_NAME = "draft.json"
+
+
+def draft_path(path: Path) -> Path:
+    """The draft transcript kept beside ``path`` while the final model catches up."""
+    return path.with_name(DRAFT_NAME)
+
+
+def set_aside_draft(path: Path) -> None:
+    """Move a finished draft transcription (segments.json and .bin) to draft.json and .bin."""
+    draft = draft_path(path)
+    if store_path(path).exists():
+        store_path(path).rename(store_path(draft))  # renaming keeps the fingerprint it was built for
+    path.rename(draft)
+
+
+def remove_draft(path: Path) -> None:
+    draft = draft_path(path)
+    draft.unlink(missing_ok=True)
+    store_path(draft).unlink(missing_ok=True)
+
+
+def load_segments_file(path: Path) -> SegmentsFile | None:
+    """Load a book's segments, with the draft's text wherever the final pass hasn't reached.
+
+    See ``_load_final`` for the final transcript. While a draft.json is
+    present, its segments from the end of the final text onwards are
+    appended, and ``draft_from`` marks where they begin.
+    """
+    sf = _load_final(path)
+    draft = draft_path(path)
+    if not draft.exists():
+        return sf
+    draft_sf = _load_final(draft)
+    if draft_sf is None:
+        return sf
+    if sf is None or not sf.segments:
+        draft_sf.draft_from = 0
+        return draft_sf
+    until = max(sf.transcribed_until, sf.segments[-1].end)
+    sf.draft_from = len(sf.segments)
+    sf.segments = DraftOverlay(sf.segments, draft_sf.segments, _first_starting_at(draft_sf.segments, until))
+    return sf
+
+
+class DraftOverlay(Sequence):
+    """The final segments followed by the draft's from ``tail_start`` on.
+
+    Neither side is copied, so a memory-mapped draft stays lazy.
+    """
+
+    def __init__(self, final: Sequence[SegmentEntry], draft: Sequence[SegmentEntry], tail_start: int):
+        self.final = final
+        self.draft = draft
+        self.tail_start = tail_start
+
+    def __len__(self) -> int:
+        return len(self.final) + max(0, len(self.draft) - self.tail_start)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("segment index out of range")
+        if i < len(self.final):
+            return self.final[i]
+        return self.draft[self.tail_start + i - len(self.final)]
+
+
+def _first_starting_at(segments, t: float) -> int:
+    if isinstance(segments, SegmentStore):
+        return int(np.searchsorted(segments.starts, t))
+    return bisect_left(segments, t, key=lambda s: s.start)
+
+
+def _load_final(path: Path) -> SegmentsFile | None:
+    """Load the segments at ``path``.
+
+    A finished book is served lazily from the memory-mapped segments.bin;
+    otherwise segments.json is parsed, plus any segments.jsonl journal of a
+    transcription in progress.
+    """
+    journal = journal_path(path)
+    if not journal.exists():
+        sf = load_segment_store(store_path(path), path)
+        if sf is not None:
+            return sf
+    sf = read_segments_json(path)
+    if journal.exists():
+        sf = apply_journal(sf, journal)
+    return sf
+
+
+def read_segments_json(path: Path) -> SegmentsFile | None:
+    if not path.exists():
+        return None
+    raw = json.loads(path.read_text())
+    segments = [SegmentEntry(**s) for s in raw.get("segments", [])]
+    return SegmentsFile(
+        model=raw["model"],
+        audio_file=raw["audio_file"],
+        created_at=raw["created_at"],
+        segments=segments,
+        transcribed_until=raw.get("transcribed_until", 0.0),
+    )
+
+
+def save_segments_file(sf: SegmentsFile, path: Path) -> None:
+    data = {
+        "model": sf.model,
+        "audio_file": sf.audio_file,
+        "created_at": sf.created_at,
+        "transcribed_until": sf.transcribed_until,
+        "segments": [{"start": s.start, "end": s.end, "text": s.text} for s in sf.segments],
+    }
+    tmp = tmp_path(path)
+    tmp.write_text(json.dumps(data, indent=2))
+    tmp.rename(path)
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import json
+import mmap
+import struct
+from collections.abc import Iterator, Sequence
+from pathlib import Path
+
+import numpy as np
+
+from book_sync.models import SegmentEntry, SegmentsFile
+from book_sync.utils import file_fingerprint, tmp_path
+
+
+MAGIC = b"BSEG"
+VERSION = 1
+_HEADER = struct.Struct("<4sIQQI")  # magic, version, count, text bytes, metadata bytes
+
+
+def store_path(segments_path: Path) -> Path:
+    return segments_path.with_suffix(".bin")
+
+
+def write_segment_store(sf: SegmentsFile, path: Path, source: Path | None = None) -> Path:
+    """Write segments in columnar form: float64 start/end, offsets, one UTF-8 blob.
+
+    Each text is followed by a single space in the blob, so the decoded blob
+    minus its last character is exactly ``" ".join(texts)``. ``source`` is
+    the segments.json this was built from; readers ignore the store once
+    that file's fingerprint changes.
+    """
+    texts = [s.text for s in sf.segments]
+    encoded = [t.encode("utf-8") + b" " for t in texts]
+    byte_offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=byte_offsets[1:])
+    char_offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    np.cumsum([len(t) + 1 for t in texts], out=char_offsets[1:])
+
+    meta = json.dumps({
+        "model": sf.model,
+        "audio_file": sf.audio_file,
+        "created_at": sf.created_at,
+        "transcribed_until": sf.transcribed_until,
+        "stripped": all(t == t.strip() for t in texts),
+        "source": file_fingerprint(source) if source else None,
+    }).encode("utf-8")
+    meta += b" " * (-(_HEADER.size + len(meta)) % 8)  # keep the arrays 8-byte aligned
+
+    tmp = tmp_path(path)
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, len(texts), int(byte_offsets[-1]), len(meta)))
+        f.write(meta)
+        f.write(np.array([s.start for s in sf.segments], dtype="<f8").tobytes())
+        f.write(np.array([s.end for s in sf.segments], dtype="<f8").tobytes())
+        f.write(byte_offsets.astype("<i8").tobytes())
+        f.write(char_offsets.astype("<i8").tobytes())
+        for b in encoded:
+            f.write(b)
+    tmp.rename(path)
+    return path
+
+
+class SegmentStore(Sequence):
+    """Lazy, memory-mapped view of a segments.bin file.
+
+    Behaves like a list of SegmentEntry, but entries are only built for the
+    indices actually accessed; bulk consumers should use the column arrays
+    (``starts``, ``ends``) and ``rows()`` / ``joined_text()`` instead.
+    """
+
+    def __init__(self, path: Path):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, text_bytes, meta_len = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a segment store: {path}")
+        pos = _HEADER.size
+        self.meta = json.loads(self._mmap[pos : pos + meta_len])
+        pos += meta_len
+        self.starts = np.frombuffer(self._mmap, dtype="<f8", count=count, offset=pos)
+        pos += 8 * count
+        self.ends = np.frombuffer(self._mmap, dtype="<f8", count=count, offset=pos)
+        pos += 8 * count
+        self.byte_offsets = np.frombuffer(self._mmap, dtype="<i8", count=count + 1, offset=pos)
+        pos += 8 * (count + 1)
+        self.char_offsets = np.frombuffer(self._mmap, dtype="<i8", count=count + 1, offset=pos)
+        pos += 8 * (count + 1)
+        self._text_start = pos
+        self._count = count
+
+    @property
+    def stripped(self) -> bool:
+        return self.meta.get("stripped", False)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def text(self, i: int) -> str:
+        lo = self._text_start + int(self.byte_offsets[i])
+        hi = self._text_start + int(self.byte_offsets[i + 1]) - 1
+        return self._mmap[lo:hi].decode("utf-8")
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._count))]
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError("segment index out of range")
+        return SegmentEntry(start=float(self.starts[i]), end=float(self.ends[i]), text=self.text(i))
+
+    def rows(self) -> Iterator[tuple[float, float, str]]:
+        """Yield ``(start, end, text)`` without building SegmentEntry objects."""
+        for i, (start, end) in enumerate(zip(self.starts.tolist(), self.ends.tolist())):
+            yield start, end, self.text(i)
+
+    def joined_text(self) -> str:
+        """All texts joined by single spaces, decoded in one pass."""
+        lo = self._text_start
+        hi = lo + int(self.byte_offsets[-1])
+        return self._mmap[lo : max(lo, hi - 1)].decode("utf-8")
+
+
+def load_segment_store(path: Path, source: Path) -> SegmentsFile | None:
+    """Open ``path`` as a lazy SegmentsFile if it is current for ``source``."""
+    if not path.exists() or not source.exists():
+        return None
+    store = SegmentStore(path)
+    if store.meta.get("source") != file_fingerprint(source):
+        return None
+    return SegmentsFile(
+        model=store.meta["model"],
+        audio_file=store.meta["audio_file"],
+        created_at=store.meta["created_at"],
+        segments=store,
+        transcribed_until=store.meta.get("transcribed_until", 0.0),
+    )
@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import json
+import os
+import socketserver
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from book_sync.search import MAX_SEARCH_WORKERS, OpenBook, open_book, search_library, transcribed_books
+
+
+DEFAULT_PORT = 8750
+DEFAULT_CACHE_MB = 1024
+DEFAULT_LIMIT = 50
+REVALIDATE_SECONDS = 1.0  # re-stat a cached book's files at most this often
+STREAM_CHUNK_BYTES = 1 << 16  # encoded JSON sent per HTTP chunk
+_WATCHED = ("segments.json", "segments.jsonl", "segments.bin", "index.bin", "trigrams.bin", "draft.json")
+_ENCODER = json.JSONEncoder(ensure_ascii=False)
+
+
+def _signature(path: Path) -> tuple:
+    sig = []
+    for name in _WATCHED:
+        try:
+            st = os.stat(path / name)
+        except FileNotFoundError:
+            sig.append(None)
+        else:
+            sig.append((st.st_mtime_ns, st.st_size))
+    return tuple(sig)
+
+
+def _footprint(signature: tuple) -> int:
+    return sum(size for entry in signature if entry for _, size in [entry])
+
+
+@dataclass
+class _Entry:
+    book: OpenBook
+    signature: tuple
+    size: int
+    checked: float
+
+
+class BookCache:
+    """Opened books in least-recently-used order, bounded by the size of their files.
+
+    A cached book is reopened when any of its transcript or index files
+    changes on disk, checked at most every ``REVALIDATE_SECONDS``. Each book
+    is opened by one request at a time; others asking for it meanwhile wait
+    for that open rather than starting their own.
+    """
+
+    def __init__(self, budget_bytes: int):
+        self.budget = budget_bytes
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self._books: OrderedDict[Path, _Entry] = OrderedDict()
+        self._opening: dict[Path, Future] = {}
+        self._lock = threading.Lock()
+
+    def get(self, path: Path) -> OpenBook:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._books.get(path)
+            if entry is not None and now - entry.checked >= REVALIDATE_SECONDS:
+                if _signature(path) == entry.signature:
+                    entry.checked = now
+                else:
+                    self._drop(path)
+                    entry = None
+            if entry is not None:
+                self._books.move_to_end(path)
+                self.hits += 1
+                return entry.book
+            self.misses += 1
+            opening = self._opening.get(path)
+            if opening is None:
+                self._opening[path] = Future()
+        if opening is not None:
+            return opening.result()
+
+        # Open outside the cache lock; signing first means a change mid-open is caught next time
+        try:
+            signature = _signature(path)
+            book = open_book(path)
+        except BaseException as exc:
+            with self._lock:
+                self._opening.pop(path).set_exception(exc)
+            raise
+        with self._lock:
+            if path in self._books:
+                self._drop(path)
+            entry = _Entry(book, signature, _footprint(signature), now)
+            self._books[path] = entry
+            self.used += entry.size
+            while self.used > self.budget and len(self._books) > 1:
+                self._drop(next(iter(self._books)))
+            self._opening.pop(path).set_result(book)
+        return book
+
+    def _drop(self, path: Path) -> None:
+        self.used -= self._books.pop(path).size
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "books": len(self._books),
+                "bytes": self.used,
+                "budget": self.budget,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so clients skip a connect per query
+    disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+        if url.path == "/search":
+            self._search(params)
+        elif url.path == "/health":
+            self._send(200, {"status": "ok", "cache": self.server.cache.stats()})
+        else:
+            self._send(404, {"error": f"Unknown path: {url.path}"})
+
+    def _search(self, params: dict[str, list[str]]) -> None:
+        query = params.get("q", [""])[0]
+        if not query:
+            self._send(400, {"error": "Missing query parameter: q"})
+            return
+        try:
+            limit = int(params.get("limit", [DEFAULT_LIMIT])[0])
+            offset = int(params.get("offset", ["0"])[0])
+        except ValueError:
+            self._send(400, {"error": "limit and offset must be integers"})
+            return
+        try:
+            results, total = search_library(
+                query,
+                transcribed_books(params.get("book", [])),
+                limit=limit or None,
+                substring=_flag(params, "substring"),
+                fuzzy=_flag(params, "fuzzy"),
+                offset=offset,
+                opener=self.server.cache.get,
+                executor=self.server.executor,
+            )
+            # Build the whole page first, so a failure is a 500 rather than a truncated 200
+            page = [r.to_dict() for r in results]
+        except (OSError, ValueError) as e:
+            self._send(500, {"error": str(e)})
+            return
+        self._send_stream({"query": query, "total": total, "results": page})
+
+    def _send(self, status: int, body: dict) -> None:
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, body: dict) -> None:
+        """Send ``body`` as a 200, chunked as the encoder produces it, without one big string."""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        parts: list[str] = []
+        size = 0
+        for part in _ENCODER.iterencode(body):
+            parts.append(part)
+            size += len(part)
+            if size >= STREAM_CHUNK_BYTES:
+                self._chunk("".join(parts))
+                parts, size = [], 0
+        if parts:
+            self._chunk("".join(parts))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _chunk(self, text: str) -> None:
+        data = text.encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+    def address_string(self) -> str:
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, format: str, *args) -> None:
+        pass  # a line per query would cost more than the query
+
+
+def _flag(params: dict[str, list[str]], name: str) -> bool:
+    return params.get(name, ["0"])[0].lower() in ("1", "true", "yes")
+
+
+class _UnixHandler(_Handler):
+    disable_nagle_algorithm = False  # not a TCP socket
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def run_server(
+    host: str = "127.0.0.1",
+    port: int = DEFAULT_PORT,
+    socket_path: Path | None = None,
+    cache_mb: int = DEFAULT_CACHE_MB,
+) -> None:
+    """Serve search over HTTP until interrupted, on a TCP port or a Unix socket."""
+    if socket_path is not None:
+        socket_path.unlink(missing_ok=True)
+        server = _UnixHTTPServer(str(socket_path), _UnixHandler)
+        where = f"unix:{socket_path}"
+    else:
+        server = ThreadingHTTPServer((host, port), _Handler)
+        where = f"http://{host}:{server.server_address[1]}"
+    server.cache = BookCache(cache_mb << 20)
+    server.executor = ThreadPoolExecutor(max_workers=MAX_SEARCH_WORKERS)
+    print(f"Serving search on {where}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.executor.shutdown()
+        if socket_path is not None:
+            socket_path.unlink(missing_ok=True)
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+
+from book_sync import catalog
+from book_sync.config import DATA_DIR, Settings
+from book_sync.journal import journal_path
+from book_sync.utils import tmp_path
+
+
+STORE_NAME = ".store"  # hidden, so the catalog doesn't mistake it for a book
+TRANSCRIPT_FILES = ("segments.json", "segments.bin", "transcript.txt", "index.bin", "trigrams.bin")
+
+
+def object_path(digest: str) -> Path:
+    """Where the store keeps the file whose block checksum (see ``State.checksums``) is ``digest``."""
+    return DATA_DIR / STORE_NAME / "objects" / digest[:2] / digest[2:]
+
+
+def transcript_key(audio_digest: str, settings: Settings) -> str:
+    return hashlib.sha256(f"{audio_digest}\0{settings.model}\0{settings.sample_rate}".encode()).hexdigest()
+
+
+def transcript_path(audio_digest: str, settings: Settings) -> Path:
+    key = transcript_key(audio_digest, settings)
+    return DATA_DIR / STORE_NAME / "transcripts" / key[:2] / key[2:]
+
+
+def _link(src: Path, dest: Path) -> None:
+    """Make ``dest`` a hard link to ``src``, atomically replacing any file there."""
+    tmp = dest.with_name(dest.name + ".link")
+    tmp.unlink(missing_ok=True)
+    os.link(src, tmp)
+    os.replace(tmp, dest)
+
+
+def add_object(path: Path, digest: str) -> None:
+    """Put a finished file in the store under its checksum.
+
+    The first copy becomes the stored object; later files with the same
+    checksum are replaced by hard links to it, so duplicate books share one
+    copy on disk. Sharing an inode is safe because finished files are only
+    replaced whole (write a temporary file, then rename), and a download
+    that resumes into a linked file copies it first (download._unshare).
+    Without hard-link support the file is simply left alone.
+    """
+    obj = object_path(digest)
+    try:
+        if obj.exists():
+            if not os.path.samefile(obj, path):
+                _link(obj, path)
+            return
+        obj.parent.mkdir(parents=True, exist_ok=True)
+        os.link(path, obj)
+    except FileExistsError:
+        _link(obj, path)  # another book stored it first
+    except OSError:
+        pass
+
+
+def link_known_audio(audio_url: str, dest: Path) -> str | None:
+    """Link ``dest`` to audio another book already downloaded from ``audio_url``.
+
+    Returns the audio's checksum, or None when it has to be downloaded.
+    """
+    for entry in catalog.entries_with_audio(audio_url):
+        digest = entry.checksums.get("audio_original")
+        if digest and object_path(digest).exists():
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            _link(object_path(digest), dest)
+            print(f"Audio already downloaded by {entry.name}")
+            return digest
+    return None
+
+
+def save_transcript(book_path: Path, audio_digest: str | None, settings: Settings, segment_count: int) -> None:
+    """Cache a finished book's transcript files under its audio checksum, model and sample rate."""
+    if not audio_digest:
+        return
+    target = transcript_path(audio_digest, settings)
+    if target.exists():
+        return
+    tmp = tmp_path(target)
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    try:
+        for name in TRANSCRIPT_FILES:
+            if (book_path / name).exists():
+                os.link(book_path / name, tmp / name)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+        return
+    (tmp / "cache.json").write_text(json.dumps({
+        "audio": audio_digest,
+        "model": settings.model,
+        "sample_rate": settings.sample_rate,
+        "segments": segment_count,
+        "source": book_path.name,
+    }, indent=2))
+    try:
+        tmp.rename(target)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)  # another book cached it first
+
+
+def restore_transcript(book_path: Path, audio_digest: str | None, settings: Settings) -> int | None:
+    """Link a cached transcript of this audio into the book; its segment count, or None if uncached."""
+    if not audio_digest:
+        return None
+    source = transcript_path(audio_digest, settings)
+    meta_path = source / "cache.json"
+    if not meta_path.exists():
+        return None
+    meta = json.loads(meta_path.read_text())
+    for name in TRANSCRIPT_FILES:
+        if (source / name).exists():
+            _link(source / name, book_path / name)
+    journal_path(book_path / "segments.json").unlink(missing_ok=True)
+    print(f"Reusing transcript from {meta['source']} ({meta['segments']} segments)")
+    return meta["segments"]
@@ -1,139 +1,445 @@
 from __future__ import annotations
 
-import json
+import multiprocessing
 import subprocess
 import time
+from bisect import bisect_left, bisect_right
+from collections import deque
+from collections.abc import Callable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from dataclasses import dataclass
 from datetime import datetime, timezone
+from functools import partial
 from pathlib import Path
 
-import mlx_whisper
+import numpy as np
 
+from book_sync import metrics, worker
+from book_sync.backends import Backend, load_backend, worker_count
 from book_sync.config import Settings
+from book_sync.convert import stream_pcm
+from book_sync.fuzzy import TrigramIndex, trigram_path
+from book_sync.index import BookIndex, index_path, load_index
+from book_sync.journal import SegmentsJournal, apply_journal, journal_path
+from book_sync.mel import WINDOW_SECONDS
 from book_sync.models import SegmentEntry, SegmentsFile
-from book_sync.utils import format_timestamp
+from book_sync.segments import read_segments_json, save_segments_file
+from book_sync.segstore import SegmentStore, store_path, write_segment_store
+from book_sync.utils import format_timestamp, tmp_path
+from book_sync.vad import CUT_SEARCH_SECONDS, HANGOVER_SECONDS, VoiceActivity
+from book_sync.wav import WavReader
 
 
-SAVE_INTERVAL = 50  # save every N segments
-CHUNK_DURATION = 7200  # 2 hours per chunk (well within MLX int32 shape limit)
+STREAM_WINDOW = 1800  # 30 minutes of decoded audio per window in stream mode
+BATCH_CUT_SEARCH_SECONDS = 10.0  # batched mode cuts 30 s windows at a pause this close to the limit
 
 
-def load_segments_file(path: Path) -> SegmentsFile | None:
-    if not path.exists():
-        return None
-    raw = json.loads(path.read_text())
-    segments = [SegmentEntry(**s) for s in raw.get("segments", [])]
-    return SegmentsFile(
-        model=raw["model"],
-        audio_file=raw["audio_file"],
-        created_at=raw["created_at"],
-        segments=segments,
-    )
-
-
-def save_segments_file(sf: SegmentsFile, path: Path) -> None:
-    data = {
-        "model": sf.model,
-        "audio_file": sf.audio_file,
-        "created_at": sf.created_at,
-        "segments": [{"start": s.start, "end": s.end, "text": s.text} for s in sf.segments],
-    }
-    tmp = path.with_suffix(".tmp")
-    tmp.write_text(json.dumps(data, indent=2))
-    tmp.rename(path)
-
-
-def _probe_duration(wav_path: Path) -> float:
+def _probe_duration(audio_path: Path) -> float:
     cmd = [
         "ffprobe", "-v", "error",
         "-show_entries", "format=duration",
         "-of", "default=noprint_wrappers=1:nokey=1",
-        str(wav_path),
+        str(audio_path),
     ]
     result = subprocess.run(cmd, capture_output=True, text=True)
     return float(result.stdout.strip())
 
 
-def _extract_chunk(wav_path: Path, chunk_path: Path, start: float, duration: float) -> None:
-    cmd = [
-        "ffmpeg", "-y",
-        "-ss", str(start),
-        "-t", str(duration),
-        "-i", str(wav_path),
-        "-c:a", "copy",
-        str(chunk_path),
-    ]
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    if result.returncode != 0:
-        raise RuntimeError(f"ffmpeg chunk extraction failed:\n{result.stderr}")
+def _gather(
+    samples: np.ndarray, base: float, sample_rate: int, spans: list[tuple[float, float]]
+) -> tuple[list[tuple[float, float]], np.ndarray]:
+    """Concatenate the spans of ``samples`` (starting at time ``base``) into float32 audio.
+
+    Returns ``(offsets, audio)`` where each offset is ``(local_start, abs_start)``
+    for one span, for mapping model timestamps back onto the book.
+    """
+    bounds = []
+    for s, e in spans:
+        lo = max(0, int(round((s - base) * sample_rate)))
+        hi = min(len(samples), int(round((e - base) * sample_rate)))
+        if hi > lo:
+            bounds.append((lo, hi))
+
+    scale = 32768.0 if samples.dtype == np.int16 else 1.0
+    audio = np.empty(sum(hi - lo for lo, hi in bounds), dtype=np.float32)
+    offsets = []
+    pos = 0
+    for lo, hi in bounds:
+        offsets.append((pos / sample_rate, base + lo / sample_rate))
+        # Scale straight from the (possibly memory-mapped) source in one pass
+        np.divide(samples[lo:hi], scale, out=audio[pos : pos + hi - lo], casting="unsafe")
+        pos += hi - lo
+    return offsets, audio
+
+
+def _to_absolute(t: float, offsets: list[tuple[float, float]], end: bool = False) -> float:
+    """Map a time within a gathered chunk back onto the book.
+
+    A segment end that falls exactly on a splice belongs to the earlier span.
+    """
+    if end:
+        i = max(0, bisect_left(offsets, (t, float("-inf"))) - 1)
+    else:
+        i = max(0, bisect_right(offsets, (t, float("inf"))) - 1)
+    local_start, abs_start = offsets[i]
+    return abs_start + (t - local_start)
+
+
+@dataclass
+class WavChunk:
+    """A chunk of book.wav by reference, so worker processes map it themselves."""
+
+    path: Path
+    spans: list[tuple[float, float]]
+
+
+@dataclass
+class PcmChunk:
+    """Already-decoded audio with its ``(local_start, abs_start)`` offsets."""
+
+    offsets: list[tuple[float, float]]
+    audio: np.ndarray
+    end: float
+
+
+Chunk = WavChunk | PcmChunk
+
+
+def _chunk_end(chunk: Chunk) -> float:
+    return chunk.spans[-1][1] if isinstance(chunk, WavChunk) else chunk.end
 
 
-def transcribe_audio(wav_path: Path, book_path: Path, settings: Settings) -> SegmentsFile:
+def _window_seconds(settings: Settings, default: float) -> float:
+    """Chunk length, capped by the checkpoint interval when one is set."""
+    if settings.checkpoint_seconds > 0:
+        return min(default, settings.checkpoint_seconds)
+    return default
+
+
+def _wav_chunks(
+    wav: WavReader, settings: Settings, resume_offset: float
+) -> Iterator[WavChunk]:
+    """Yield chunks of book.wav, cut at pauses when VAD is on."""
+    total_duration = wav.duration
+    window = _window_seconds(settings, settings.chunk_seconds)
+    if settings.vad:
+        with metrics.timer("vad"):
+            activity = VoiceActivity(wav.samples, wav.sample_rate)
+            plan = activity.plan(window, settings.skip_silence, start=resume_offset)
+        speech = sum(e - s for spans in plan for s, e in spans)
+        print(
+            f"Speech: {format_timestamp(speech)} to transcribe "
+            f"(from {format_timestamp(resume_offset)} of {format_timestamp(total_duration)})",
+            flush=True,
+        )
+    else:
+        plan = []
+        t = 0.0
+        while t < total_duration:
+            chunk_end = min(t + window, total_duration)
+            # Skip chunks fully covered by existing segments
+            if chunk_end > resume_offset:
+                plan.append([(max(t, resume_offset), chunk_end)])
+            t += window
+
+    for chunk_num, spans in enumerate(plan, 1):
+        print(
+            f"Chunk {chunk_num}/{len(plan)}: "
+            f"{format_timestamp(spans[0][0])} - {format_timestamp(spans[-1][1])}",
+            flush=True,
+        )
+        yield WavChunk(wav.path, spans)
+
+
+def _split_window(
+    buf: np.ndarray, buf_start: float, settings: Settings, final: bool
+) -> tuple[list[tuple[float, float]], tuple[float, np.ndarray] | None]:
+    """Pick the spans of a stream window to transcribe now, and what to carry over.
+
+    If speech runs into the end of the window it is cut at the quietest point
+    near the end, and the rest is carried into the next window.
+    """
+    sr = settings.sample_rate
+    buf_end = buf_start + len(buf) / sr
+    if not settings.vad:
+        return [(buf_start, buf_end)], None
+
+    activity = VoiceActivity(buf, sr, offset=buf_start)
+    spans = activity.spans(settings.skip_silence)
+    if final or not spans or spans[-1][1] < buf_end - HANGOVER_SECONDS:
+        return spans, None
+
+    cut = activity.quietest_point(max(buf_start, buf_end - CUT_SEARCH_SECONDS), buf_end)
+    cut_idx = int(round((cut - buf_start) * sr))
+    cut = buf_start + cut_idx / sr
+    spans = [(s, min(e, cut)) for s, e in spans if s < cut]
+    return spans, (cut, buf[cut_idx:])
+
+
+def _stream_chunks(
+    audio_path: Path, settings: Settings, resume_offset: float
+) -> Iterator[PcmChunk]:
+    """Yield windows decoded on the fly from the original audio."""
+    sr = settings.sample_rate
+    carry = None
+    window = _window_seconds(settings, STREAM_WINDOW)
+    windows = stream_pcm(audio_path, settings, window, start=resume_offset)
+    # Look one window ahead so the last one is known and nothing is carried past it
+    pending = next(windows, None)
+    while pending is not None:
+        window_start, samples = pending
+        pending = next(windows, None)
+        if carry is not None:
+            buf_start, buf = carry[0], np.concatenate((carry[1], samples))
+        else:
+            buf_start, buf = window_start, samples
+        spans, carry = _split_window(buf, buf_start, settings, final=pending is None)
+        if spans:
+            print(f"Window: {format_timestamp(spans[0][0])} - {format_timestamp(spans[-1][1])}", flush=True)
+            yield PcmChunk(*_gather(buf, buf_start, sr, spans), end=spans[-1][1])
+
+
+def transcribe_audio(
+    audio_path: Path,
+    book_path: Path,
+    settings: Settings,
+    on_checkpoint: Callable[[float], None] | None = None,
+) -> SegmentsFile:
+    """Transcribe book.wav, or with ``settings.stream`` the original audio decoded on the fly.
+
+    ``on_checkpoint`` is called with the transcribed-until time after each
+    chunk is persisted.
+    """
     segments_path = book_path / "segments.json"
 
-    existing = load_segments_file(segments_path)
+    existing = read_segments_json(segments_path)
+    base_segments = len(existing.segments) if existing else 0
+    if journal_path(segments_path).exists():
+        existing = apply_journal(existing, journal_path(segments_path))
     resume_offset = 0.0
     segments: list[SegmentEntry] = []
 
-    if existing and existing.segments:
+    if existing and (existing.segments or existing.transcribed_until):
         segments = existing.segments
-        resume_offset = segments[-1].end
+        # Windows are checkpointed as they finish, even ones with no speech in them
+        resume_offset = max(segments[-1].end if segments else 0.0, existing.transcribed_until)
         print(f"Resuming transcription from {format_timestamp(resume_offset)} ({len(segments)} segments)", flush=True)
 
-    total_duration = _probe_duration(wav_path)
+    wav = None if settings.stream else WavReader(audio_path)
+    with metrics.timer("probe"):
+        total_duration = _probe_duration(audio_path) if wav is None else wav.duration
     print(f"Audio duration: {format_timestamp(total_duration)}", flush=True)
     print(f"Model: {settings.model}", flush=True)
 
     sf = SegmentsFile(
         model=settings.model,
-        audio_file=wav_path.name,
+        audio_file=audio_path.name,
         created_at=existing.created_at if existing else datetime.now(timezone.utc).isoformat(),
         segments=segments,
+        transcribed_until=resume_offset,
     )
 
-    # Build chunk boundaries
-    chunk_starts: list[float] = []
-    t = 0.0
-    while t < total_duration:
-        chunk_starts.append(t)
-        t += CHUNK_DURATION
-
-    for chunk_idx, chunk_start in enumerate(chunk_starts):
-        chunk_end = min(chunk_start + CHUNK_DURATION, total_duration)
-
-        # Skip chunks fully covered by existing segments
-        if chunk_end <= resume_offset:
-            continue
-
-        chunk_num = chunk_idx + 1
-        total_chunks = len(chunk_starts)
-        print(
-            f"Chunk {chunk_num}/{total_chunks}: "
-            f"{format_timestamp(chunk_start)} - {format_timestamp(chunk_end)}",
-            flush=True,
-        )
+    if wav is None:
+        chunks = _stream_chunks(audio_path, settings, resume_offset)
+    else:
+        chunks = _wav_chunks(wav, settings, resume_offset)
+
+    journal = SegmentsJournal(segments_path, sf, base_segments)
+    resumed_segments = len(sf.segments)
+    try:
+        _transcribe_chunks(chunks, sf, journal, resume_offset, total_duration, settings, on_checkpoint)
+    finally:
+        journal.close()
+        if wav is not None:
+            wav.close()
+    metrics.count("audio_seconds", max(0.0, total_duration - resume_offset))
+    metrics.count("segments", len(sf.segments) - resumed_segments)
+
+    # Compact the journal into segments.json once, at the end of the stage. The
+    # journal goes last, so a crash before then still finds every segment.
+    with metrics.timer("save"):
+        save_segments_file(sf, segments_path)
+        write_segment_store(sf, store_path(segments_path), source=segments_path)
+        journal_path(segments_path).unlink(missing_ok=True)
+    # Indexed once here; until then searches index the journalled segments in memory
+    with metrics.timer("index"):
+        index = load_index(book_path, sf.created_at, len(sf.segments)) or BookIndex(sf.created_at)
+        index.add_segments(seg.text for seg in sf.segments[index.n_segments :])
+        index.save(index_path(book_path))
+        TrigramIndex.build(sf.created_at, [s.text for s in sf.segments]).save(trigram_path(book_path))
+    print(f"Transcription complete: {len(sf.segments)} total segments", flush=True)
+    return sf
 
-        # Extract chunk WAV
-        chunk_path = book_path / f"_chunk_{chunk_idx}.wav"
-        _extract_chunk(wav_path, chunk_path, chunk_start, CHUNK_DURATION)
 
-        try:
-            result = mlx_whisper.transcribe(
-                str(chunk_path),
-                path_or_hf_repo=settings.model,
-                language="en",
-                verbose=False,
+_worker_backend: Backend | None = None
+_worker_load_seconds = 0.0  # reported with the worker's first result
+
+ChunkResult = tuple[list[tuple[float, float]], list[dict], dict[str, float]]
+
+
+def _load_chunk(chunk: Chunk) -> tuple[list[tuple[float, float]], np.ndarray]:
+    if isinstance(chunk, WavChunk):
+        with WavReader(chunk.path) as wav:
+            return _gather(wav.samples, 0.0, wav.sample_rate, chunk.spans)
+    return chunk.offsets, chunk.audio
+
+
+def _batch_windows(audio: np.ndarray, sample_rate: int) -> list[tuple[int, int]]:
+    """Sample bounds of consecutive windows of at most 30 s.
+
+    Each is cut at the quietest point of its last few seconds, so words are
+    not split between windows.
+    """
+    size = WINDOW_SECONDS * sample_rate
+    if len(audio) <= size:
+        return [(0, len(audio))]
+    activity = VoiceActivity(audio, sample_rate)
+    bounds = []
+    lo = 0
+    while len(audio) - lo > size:
+        limit = (lo + size) / sample_rate
+        cut = activity.quietest_point(limit - BATCH_CUT_SEARCH_SECONDS, limit)
+        hi = min(lo + size, max(lo + 1, int(round(cut * sample_rate))))
+        bounds.append((lo, hi))
+        lo = hi
+    bounds.append((lo, len(audio)))
+    return bounds
+
+
+def _transcribe_batched(backend: Backend, audio: np.ndarray, sample_rate: int) -> list[dict]:
+    """Decode ``audio`` as 30 s windows, ``backend.batch_size`` windows per model call.
+
+    Window-relative times are shifted by each window's start, so segments are
+    relative to ``audio`` just as ``backend.transcribe`` returns them.
+    """
+    size = WINDOW_SECONDS * sample_rate
+    bounds = _batch_windows(audio, sample_rate)
+    segments = []
+    for i in range(0, len(bounds), backend.batch_size):
+        batch = bounds[i : i + backend.batch_size]
+        windows = np.zeros((len(batch), size), dtype=np.float32)
+        for row, (lo, hi) in enumerate(batch):
+            windows[row, : hi - lo] = audio[lo:hi]
+        durations = [(hi - lo) / sample_rate for lo, hi in batch]
+        for (lo, _), window_segments in zip(batch, backend.transcribe_batch(windows, durations)):
+            window_start = lo / sample_rate
+            for seg in window_segments:
+                segments.append({**seg, "start": window_start + seg["start"], "end": window_start + seg["end"]})
+    return segments
+
+
+def transcribe_chunk(backend: Backend, chunk: Chunk, sample_rate: int) -> ChunkResult:
+    """Transcribe one chunk; also returns its step timings, since workers can't record them."""
+    t0 = time.perf_counter()
+    offsets, audio = _load_chunk(chunk)
+    t1 = time.perf_counter()
+    if not len(audio):
+        segments = []
+    elif backend.batch_size > 1:
+        segments = _transcribe_batched(backend, audio, sample_rate)
+    else:
+        segments = backend.transcribe(audio)
+    timings = {
+        "chunk_extract": t1 - t0,
+        "inference": time.perf_counter() - t1,
+        "inference_audio_seconds": len(audio) / sample_rate,
+    }
+    return offsets, segments, timings
+
+
+def _init_worker(settings: Settings) -> None:
+    global _worker_backend, _worker_load_seconds
+    t0 = time.perf_counter()
+    _worker_backend = load_backend(settings)
+    _worker_load_seconds = time.perf_counter() - t0
+
+
+def _worker_transcribe(chunk: Chunk, sample_rate: int) -> ChunkResult:
+    global _worker_load_seconds
+    offsets, segments, timings = transcribe_chunk(_worker_backend, chunk, sample_rate)
+    if _worker_load_seconds:
+        timings["model_load"] = _worker_load_seconds
+        _worker_load_seconds = 0.0
+    return offsets, segments, timings
+
+
+def _record_timings(timings: dict[str, float]) -> None:
+    metrics.count("inference_audio_seconds", timings.pop("inference_audio_seconds"))
+    for step, seconds in timings.items():
+        metrics.add_time(step, seconds)
+
+
+def _run_chunks(
+    chunks: Iterator[Chunk], settings: Settings
+) -> Iterator[tuple[list[tuple[float, float]], list[dict], float]]:
+    """Transcribe chunks, yielding ``(offsets, segments, chunk_end)`` in chunk order.
+
+    With ``settings.model_worker`` chunks go to the running model worker,
+    which keeps the model loaded across books and invocations. Otherwise,
+    with more than one worker, they go to a process pool with the model
+    loaded once per process. Either way a few chunks are kept in flight per
+    process and results are yielded in order, so segments still append
+    monotonically.
+    """
+    sr = settings.sample_rate
+    client = worker.connect(settings) if settings.model_worker else None
+    if settings.model_worker and client is None:
+        print(f"No model worker on {worker.socket_path(settings)}; loading the model here", flush=True)
+    workers = client.slots if client is not None else worker_count(settings)
+    if client is None and workers <= 1:
+        with metrics.timer("model_load"):
+            backend = load_backend(settings)
+        for chunk in chunks:
+            offsets, segments, timings = transcribe_chunk(backend, chunk, sr)
+            _record_timings(timings)
+            yield offsets, segments, _chunk_end(chunk)
+        return
+
+    with ExitStack() as stack:
+        if client is not None:
+            print(f"Transcribing with the model worker on {client.address}", flush=True)
+            stack.enter_context(client)
+            submit = partial(client.submit, settings)
+        else:
+            print(f"Transcribing with {workers} {settings.backend} workers", flush=True)
+            ctx = multiprocessing.get_context("spawn")
+            pool = stack.enter_context(
+                ProcessPoolExecutor(workers, mp_context=ctx, initializer=_init_worker, initargs=(settings,))
             )
-        finally:
-            chunk_path.unlink(missing_ok=True)
-
-        chunk_segments = result.get("segments", [])
+            submit = partial(pool.submit, _worker_transcribe)
+        in_flight: deque = deque()
+        for chunk in chunks:
+            in_flight.append((submit(chunk, sr), _chunk_end(chunk)))
+            if len(in_flight) >= workers * 2:
+                fut, end = in_flight.popleft()
+                offsets, segments, timings = fut.result()
+                _record_timings(timings)
+                yield offsets, segments, end
+        while in_flight:
+            fut, end = in_flight.popleft()
+            offsets, segments, timings = fut.result()
+            _record_timings(timings)
+            yield offsets, segments, end
+
+
+def _transcribe_chunks(
+    chunks: Iterator[Chunk],
+    sf: SegmentsFile,
+    journal: SegmentsJournal,
+    resume_offset: float,
+    total_duration: float,
+    settings: Settings,
+    on_checkpoint: Callable[[float], None] | None = None,
+) -> None:
+    for offsets, chunk_segments, chunk_end in _run_chunks(chunks, settings):
         print(f"  Got {len(chunk_segments)} segments", flush=True)
 
         new_in_chunk = 0
         last_log = time.monotonic()
         for seg in chunk_segments:
-            abs_start = chunk_start + seg["start"]
-            abs_end = chunk_start + seg["end"]
+            abs_start = _to_absolute(seg["start"], offsets)
+            abs_end = _to_absolute(seg["end"], offsets, end=True)
 
             # Skip segments already covered by resume
             if abs_end <= resume_offset:
@@ -141,6 +447,7 @@ def transcribe_audio(wav_path: Path, book_path: Path, settings: Settings) -> Seg
 
             entry = SegmentEntry(start=abs_start, end=abs_end, text=seg["text"].strip())
             sf.segments.append(entry)
+            journal.append(entry)
             new_in_chunk += 1
 
             now = time.monotonic()
@@ -152,27 +459,31 @@ def transcribe_audio(wav_path: Path, book_path: Path, settings: Settings) -> Seg
                 )
                 last_log = now
 
-            if len(sf.segments) % SAVE_INTERVAL == 0:
-                save_segments_file(sf, segments_path)
-
-        # Save after each chunk
-        save_segments_file(sf, segments_path)
+        # Checkpoint after each chunk, so a resume starts at its end
+        sf.transcribed_until = max(sf.transcribed_until, chunk_end)
+        with metrics.timer("save"):
+            journal.checkpoint(sf.transcribed_until)
+        if on_checkpoint is not None:
+            on_checkpoint(sf.transcribed_until)
         print(
             f"  Chunk done. Total segments so far: {len(sf.segments)}",
             flush=True,
         )
 
-    save_segments_file(sf, segments_path)
-    print(f"Transcription complete: {len(sf.segments)} total segments", flush=True)
-    return sf
-
 
 def write_transcript(sf: SegmentsFile, book_path: Path) -> Path:
     out = book_path / "transcript.txt"
+    if isinstance(sf.segments, SegmentStore):
+        rows = sf.segments.rows()
+    else:
+        rows = ((seg.start, seg.end, seg.text) for seg in sf.segments)
     lines = []
-    for seg in sf.segments:
-        ts = format_timestamp(seg.start)
-        lines.append(f"[{ts}] {seg.text}")
-    out.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    for start, _, text in rows:
+        ts = format_timestamp(start)
+        lines.append(f"[{ts}] {text}")
+    # Replace rather than rewrite: the file may be hard-linked into the transcript cache
+    tmp = tmp_path(out)
+    tmp.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    tmp.rename(out)
     print(f"Transcript written: {out} ({len(lines)} lines)")
     return out
@@ -2,10 +2,14 @@ from __future__ import annotations
 
 import hashlib
 import math
+import os
 import re
+import threading
 from pathlib import Path
 
+from book_sync import metrics
 from book_sync.config import DATA_DIR
+from book_sync.models import State
 
 
 def sanitize_title(title: str) -> str:
@@ -21,15 +25,102 @@ def format_timestamp(seconds: float) -> str:
     return f"{h:02d}:{m:02d}:{s:02d}"
 
 
-def sha256_file(path: Path) -> str:
+HASH_BLOCK_SIZE = 4 << 20  # 4 MiB blocks for checksum manifests
+
+
+class BlockHasher:
+    """Incremental sha256 over fixed-size blocks.
+
+    A file's checksum is the sha256 of its concatenated block digests, so
+    files written out of order or across restarts can be hashed as the
+    bytes go by and resumed from a manifest without rereading them.
+    """
+
+    def __init__(self, block_size: int = HASH_BLOCK_SIZE):
+        self.block_size = block_size
+        self._h = hashlib.sha256()
+        self._fill = 0
+
+    def update(self, data: bytes) -> list[str]:
+        """Feed bytes; return digests of any blocks completed by them."""
+        done = []
+        view = memoryview(data)
+        while view:
+            take = min(len(view), self.block_size - self._fill)
+            self._h.update(view[:take])
+            self._fill += take
+            view = view[take:]
+            if self._fill == self.block_size:
+                done.append(self._h.hexdigest())
+                self._h = hashlib.sha256()
+                self._fill = 0
+        return done
+
+    def flush(self) -> list[str]:
+        """Return the digest of the trailing partial block, if any."""
+        if not self._fill:
+            return []
+        digest = self._h.hexdigest()
+        self._h = hashlib.sha256()
+        self._fill = 0
+        return [digest]
+
+
+def blocks_digest(blocks: list[str]) -> str:
     h = hashlib.sha256()
+    for b in blocks:
+        h.update(bytes.fromhex(b))
+    return h.hexdigest()
+
+
+def hash_file_blocks(path: Path, limit: int | None = None) -> list[str]:
+    hasher = BlockHasher()
+    blocks: list[str] = []
+    remaining = limit
     with open(path, "rb") as f:
-        while True:
-            chunk = f.read(1 << 20)
+        while remaining is None or remaining > 0:
+            chunk = f.read(1 << 20 if remaining is None else min(1 << 20, remaining))
             if not chunk:
                 break
-            h.update(chunk)
-    return h.hexdigest()
+            blocks += hasher.update(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+    return blocks + hasher.flush()
+
+
+def checksum_file(path: Path) -> str:
+    with metrics.timer("hash"):
+        return blocks_digest(hash_file_blocks(path))
+
+
+def file_fingerprint(path: Path) -> str:
+    st = path.stat()
+    return f"{st.st_size}:{st.st_mtime_ns}:{st.st_ino}"
+
+
+def record_checksum(state: State, key: str, path: Path, digest: str | None = None) -> str:
+    """Store the file's block checksum and stat fingerprint under ``key``.
+
+    With no digest given, the stored one is reused while the (size, mtime_ns,
+    inode) fingerprint is unchanged, and the file is only rehashed otherwise.
+    """
+    fingerprint = file_fingerprint(path)
+    if digest is None:
+        if key in state.checksums and state.fingerprints.get(key) == fingerprint:
+            return state.checksums[key]
+        digest = checksum_file(path)
+    state.checksums[key] = digest
+    state.fingerprints[key] = fingerprint
+    return digest
+
+
+def tmp_path(path: Path) -> Path:
+    """A sibling of ``path`` to write before renaming it over ``path``.
+
+    The name is unique to this process and thread, so concurrent writers of
+    the same file never truncate or rename each other's half-written copy.
+    """
+    return path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
 
 
 def book_dir(title: str) -> Path:
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import numpy as np
+
+
+FRAME_SECONDS = 0.03
+ENERGY_THRESHOLD_DB = -45.0  # frames louder than this (dBFS) are speech
+ZCR_MARGIN_DB = 10.0  # quieter frames still count if they look like fricatives
+ZCR_THRESHOLD = 0.25  # zero crossings per sample typical of unvoiced speech
+HANGOVER_SECONDS = 0.3  # pad speech on both sides so word edges are not clipped
+CUT_SEARCH_SECONDS = 30.0  # look this far back from a chunk limit for a pause
+ANALYSIS_BLOCK_FRAMES = 20000  # ~10 minutes of frames per vectorised pass
+
+
+class VoiceActivity:
+    """Frame-level energy / zero-crossing voice activity over a PCM buffer.
+
+    ``samples`` may be an int16 view over a memory-mapped WAV; it is analysed
+    in blocks so a whole book never has to be converted to float at once.
+    Times are in seconds and shifted by ``offset``.
+    """
+
+    def __init__(self, samples: np.ndarray, sample_rate: int, offset: float = 0.0):
+        self.offset = offset
+        self.frame_len = max(1, int(FRAME_SECONDS * sample_rate))
+        self.frame_seconds = self.frame_len / sample_rate
+
+        energy, zcr = _frame_features(samples, self.frame_len)
+        speech = (energy > ENERGY_THRESHOLD_DB) | (
+            (energy > ENERGY_THRESHOLD_DB - ZCR_MARGIN_DB) & (zcr > ZCR_THRESHOLD)
+        )
+        pad = int(HANGOVER_SECONDS / self.frame_seconds)
+        if pad and len(speech):
+            kernel = np.ones(2 * pad + 1, dtype=np.int32)
+            speech = np.convolve(speech.astype(np.int32), kernel, mode="same") > 0
+        self.speech = speech
+        # Smoothed energy, used to find the quietest point when a cut is forced
+        self.smoothed = np.convolve(energy, np.ones(7, dtype=np.float32) / 7, mode="same")
+
+    @property
+    def duration(self) -> float:
+        return len(self.speech) * self.frame_seconds
+
+    def spans(self, min_silence: float) -> list[tuple[float, float]]:
+        """Speech runs, bridged across silences shorter than ``min_silence``."""
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], self.speech.astype(np.int8), [0]))))
+        if not len(edges):
+            return []
+        starts, ends = edges[0::2], edges[1::2]
+        keep = (starts[1:] - ends[:-1]) * self.frame_seconds >= min_silence
+        starts = np.concatenate((starts[:1], starts[1:][keep]))
+        ends = np.concatenate((ends[:-1][keep], ends[-1:]))
+        fs = self.frame_seconds
+        return [(self.offset + s * fs, self.offset + e * fs) for s, e in zip(starts.tolist(), ends.tolist())]
+
+    def quietest_point(self, lo: float, hi: float) -> float:
+        """Return the centre of the quietest frame between ``lo`` and ``hi``."""
+        lo_f = max(0, int((lo - self.offset) / self.frame_seconds))
+        hi_f = min(len(self.smoothed), max(lo_f + 1, int((hi - self.offset) / self.frame_seconds)))
+        if lo_f >= hi_f:
+            return hi
+        idx = lo_f + int(np.argmin(self.smoothed[lo_f:hi_f]))
+        return self.offset + (idx + 0.5) * self.frame_seconds
+
+    def plan(self, target_seconds: float, skip_silence: float, start: float = 0.0) -> list[list[tuple[float, float]]]:
+        """Group speech into chunks of at most ``target_seconds`` of audio.
+
+        Silences of ``skip_silence`` seconds or longer are left out entirely.
+        Spans longer than the room left in a chunk are cut at the quietest
+        point shortly before the limit, so cuts land in pauses, not words.
+        Audio before ``start`` is skipped.
+        """
+        chunks: list[list[tuple[float, float]]] = []
+        cur: list[tuple[float, float]] = []
+        cur_len = 0.0
+        for s, e in self.spans(skip_silence):
+            if e <= start:
+                continue
+            s = max(s, start)
+            while e - s > target_seconds - cur_len:
+                room = target_seconds - cur_len
+                search = min(CUT_SEARCH_SECONDS, target_seconds / 2)
+                if cur and (e - s <= target_seconds or room < search):
+                    chunks.append(cur)
+                    cur, cur_len = [], 0.0
+                    continue
+                cut = self.quietest_point(s + room - search, s + room)
+                cur.append((s, cut))
+                chunks.append(cur)
+                cur, cur_len = [], 0.0
+                s = cut
+            cur.append((s, e))
+            cur_len += e - s
+        if cur:
+            chunks.append(cur)
+        return chunks
+
+
+def _frame_features(samples: np.ndarray, frame_len: int) -> tuple[np.ndarray, np.ndarray]:
+    """Per-frame energy in dBFS and zero-crossing rate."""
+    n_frames = len(samples) // frame_len
+    scale = 32768.0 if samples.dtype == np.int16 else 1.0
+    energy = np.empty(n_frames, dtype=np.float32)
+    zcr = np.empty(n_frames, dtype=np.float32)
+    for lo in range(0, n_frames, ANALYSIS_BLOCK_FRAMES):
+        hi = min(lo + ANALYSIS_BLOCK_FRAMES, n_frames)
+        frames = samples[lo * frame_len : hi * frame_len].reshape(hi - lo, frame_len)
+        x = frames.astype(np.float32) / scale
+        energy[lo:hi] = 10 * np.log10(np.mean(x * x, axis=1) + 1e-10)
+        signs = np.signbit(frames)
+        zcr[lo:hi] = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / max(1, frame_len - 1)
+    return energy, zcr
@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import sqlite3
+import threading
+from collections.abc import Callable, Sequence
+from datetime import datetime, timezone
+
+import feedparser
+import httpx
+
+from book_sync import catalog
+from book_sync.config import Settings
+from book_sync.feed import feed_books, save_feed_json
+from book_sync.models import FeedInfo, WatchedFeed
+from book_sync.scheduler import run_schedule
+
+
+JITTER = 0.1  # spread polls by up to ±10% of the interval so feeds don't fire in lockstep
+MAX_BACKOFF_SECONDS = 6 * 3600.0
+MAX_CONCURRENT_POLLS = 8
+
+
+async def poll_feed(client: httpx.AsyncClient, feed: WatchedFeed) -> list[FeedInfo]:
+    """Fetch ``feed`` if it changed and return the books it gained since the last poll.
+
+    The cached ETag and Last-Modified are sent back as validators, so an
+    unchanged feed costs a 304 with no body. The caller adds each new book
+    to ``feed.known`` once it is saved, and persists the feed.
+    """
+    headers = {}
+    if feed.etag:
+        headers["If-None-Match"] = feed.etag
+    if feed.last_modified:
+        headers["If-Modified-Since"] = feed.last_modified
+    resp = await client.get(feed.url, headers=headers)
+    if resp.status_code == 304:
+        return []
+    resp.raise_for_status()
+
+    parsed = await asyncio.to_thread(feedparser.parse, resp.content)
+    books = feed_books(parsed)
+    known = set(feed.known)
+    new = [b for b in books if b.rss_item["id"] not in known]
+    feed.etag = resp.headers.get("etag")
+    feed.last_modified = resp.headers.get("last-modified")
+    return new
+
+
+def next_delay(feed: WatchedFeed) -> float:
+    """Seconds until the next poll: the interval with jitter, doubled per consecutive failure."""
+    delay = min(feed.interval_seconds * 2 ** feed.failures, max(MAX_BACKOFF_SECONDS, feed.interval_seconds))
+    return delay * random.uniform(1 - JITTER, 1 + JITTER)
+
+
+def _initial_delay(feed: WatchedFeed) -> float:
+    """Time left of the current interval, so restarting the watcher doesn't poll every feed at once."""
+    if not feed.checked_at:
+        return 0.0
+    elapsed = (datetime.now(timezone.utc) - datetime.fromisoformat(feed.checked_at)).total_seconds()
+    return max(0.0, next_delay(feed) - elapsed)
+
+
+async def _poll_once(
+    client: httpx.AsyncClient,
+    feed: WatchedFeed,
+    limit: asyncio.Semaphore,
+    on_new: Callable[[], None],
+) -> None:
+    async with limit:
+        try:
+            books = await poll_feed(client, feed)
+        except (httpx.HTTPError, ValueError) as e:
+            feed.failures += 1
+            print(f"Poll failed ({feed.failures} in a row): {feed.url}: {e}", flush=True)
+        else:
+            feed.failures = 0
+            if await _save_books(feed, books):
+                on_new()
+    feed.checked_at = datetime.now(timezone.utc).isoformat()
+    try:
+        await asyncio.to_thread(catalog.record_poll, feed)
+    except (OSError, sqlite3.Error) as e:
+        print(f"Could not record the poll of {feed.url}: {e}", flush=True)
+
+
+async def _save_books(feed: WatchedFeed, books: list[FeedInfo]) -> int:
+    """Save each new book and mark it known; return how many were saved.
+
+    A book that can't be saved stays unknown, and the feed's validators are
+    dropped so the next poll fetches it in full instead of getting a 304.
+    """
+    saved = 0
+    for info in books:
+        print(f"New book: {info.title}", flush=True)
+        try:
+            await asyncio.to_thread(save_feed_json, info)  # file and catalog writes
+        except (OSError, sqlite3.Error) as e:
+            print(f"Could not save {info.title}, retrying on the next poll: {e}", flush=True)
+            feed.etag = feed.last_modified = None
+            continue
+        feed.known.append(info.rss_item["id"])
+        saved += 1
+    return saved
+
+
+async def _watch_feed(
+    client: httpx.AsyncClient,
+    feed: WatchedFeed,
+    limit: asyncio.Semaphore,
+    on_new: Callable[[], None],
+) -> None:
+    await asyncio.sleep(_initial_delay(feed))
+    while True:
+        await _poll_once(client, feed, limit, on_new)
+        await asyncio.sleep(next_delay(feed))
+
+
+async def _in_daemon_thread(func: Callable, *args) -> object:
+    """Run ``func`` in a daemon thread, so an interrupt doesn't wait for it to finish."""
+    loop = asyncio.get_running_loop()
+    done = loop.create_future()
+
+    def target() -> None:
+        try:
+            result = func(*args)
+        except BaseException as e:
+            loop.call_soon_threadsafe(done.set_exception, e)
+        else:
+            loop.call_soon_threadsafe(done.set_result, result)
+
+    threading.Thread(target=target, daemon=True).start()
+    return await done
+
+
+async def _process_queue(pending: asyncio.Event, settings: Settings) -> None:
+    """Run the scheduler over every unfinished book whenever new ones arrive."""
+    while True:
+        await pending.wait()
+        pending.clear()
+        try:
+            await _in_daemon_thread(run_schedule, [], settings)
+        except Exception as e:
+            # Keep watching; the books stay queued for the next arrival or `schedule`
+            print(f"Processing queued books failed: {e}", flush=True)
+
+
+async def watch_feeds(feeds: Sequence[WatchedFeed], settings: Settings, once: bool = False, process: bool = False) -> None:
+    pending = asyncio.Event()
+    if process:
+        pending.set()  # start on books already queued
+    limit = asyncio.Semaphore(MAX_CONCURRENT_POLLS)
+    async with httpx.AsyncClient(follow_redirects=True, timeout=30.0) as client:
+        if once:
+            await asyncio.gather(*(_poll_once(client, f, limit, pending.set) for f in feeds))
+            if process and pending.is_set():
+                await _in_daemon_thread(run_schedule, [], settings)
+            return
+        tasks = [_watch_feed(client, f, limit, pending.set) for f in feeds]
+        if process:
+            tasks.append(_process_queue(pending, settings))
+        await asyncio.gather(*tasks)
+
+
+def run_watch(
+    urls: Sequence[str],
+    settings: Settings,
+    interval: float | None = None,
+    once: bool = False,
+    process: bool = False,
+) -> None:
+    """Poll every watched feed (adding ``urls`` to them) and queue each new enclosure as a book.
+
+    With ``process``, queued books are run through the scheduler as they
+    arrive; otherwise they wait for ``schedule``.
+    """
+    for url in urls:
+        catalog.watch_feed(url, interval or settings.watch_interval, replace=interval is not None)
+    feeds = catalog.watched_feeds()
+    if not feeds:
+        print("No feeds to watch")
+        return
+    print(f"Watching {len(feeds)} feed(s)", flush=True)
+    try:
+        asyncio.run(watch_feeds(feeds, settings, once, process))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+from pathlib import Path
+
+import numpy as np
+
+from book_sync.utils import HASH_BLOCK_SIZE, BlockHasher, blocks_digest
+
+
+WAV_HEADER_SIZE = 44
+SAMPLE_WIDTH = 2  # pcm_s16le
+MAX_CHUNK_SIZE = 0xFFFFFFFF  # RIFF sizes are 32-bit; longer books (over ~37 h at 16 kHz) are clamped
+
+
+def wav_header(data_size: int, sample_rate: int, channels: int = 1) -> bytes:
+    """Return the 44-byte header for ``data_size`` bytes of PCM.
+
+    Sizes that don't fit 32 bits are written as 0xFFFFFFFF, as ffmpeg does,
+    and readers take the data to run to the end of the file. The header
+    stays 44 bytes either way, so the PCM keeps its place on the hash blocks.
+    """
+    byte_rate = sample_rate * channels * SAMPLE_WIDTH
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", min(36 + data_size, MAX_CHUNK_SIZE), b"WAVE",
+        b"fmt ", 16, 1, channels, sample_rate, byte_rate, channels * SAMPLE_WIDTH, SAMPLE_WIDTH * 8,
+        b"data", min(data_size, MAX_CHUNK_SIZE),
+    )
+
+
+class WavWriter:
+    """Write mono s16le PCM to a WAV file, hashing it as it is written.
+
+    The header is patched once the data size is known. Block 0 holds the
+    header, so its PCM bytes are kept in memory until close(); every later
+    block is hashed inline, giving the same checksum as utils.checksum_file.
+    """
+
+    def __init__(self, path: Path, sample_rate: int):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.data_size = 0
+        self._f = open(path, "wb")
+        self._f.write(wav_header(0, sample_rate))
+        self._head = bytearray()
+        self._hasher = BlockHasher()
+        self._blocks: list[str] = []
+
+    def write(self, data: bytes) -> None:
+        self._f.write(data)
+        self.data_size += len(data)
+        room = HASH_BLOCK_SIZE - WAV_HEADER_SIZE - len(self._head)
+        if room > 0:
+            self._head += data[:room]
+            data = data[room:]
+        if data:
+            self._blocks += self._hasher.update(data)
+
+    def close(self) -> str:
+        """Finalise the header and return the file checksum."""
+        header = wav_header(self.data_size, self.sample_rate)
+        self._f.seek(0)
+        self._f.write(header)
+        self._f.close()
+        first = BlockHasher()
+        blocks = first.update(header + self._head) + first.flush()
+        return blocks_digest(blocks + self._blocks + self._hasher.flush())
+
+    def abort(self) -> None:
+        self._f.close()
+        self.path.unlink(missing_ok=True)
+
+
+class WavRangeWriter:
+    """Write one range of a WAV file's PCM data at its offset, hashing it as it is written.
+
+    For a file filled by several writers at once (see ``convert._convert_ranges``).
+    A range other than the first must start on a hash block boundary, so it
+    hashes whole blocks of its own; the first keeps the bytes that share
+    block 0 with the header, as WavWriter does, until ``finish_wav``.
+    """
+
+    def __init__(self, fd: int, start_sample: int):
+        self.fd = fd
+        self.offset = WAV_HEADER_SIZE + start_sample * SAMPLE_WIDTH
+        if start_sample and self.offset % HASH_BLOCK_SIZE:
+            raise ValueError(f"WAV range at byte {self.offset} does not start on a hash block")
+        self.size = 0
+        self.head = bytearray()
+        self._hasher = BlockHasher()
+        self.blocks: list[str] = []
+
+    def write(self, data: bytes) -> None:
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(self.fd, view, self.offset + self.size)
+            view = view[written:]
+            self.size += written
+        room = HASH_BLOCK_SIZE - self.offset - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if data:
+            self.blocks += self._hasher.update(data)
+
+    def flush(self) -> None:
+        self.blocks += self._hasher.flush()
+
+
+def finish_wav(fd: int, sample_rate: int, ranges: list[WavRangeWriter]) -> str:
+    """Write the header for contiguous ``ranges`` (in file order) and return the file checksum."""
+    header = wav_header(sum(r.size for r in ranges), sample_rate)
+    os.pwrite(fd, header, 0)
+    first = BlockHasher()
+    blocks = first.update(header + ranges[0].head) + first.flush()
+    for r in ranges:
+        r.flush()
+        blocks += r.blocks
+    return blocks_digest(blocks)
+
+
+class WavReader:
+    """Memory-mapped reader for mono PCM s16le WAV files.
+
+    The header is parsed once; slice() returns zero-copy int16 views over
+    the mapping, so chunks share the page cache instead of being copied.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._f = open(path, "rb")
+        try:
+            self.sample_rate, data_offset, data_size = _parse_header(self._f, path.stat().st_size)
+            self._mmap = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        except BaseException:
+            self._f.close()
+            raise
+        self.samples = np.frombuffer(
+            self._mmap, dtype="<i2", count=data_size // SAMPLE_WIDTH, offset=data_offset
+        )
+
+    @property
+    def duration(self) -> float:
+        return len(self.samples) / self.sample_rate
+
+    def slice(self, start: float, end: float) -> np.ndarray:
+        """Return the int16 samples between ``start`` and ``end`` seconds as a view."""
+        lo = max(0, int(round(start * self.sample_rate)))
+        hi = min(len(self.samples), int(round(end * self.sample_rate)))
+        return self.samples[lo:hi]
+
+    def close(self) -> None:
+        del self.samples
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass  # a caller still holds a view; the mapping goes when it does
+        self._f.close()
+
+    def __enter__(self) -> WavReader:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _parse_header(f, file_size: int) -> tuple[int, int, int]:
+    """Return ``(sample_rate, data_offset, data_size)`` after validating the format.
+
+    Reads RF64 files too, taking the data size from their ds64 chunk.
+    """
+    riff, _, wave = struct.unpack("<4sI4s", f.read(12))
+    if riff not in (b"RIFF", b"RF64") or wave != b"WAVE":
+        raise ValueError(f"Not a WAV file: {f.name}")
+
+    sample_rate = None
+    ds64_data_size = None
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            raise ValueError(f"No data chunk in {f.name}")
+        chunk_id, size = struct.unpack("<4sI", chunk)
+        if chunk_id == b"ds64":
+            ds64 = f.read(size + (size & 1))
+            _, ds64_data_size = struct.unpack("<QQ", ds64[:16])
+        elif chunk_id == b"fmt ":
+            fmt = f.read(size)
+            tag, channels, sample_rate, _, _, bits = struct.unpack("<HHIIHH", fmt[:16])
+            if tag not in (1, 0xFFFE) or channels != 1 or bits != 16:
+                raise ValueError(f"Expected mono 16-bit PCM in {f.name}, got format {tag}, "
+                                 f"{channels} channel(s), {bits} bits")
+        elif chunk_id == b"data":
+            if sample_rate is None:
+                raise ValueError(f"data chunk before fmt chunk in {f.name}")
+            offset = f.tell()
+            if size == MAX_CHUNK_SIZE and ds64_data_size is not None:
+                size = ds64_data_size
+            # Streamed writers may leave the size as 0, and long files clamp it to 0xFFFFFFFF
+            if size in (0, MAX_CHUNK_SIZE) or offset + size > file_size:
+                size = file_size - offset
+            return sample_rate, offset, size
+        else:
+            f.seek(size + (size & 1), 1)
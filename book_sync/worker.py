@@ -0,0 +1,355 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+import queue
+import secrets
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing.connection import AuthenticationError, Client, Connection, Listener
+from pathlib import Path
+
+from book_sync.config import DATA_DIR, Settings
+
+
+SOCKET_NAME = ".worker.sock"  # hidden, so the catalog doesn't mistake it for a book
+STOP_SECONDS = 10
+
+
+def socket_path(settings: Settings) -> Path:
+    return Path(settings.worker_socket) if settings.worker_socket else DATA_DIR / SOCKET_NAME
+
+
+def _key_path(address: Path) -> Path:
+    return address.with_name(address.name + ".key")
+
+
+def _rss_bytes() -> int:
+    """Resident memory of this process (the peak, where there is no /proc)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _model_key(settings: Settings) -> tuple:
+    """What a loaded model depends on; a job with another key needs a fresh process."""
+    return settings.backend, settings.model, settings.cpu_threads, settings.batch_size
+
+
+def _serve_model(conn: Connection, settings: Settings) -> None:
+    """Model process: load the backend once, then transcribe chunks until told to stop."""
+    from book_sync.backends import load_backend
+    from book_sync.transcribe import transcribe_chunk
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the supervisor decides when to stop
+    t0 = time.perf_counter()
+    try:
+        backend = load_backend(settings)
+    except Exception as e:
+        conn.send(("error", f"{type(e).__name__}: {e}", _rss_bytes()))
+        return
+    load_seconds = time.perf_counter() - t0
+    conn.send(("ready", load_seconds, _rss_bytes()))
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        try:
+            offsets, segments, timings = transcribe_chunk(backend, *job)
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}", _rss_bytes()))
+            continue
+        if load_seconds:
+            timings["model_load"] = load_seconds  # charged to the first chunk, like pool workers
+            load_seconds = 0.0
+        conn.send(("ok", (offsets, segments, timings), _rss_bytes()))
+
+
+class _ModelProcess:
+    """A child process with a model loaded, and what the supervisor knows about it."""
+
+    def __init__(self, settings: Settings):
+        ctx = multiprocessing.get_context("spawn")
+        self.settings = settings
+        self.key = _model_key(settings)
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_serve_model, args=(child, settings), daemon=True)
+        self.process.start()
+        child.close()
+        self.state = "loading"
+        self.jobs = 0
+        self.rss_bytes = 0
+        self.load_seconds: float | None = None
+
+    def _wait_ready(self) -> None:
+        status, value, self.rss_bytes = self.conn.recv()
+        if status != "ready":
+            self.state = "failed"
+            raise RuntimeError(f"Model failed to load: {value}")
+        self.load_seconds = value
+        self.state = "ready"
+
+    def run(self, chunk, sample_rate: int):
+        """Transcribe one chunk in this process; raises if it fails or the process dies."""
+        if self.state == "loading":
+            self._wait_ready()
+        self.state = "busy"
+        try:
+            self.conn.send((chunk, sample_rate))
+            status, value, self.rss_bytes = self.conn.recv()
+        finally:
+            self.state = "ready"
+        self.jobs += 1
+        if status != "ok":
+            raise RuntimeError(value)
+        return value
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(STOP_SECONDS)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.conn.close()
+
+    def health(self) -> dict:
+        return {
+            "pid": self.process.pid,
+            "backend": self.settings.backend,
+            "model": self.settings.model,
+            "state": self.state if self.process.is_alive() else "dead",
+            "jobs": self.jobs,
+            "rss_bytes": self.rss_bytes,
+            "load_seconds": self.load_seconds,
+        }
+
+
+class ModelWorker:
+    """Serves chunk jobs over a Unix socket from model processes that stay loaded.
+
+    Each process handles one chunk at a time; jobs wait for a free one. A
+    process is replaced after ``worker_max_jobs`` chunks (to contain leaks
+    in the ML stack), when it dies, or when a job asks for another model.
+    The socket only accepts clients that can read its key file.
+    """
+
+    def __init__(self, settings: Settings, processes: int):
+        self.settings = settings
+        self.address = socket_path(settings)
+        self.max_jobs = settings.worker_max_jobs
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self.jobs = 0
+        self.failed = 0
+        self.restarts = 0
+        self._t0 = time.monotonic()
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._procs = [_ModelProcess(settings) for _ in range(processes)]
+        self._idle: queue.Queue[_ModelProcess] = queue.Queue()
+        for proc in self._procs:
+            self._idle.put(proc)
+
+    def _replace(self, old: _ModelProcess, settings: Settings) -> _ModelProcess:
+        old.stop()
+        new = _ModelProcess(settings)  # loads in the background; the next job waits for it
+        with self._lock:
+            self._procs[self._procs.index(old)] = new
+            self.restarts += 1
+        return new
+
+    def transcribe(self, settings: Settings, chunk, sample_rate: int):
+        proc = self._idle.get()
+        try:
+            if proc.key != _model_key(settings) or not proc.process.is_alive():
+                proc = self._replace(proc, settings)
+            try:
+                result = proc.run(chunk, sample_rate)
+            except (EOFError, OSError):
+                proc = self._replace(proc, proc.settings)
+                raise RuntimeError("Model process died while transcribing") from None
+            if self.max_jobs and proc.jobs >= self.max_jobs:
+                proc = self._replace(proc, proc.settings)
+            return result
+        finally:
+            self._idle.put(proc)
+
+    def health(self) -> dict:
+        with self._lock:
+            procs = [p.health() for p in self._procs]
+        return {
+            "pid": os.getpid(),
+            "address": str(self.address),
+            "started_at": self.started_at,
+            "uptime_seconds": time.monotonic() - self._t0,
+            "jobs": self.jobs,
+            "failed": self.failed,
+            "restarts": self.restarts,
+            "max_jobs": self.max_jobs,
+            "rss_bytes": _rss_bytes(),
+            "processes": procs,
+        }
+
+    def _handle(self, conn: Connection) -> None:
+        with conn:
+            try:
+                kind, *args = conn.recv()
+            except (EOFError, OSError):
+                return
+            if kind == "transcribe":
+                try:
+                    reply = ("ok", self.transcribe(*args))
+                    with self._lock:
+                        self.jobs += 1
+                except Exception as e:
+                    reply = ("error", str(e))
+                    with self._lock:
+                        self.failed += 1
+            elif kind == "health":
+                reply = ("ok", self.health())
+            elif kind == "stop":
+                reply = ("ok", None)
+                self._stopping.set()
+            else:
+                reply = ("error", f"Unknown request: {kind!r}")
+            try:
+                conn.send(reply)
+            except OSError:
+                pass  # the client went away
+        if self._stopping.is_set():
+            _wake(self.address)
+
+    def serve(self) -> None:
+        key_path = _key_path(self.address)
+        authkey = secrets.token_bytes(32)
+        old_umask = os.umask(0o077)  # socket and key readable by this user only
+        try:
+            key_path.write_bytes(authkey)
+            listener = Listener(str(self.address), family="AF_UNIX", authkey=authkey)
+        finally:
+            os.umask(old_umask)
+        print(f"Model worker listening on {self.address} ({len(self._procs)} {self.settings.backend} process(es))")
+        try:
+            while not self._stopping.is_set():
+                try:
+                    conn = listener.accept()
+                except (AuthenticationError, OSError):
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+        finally:
+            listener.close()  # also removes the socket file
+            key_path.unlink(missing_ok=True)
+            for proc in self._procs:
+                proc.stop()
+            print(f"Model worker stopped after {self.jobs} chunk(s)")
+
+
+def _wake(address: Path) -> None:
+    """Connect once so a blocked accept() returns and notices it should stop."""
+    try:
+        Client(str(address), family="AF_UNIX", authkey=_key_path(address).read_bytes()).close()
+    except (OSError, AuthenticationError, EOFError):
+        pass
+
+
+class WorkerClient:
+    """Sends requests to a running model worker; ``submit`` keeps several in flight."""
+
+    def __init__(self, address: Path, slots: int):
+        self.address = address
+        self.slots = slots
+        self._authkey = _key_path(address).read_bytes()
+        self._pool = ThreadPoolExecutor(slots * 2)
+
+    def request(self, kind: str, *args):
+        with Client(str(self.address), family="AF_UNIX", authkey=self._authkey) as conn:
+            conn.send((kind, *args))
+            status, value = conn.recv()
+        if status != "ok":
+            raise RuntimeError(f"Model worker: {value}")
+        return value
+
+    def submit(self, settings: Settings, chunk, sample_rate: int) -> Future:
+        return self._pool.submit(self.request, "transcribe", settings, chunk, sample_rate)
+
+    def close(self) -> None:
+        self._pool.shutdown(cancel_futures=True)
+
+    def __enter__(self) -> WorkerClient:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def connect(settings: Settings) -> WorkerClient | None:
+    """A client for the worker at the configured socket, or None if none is running."""
+    address = socket_path(settings)
+    try:
+        client = WorkerClient(address, 1)
+        health = client.request("health")
+    except (OSError, EOFError, AuthenticationError):
+        return None
+    client.close()
+    return WorkerClient(address, len(health["processes"]))
+
+
+def worker_health(settings: Settings) -> dict | None:
+    client = connect(settings)
+    if client is None:
+        return None
+    with client:
+        return client.request("health")
+
+
+def stop_worker(settings: Settings) -> bool:
+    client = connect(settings)
+    if client is None:
+        return False
+    with client:
+        client.request("stop")
+    return True
+
+
+def print_health(health: dict) -> None:
+    mb = 1 << 20
+    print(f"Model worker {health['pid']} on {health['address']}")
+    print(f"  Up since: {health['started_at']} ({health['uptime_seconds']:.0f} s)")
+    print(f"  Chunks:   {health['jobs']} done, {health['failed']} failed")
+    print(f"  Restarts: {health['restarts']} (every {health['max_jobs'] or '∞'} chunks)")
+    print(f"  Memory:   {health['rss_bytes'] / mb:.0f} MB supervisor")
+    for p in health["processes"]:
+        load = f", loaded in {p['load_seconds']:.1f} s" if p["load_seconds"] is not None else ""
+        print(
+            f"  [{p['pid']}] {p['state']:<7} {p['backend']} {p['model']}: "
+            f"{p['jobs']} chunks, {p['rss_bytes'] / mb:.0f} MB{load}"
+        )
+
+
+def run_worker(settings: Settings, processes: int) -> None:
+    """Run a model worker in the foreground until interrupted or stopped."""
+    if connect(settings) is not None:
+        raise RuntimeError(f"A model worker is already running on {socket_path(settings)}")
+    # A worker that died without cleaning up leaves its socket behind
+    socket_path(settings).unlink(missing_ok=True)
+    socket_path(settings).parent.mkdir(parents=True, exist_ok=True)
+    worker = ModelWorker(settings, processes)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        worker.serve()
+    except KeyboardInterrupt:
+        pass
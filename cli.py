@@ -4,17 +4,25 @@ import argparse
 import sys
 from pathlib import Path
 
+from book_sync import catalog
 from book_sync.config import load_settings
-from book_sync.pipeline import list_books, run_process, run_rss
-from book_sync.search import print_results, search_book
+from book_sync.utils import format_timestamp
+
+# Each command imports what it runs: `list` and `search` stay well under
+# 100 ms by never loading httpx, feedparser or the transcription stack
+# (tests/test_importtime.py and benchmarks/importtime.py check the budget).
 
 
 def cmd_rss(args: argparse.Namespace) -> None:
+    from book_sync.pipeline import run_rss
+
     settings = load_settings()
     run_rss(args.url, settings)
 
 
 def cmd_list(args: argparse.Namespace) -> None:
+    from book_sync.pipeline import list_books
+
     books = list_books()
     if not books:
         print("No books found")
@@ -23,28 +31,136 @@ def cmd_list(args: argparse.Namespace) -> None:
         print(f"{title} – {stage}")
 
 
+def cmd_status(args: argparse.Namespace) -> None:
+    from book_sync.pipeline import describe_stage
+
+    entries = catalog.entries([args.title] if args.title else [])
+    if not entries:
+        print("No books found")
+        return
+    for e in entries:
+        print(e.title or e.name)
+        print(f"  Stage:    {describe_stage(e.stage, e.regions)}")
+        print(f"  Model:    {e.model or '-'}")
+        duration = format_timestamp(e.duration_seconds) if e.duration_seconds else "-"
+        print(f"  Duration: {duration}")
+        print(f"  Segments: {e.segment_count}")
+        print(f"  Updated:  {e.updated_at}")
+        for key, value in e.checksums.items():
+            print(f"  {key}: {value}")
+
+
+def cmd_rebuild(args: argparse.Namespace) -> None:
+    count = catalog.rebuild()
+    print(f"Catalogued {count} book(s)")
+
+
 def cmd_process(args: argparse.Namespace) -> None:
+    from book_sync.pipeline import run_process
+
     settings = load_settings()
+    if args.profile:
+        settings.profile_stages = args.profile
     run_process(args.title, settings)
 
 
-def cmd_search(args: argparse.Namespace) -> None:
-    bdir = first_book_dir()
-    results = search_book(bdir, args.query)
-    print_results(args.query, results)
+def cmd_schedule(args: argparse.Namespace) -> None:
+    from book_sync.scheduler import run_schedule
 
+    settings = load_settings()
+    if args.profile:
+        settings.profile_stages = args.profile
+    for name in ("downloads", "conversions", "transcriptions"):
+        value = getattr(args, name)
+        if value is not None:
+            setattr(settings, f"parallel_{name}", value)
+    scheduler = run_schedule(args.titles, settings, args.rss, args.priority)
+    if scheduler.failed:
+        sys.exit(1)
 
-def first_book_dir() -> Path:
-    from book_sync.config import DATA_DIR
 
-    if not DATA_DIR.exists():
-        print("No books found")
+def cmd_watch(args: argparse.Namespace) -> None:
+    from book_sync.watch import run_watch
+
+    for url in args.forget:
+        if not catalog.unwatch_feed(url):
+            print(f"Not watching: {url}")
+    if args.forget and not args.urls:
+        return
+    settings = load_settings()
+    run_watch(args.urls, settings, args.interval, args.once, args.process)
+
+
+def cmd_worker(args: argparse.Namespace) -> None:
+    from book_sync.worker import print_health, run_worker, stop_worker, worker_health
+
+    settings = load_settings()
+    if args.status:
+        health = worker_health(settings)
+        if health is None:
+            print("No model worker running")
+            sys.exit(1)
+        print_health(health)
+        return
+    if args.stop:
+        if not stop_worker(settings):
+            print("No model worker running")
+            sys.exit(1)
+        print("Model worker stopping")
+        return
+    if args.max_jobs is not None:
+        settings.worker_max_jobs = args.max_jobs
+    from book_sync.backends import worker_count
+
+    run_worker(settings, args.processes or worker_count(settings))
+
+
+def parse_priority(value: str) -> tuple[str, int]:
+    text, sep, priority = value.rpartition("=")
+    if not sep or not text:
+        raise argparse.ArgumentTypeError(f"expected TITLE=N, got {value!r}")
+    try:
+        return text, int(priority)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"priority must be an integer: {priority!r}") from None
+
+
+def cmd_search(args: argparse.Namespace) -> None:
+    from book_sync.search import print_results, search_library, transcribed_books
+
+    books = transcribed_books(args.book)
+    if not books:
+        print("No books with transcripts found")
         sys.exit(1)
-    for child in sorted(DATA_DIR.iterdir()):
-        if child.is_dir() and (child / "segments.json").exists():
-            return child
-    print("No books with transcripts found")
-    sys.exit(1)
+    results, total = search_library(
+        args.query,
+        books,
+        limit=args.limit or None,
+        substring=args.substring,
+        fuzzy=args.fuzzy,
+        offset=args.offset,
+    )
+    print_results(args.query, results, total)
+
+
+def cmd_serve(args: argparse.Namespace) -> None:
+    from book_sync.server import run_server
+
+    run_server(args.host, args.port, args.socket, args.cache_mb)
+
+
+PROFILE_HELP = "Run these stages (comma-separated, or 'all') under cProfile, saving profile-<stage>.pstats"
+
+
+def add_search_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("query", help="Phrase to search for")
+    parser.add_argument("--substring", action="store_true", help="Match partial words too (slower)")
+    parser.add_argument("--fuzzy", action="store_true", help="Tolerate misspellings and split words")
+    parser.add_argument(
+        "--book", action="append", default=[], help="Only search titles containing this (repeatable)"
+    )
+    parser.add_argument("--limit", type=int, default=50, help="Maximum matches to show (0 for all)")
+    parser.add_argument("--offset", type=int, default=0, help="Skip this many matches (for paging)")
 
 
 def main() -> None:
@@ -61,14 +177,57 @@ def main() -> None:
     list_p = sub.add_parser("list", help="List all books and their status")
     list_p.set_defaults(func=cmd_list)
 
+    status_p = sub.add_parser("status", help="Show catalog details for books")
+    status_p.add_argument("title", nargs="?", help="Only books whose title contains this")
+    status_p.set_defaults(func=cmd_status)
+
+    rebuild_p = sub.add_parser("rebuild", help="Regenerate the library catalog from the book directories")
+    rebuild_p.set_defaults(func=cmd_rebuild)
+
     proc_p = sub.add_parser("process", help="Resume processing for a book")
     proc_p.add_argument("title", help="Book title (as shown by list)")
+    proc_p.add_argument("--profile", metavar="STAGES", help=PROFILE_HELP)
     proc_p.set_defaults(func=cmd_process)
 
-    search_p = sub.add_parser("search", help="Search transcript for a phrase")
-    search_p.add_argument("query", help="Phrase to search for")
+    sched_p = sub.add_parser("schedule", help="Process many books at once, overlapping their stages")
+    sched_p.add_argument("titles", nargs="*", help="Only books whose title contains one of these")
+    sched_p.add_argument("--rss", action="append", default=[], help="Add this RSS feed's book first (repeatable)")
+    sched_p.add_argument(
+        "--priority", action="append", default=[], type=parse_priority, metavar="TITLE=N",
+        help="Run books whose title contains TITLE ahead of lower priorities (repeatable)",
+    )
+    sched_p.add_argument("--downloads", type=int, help="Books downloading at once")
+    sched_p.add_argument("--conversions", type=int, help="Books converting at once")
+    sched_p.add_argument("--transcriptions", type=int, help="Books transcribing at once")
+    sched_p.add_argument("--profile", metavar="STAGES", help=PROFILE_HELP)
+    sched_p.set_defaults(func=cmd_schedule)
+
+    watch_p = sub.add_parser("watch", help="Poll RSS feeds and queue every new episode as a book")
+    watch_p.add_argument("urls", nargs="*", help="Feeds to add to the watched ones")
+    watch_p.add_argument("--interval", type=float, help="Seconds between polls of these feeds")
+    watch_p.add_argument("--forget", action="append", default=[], help="Stop watching this feed (repeatable)")
+    watch_p.add_argument("--once", action="store_true", help="Poll each feed once and exit")
+    watch_p.add_argument("--process", action="store_true", help="Process queued books as they arrive")
+    watch_p.set_defaults(func=cmd_watch)
+
+    worker_p = sub.add_parser("worker", help="Keep the model loaded in a background worker for transcriptions")
+    worker_p.add_argument("--processes", type=int, help="Model processes to keep loaded (default: workers setting)")
+    worker_p.add_argument("--max-jobs", type=int, help="Replace a model process after this many chunks (0 = never)")
+    worker_p.add_argument("--status", action="store_true", help="Show the running worker's health and exit")
+    worker_p.add_argument("--stop", action="store_true", help="Stop the running worker")
+    worker_p.set_defaults(func=cmd_worker)
+
+    search_p = sub.add_parser("search", help="Search transcripts for a phrase")
+    add_search_arguments(search_p)
     search_p.set_defaults(func=cmd_search)
 
+    serve_p = sub.add_parser("serve", help="Run a search server for the web UI")
+    serve_p.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    serve_p.add_argument("--port", type=int, default=8750, help="TCP port to listen on")
+    serve_p.add_argument("--socket", type=Path, help="Listen on this Unix socket instead of TCP")
+    serve_p.add_argument("--cache-mb", type=int, default=1024, help="Memory budget for cached books")
+    serve_p.set_defaults(func=cmd_serve)
+
     args = parser.parse_args()
     if not args.command:
         parser.print_help()
@@ -80,13 +239,10 @@ def main() -> None:
 def search_main() -> None:
     parser = argparse.ArgumentParser(
         prog="search",
-        description="Search audiobook transcript for a phrase",
+        description="Search audiobook transcripts for a phrase",
     )
-    parser.add_argument("query", help="Phrase to search for")
-    args = parser.parse_args()
-    bdir = first_book_dir()
-    results = search_book(bdir, args.query)
-    print_results(args.query, results)
+    add_search_arguments(parser)
+    cmd_search(parser.parse_args())
 
 
 if __name__ == "__main__":
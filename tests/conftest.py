@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import os
+import re
+import tempfile
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+# Point the catalog, metrics and the transcript store at a scratch library, never the real one
+os.environ["BOOK_SYNC_DATA"] = tempfile.mkdtemp(prefix="book-sync-tests-")
+
+
+class RangeHandler(SimpleHTTPRequestHandler):
+    """Static files with single-range requests, an ETag and If-Range.
+
+    ``server.ignore_range`` answers every request with the whole file, and
+    ``server.drop_after`` cuts the next ranged response short after that many bytes.
+    """
+
+    def send_head(self):
+        path = Path(self.translate_path(self.path))
+        if not path.is_file():
+            self.send_error(404)
+            return None
+        st = path.stat()
+        etag = f'"{st.st_size}-{st.st_mtime_ns}"'
+        m = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if_range = self.headers.get("If-Range")
+        if not m or self.server.ignore_range or (if_range is not None and if_range != etag):
+            return self._send_file(path, 200, 0, st.st_size - 1, st.st_size, etag)
+        start = int(m.group(1))
+        end = min(int(m.group(2)) if m.group(2) else st.st_size - 1, st.st_size - 1)
+        if start >= st.st_size:
+            self.send_error(416)
+            return None
+        return self._send_file(path, 206, start, end, st.st_size, etag)
+
+    def _send_file(self, path: Path, status: int, start: int, end: int, size: int, etag: str):
+        f = open(path, "rb")
+        f.seek(start)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("ETag", etag)
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        self._remaining = end - start + 1
+        if status == 206 and self.server.drop_after is not None:
+            self._remaining = min(self._remaining, self.server.drop_after)
+            self.close_connection = True
+        return f
+
+    def copyfile(self, source, outputfile) -> None:
+        remaining = self._remaining
+        try:
+            while remaining:
+                chunk = source.read(min(remaining, 1 << 20))
+                if not chunk:
+                    break
+                outputfile.write(chunk)
+                remaining -= len(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client stopped reading, e.g. after a range probe got 200
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def http_root(tmp_path: Path):
+    """Serve ``tmp_path / "srv"`` over HTTP; yields ``(server, base url, directory)``."""
+    root = tmp_path / "srv"
+    root.mkdir()
+    handler = lambda *args, **kwargs: RangeHandler(*args, directory=str(root), **kwargs)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    server.ignore_range = False
+    server.drop_after = None
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server, f"http://127.0.0.1:{server.server_address[1]}", root
+    finally:
+        server.shutdown()
+        server.server_close()
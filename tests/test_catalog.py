@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+
+import pytest
+
+from book_sync import catalog
+from book_sync.models import State
+
+
+@pytest.fixture(autouse=True)
+def data_dir(tmp_path, monkeypatch):
+    """A library of its own, so each test starts without a catalog."""
+    monkeypatch.setattr(catalog, "DATA_DIR", tmp_path)
+    return tmp_path
+
+
+def _book(data_dir, name, feed=None, state=None):
+    path = data_dir / name
+    path.mkdir()
+    if feed is not None:
+        (path / "feed.json").write_text(json.dumps(feed))
+    if state is not None:
+        (path / "state.json").write_text(json.dumps(state))
+    return path
+
+
+def test_record_state_and_feed_round_trip():
+    regions = [{"start": 0.0, "end": 60.0, "model": "m", "draft": False}]
+    catalog.record_feed("Moby Dick", "Moby Dick", "http://example.com/moby.mp3", 36000.0)
+    catalog.record_state("Moby Dick", State(stage="transcribing", last_segment=12, model="m",
+                                            checksums={"audio_wav": "ab"}, regions=regions))
+    catalog.record_state("Walden", State(stage="done"))
+
+    entry = catalog.get_entry("Moby Dick")
+    assert (entry.title, entry.audio_url, entry.duration_seconds) == ("Moby Dick", "http://example.com/moby.mp3", 36000.0)
+    assert (entry.stage, entry.segment_count, entry.model) == ("transcribing", 12, "m")
+    assert (entry.checksums, entry.regions) == ({"audio_wav": "ab"}, regions)
+    assert entry.created_at <= entry.updated_at
+
+    assert [e.name for e in catalog.entries()] == ["Moby Dick", "Walden"]
+    assert [e.name for e in catalog.entries(["moby"])] == ["Moby Dick"]
+    assert [e.name for e in catalog.entries(stages=["done"])] == ["Walden"]
+    assert catalog.entries(["moby"], ["done"]) == []
+    assert catalog.get_entry("Missing") is None
+    assert [e.name for e in catalog.entries_with_audio("http://example.com/moby.mp3")] == ["Moby Dick"]
+
+
+def test_rebuild_from_book_directories(data_dir):
+    _book(data_dir, "Moby Dick", {"title": "Moby Dick", "audio_url": "http://example.com/moby.mp3",
+                                  "duration_seconds": 100.0},
+          {"stage": "done", "last_segment": 30, "checksums": {"audio_wav": "ab"}})
+    _book(data_dir, "Walden", {"title": "Walden", "audio_url": "http://example.com/walden.mp3"})
+    _book(data_dir, "Empty")
+    _book(data_dir, ".store")  # hidden directories are not books
+    (data_dir / "notes.txt").write_text("not a book")
+    catalog.record_state("Gone", State(stage="done"))  # no directory any more
+
+    assert catalog.rebuild() == 3
+    moby, walden, empty = (catalog.get_entry(n) for n in ("Moby Dick", "Walden", "Empty"))
+    assert (moby.stage, moby.segment_count, moby.checksums, moby.duration_seconds) == ("done", 30, {"audio_wav": "ab"}, 100.0)
+    assert (walden.stage, walden.audio_url) == ("downloading", "http://example.com/walden.mp3")
+    assert (empty.title, empty.audio_url) == (None, None)
+    assert catalog.get_entry("Gone") is None
+    assert catalog.get_entry(".store") is None
+
+
+def test_a_library_without_a_catalog_is_catalogued_on_first_use(data_dir):
+    _book(data_dir, "Walden", {"title": "Walden", "audio_url": "http://example.com/walden.mp3"}, {"stage": "done"})
+    assert not catalog.catalog_path().exists()
+    assert [(e.name, e.stage) for e in catalog.entries()] == [("Walden", "done")]
+
+
+def test_rebuild_keeps_watched_feeds():
+    catalog.watch_feed("http://example.com/feed.xml", 60.0)
+    catalog.rebuild()
+    assert [f.url for f in catalog.watched_feeds()] == ["http://example.com/feed.xml"]
+
+
+def test_migrate_a_version_1_catalog(data_dir):
+    conn = sqlite3.connect(data_dir / catalog.CATALOG_NAME)
+    # Version 1: no regions column, and stat fingerprints kept among the checksums
+    conn.execute("""
+        CREATE TABLE books (
+            name TEXT PRIMARY KEY, title TEXT, audio_url TEXT, duration_seconds REAL,
+            stage TEXT NOT NULL DEFAULT 'downloading', model TEXT, checksums TEXT NOT NULL DEFAULT '{}',
+            segment_count INTEGER NOT NULL DEFAULT 0, created_at TEXT NOT NULL, updated_at TEXT NOT NULL
+        )
+    """)
+    checksums = {"audio_wav": "ab", "audio_wav_fingerprint": "123:456", "audio_original_fingerprint": "7:8"}
+    conn.execute(
+        "INSERT INTO books (name, stage, checksums, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+        ("Walden", "done", json.dumps(checksums), "2026-01-01", "2026-01-01"),
+    )
+    conn.execute("PRAGMA user_version = 1")
+    conn.commit()
+    conn.close()
+
+    entry = catalog.get_entry("Walden")
+    assert (entry.stage, entry.checksums, entry.regions) == ("done", {"audio_wav": "ab"}, [])
+    with catalog.connect() as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == catalog.SCHEMA_VERSION == 2
+        # Migrated once: a later checksum that happens to end in _fingerprint is left alone
+        conn.execute("UPDATE books SET checksums = ? WHERE name = 'Walden'", (json.dumps({"x_fingerprint": "1"}),))
+    assert catalog.get_entry("Walden").checksums == {"x_fingerprint": "1"}
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import errno
+import shutil
+import subprocess
+
+import numpy as np
+import pytest
+
+from book_sync import convert
+from book_sync.config import Settings
+from book_sync.utils import checksum_file
+from book_sync.wav import WavRangeWriter, WavReader
+
+FFMPEG = shutil.which("ffmpeg")
+pytestmark = pytest.mark.skipif(FFMPEG is None or shutil.which("ffprobe") is None, reason="needs ffmpeg")
+
+DURATION = 300  # three ranges: a hash block is about 131 s of 16 kHz audio
+
+
+@pytest.fixture(scope="module")
+def source(tmp_path_factory):
+    """A 44.1 kHz noise MP3, so every range is resampled and no two samples repeat."""
+    path = tmp_path_factory.mktemp("source") / "book.mp3"
+    subprocess.run(
+        [FFMPEG, "-loglevel", "error", "-f", "lavfi", "-i", f"anoisesrc=d={DURATION}:c=pink:r=44100:a=0.3",
+         str(path)],
+        check=True,
+    )
+    return path
+
+
+@pytest.fixture
+def book(source, tmp_path, monkeypatch):
+    monkeypatch.setattr(convert, "MIN_RANGE_SECONDS", 10)
+    path = tmp_path / source.name
+    shutil.copyfile(source, path)
+    return path
+
+
+def _convert(book, name, workers=4):
+    out = book.with_name(name)
+    digest = convert.convert_to_wav(book, out, Settings(ffmpeg_path=FFMPEG, convert_workers=workers))
+    return out, digest
+
+
+def test_ranges_match_a_single_pass(book, capsys):
+    single, single_digest = _convert(book, "single.wav", workers=1)
+    parallel, parallel_digest = _convert(book, "parallel.wav")
+    assert "Decoding 3 time ranges in parallel" in capsys.readouterr().out
+
+    with WavReader(single) as a, WavReader(parallel) as b:
+        assert len(a.samples) == len(b.samples) == DURATION * 16000
+        seams = [start for start, _ in convert._plan_ranges(DURATION, Settings(convert_workers=4))[1:]]
+        for seam in seams:
+            np.testing.assert_array_equal(b.samples[seam - 4000:seam + 4000], a.samples[seam - 4000:seam + 4000])
+        np.testing.assert_array_equal(b.samples, a.samples)
+    assert parallel_digest == single_digest == checksum_file(parallel)
+    assert not list(book.parent.glob("*.tmp"))
+
+
+def test_failed_write_falls_back_to_one_pass(book, monkeypatch, capsys):
+    write = WavRangeWriter.write
+
+    def full_disk(self, data):
+        if self.offset > convert.WAV_HEADER_SIZE:
+            raise OSError(errno.ENOSPC, "No space left on device")
+        write(self, data)
+
+    monkeypatch.setattr(WavRangeWriter, "write", full_disk)
+    out, digest = _convert(book, "book.wav")
+    assert "writing range 2 failed" in capsys.readouterr().out
+    assert digest == checksum_file(out)
+    assert len(WavReader(out).samples) == DURATION * 16000
+
+
+def test_short_last_range_falls_back_to_one_pass(book, monkeypatch, capsys):
+    monkeypatch.setattr(convert, "_probe_duration", lambda *a: DURATION + 100.0)
+    out, digest = _convert(book, "book.wav")
+    assert "last range decoded to" in capsys.readouterr().out
+    assert digest == checksum_file(out)
+    assert len(WavReader(out).samples) == DURATION * 16000
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import os
+
+import httpx
+import pytest
+
+from book_sync.download import _download_stream, _parts_path, download_audio
+from book_sync.utils import HASH_BLOCK_SIZE, blocks_digest, hash_file_blocks
+
+
+def _publish(root, name: str, size: int, seed: int = 0):
+    data = bytes((i * 31 + seed) % 251 for i in range(251)) * (size // 251 + 1)
+    path = root / name
+    path.write_bytes(data[:size])
+    return path
+
+
+def _checksum(path) -> str:
+    return blocks_digest(hash_file_blocks(path))
+
+
+def test_ranged_download_resumes_after_interruption(http_root, tmp_path):
+    server, base, root = http_root
+    src = _publish(root, "book.mp3", 3 * HASH_BLOCK_SIZE + 12345)
+    dest = tmp_path / "out" / "book.mp3"
+
+    server.drop_after = HASH_BLOCK_SIZE + 1000
+    with pytest.raises((httpx.HTTPError, RuntimeError)):
+        download_audio(f"{base}/book.mp3", dest, connections=2)
+    assert _parts_path(dest).exists()
+
+    server.drop_after = None
+    assert download_audio(f"{base}/book.mp3", dest, connections=2) == _checksum(src)
+    assert dest.read_bytes() == src.read_bytes()
+    assert not _parts_path(dest).exists()
+
+
+def test_changed_file_restarts_download(http_root, tmp_path):
+    server, base, root = http_root
+    _publish(root, "book.mp3", 2 * HASH_BLOCK_SIZE + 99)
+    dest = tmp_path / "out" / "book.mp3"
+
+    server.drop_after = HASH_BLOCK_SIZE + 1000
+    with pytest.raises((httpx.HTTPError, RuntimeError)):
+        download_audio(f"{base}/book.mp3", dest, connections=2)
+
+    # Same size, new contents: the stored ETag no longer matches
+    src = _publish(root, "book.mp3", 2 * HASH_BLOCK_SIZE + 99, seed=7)
+    os.utime(src, ns=(0, 10**18))
+    server.drop_after = None
+    assert download_audio(f"{base}/book.mp3", dest, connections=2) == _checksum(src)
+    assert dest.read_bytes() == src.read_bytes()
+
+
+def test_missing_partial_file_restarts_download(http_root, tmp_path):
+    server, base, root = http_root
+    src = _publish(root, "book.mp3", 2 * HASH_BLOCK_SIZE + 99)
+    dest = tmp_path / "out" / "book.mp3"
+
+    server.drop_after = HASH_BLOCK_SIZE + 1000
+    with pytest.raises((httpx.HTTPError, RuntimeError)):
+        download_audio(f"{base}/book.mp3", dest, connections=2)
+    dest.unlink()
+
+    server.drop_after = None
+    assert download_audio(f"{base}/book.mp3", dest, connections=2) == _checksum(src)
+    assert dest.read_bytes() == src.read_bytes()
+
+
+def test_server_ignoring_range_gets_a_whole_download(http_root, tmp_path):
+    server, base, root = http_root
+    src = _publish(root, "book.mp3", HASH_BLOCK_SIZE + 777)
+    dest = tmp_path / "out" / "book.mp3"
+    dest.parent.mkdir()
+    dest.write_bytes(b"stale partial bytes")
+
+    server.ignore_range = True
+    assert download_audio(f"{base}/book.mp3", dest, connections=4) == _checksum(src)
+    assert dest.read_bytes() == src.read_bytes()
+
+
+def test_range_past_the_end_means_complete(http_root, tmp_path):
+    _, base, root = http_root
+    src = _publish(root, "book.mp3", 50_000)
+    dest = tmp_path / "book.mp3"
+    dest.write_bytes(src.read_bytes())
+
+    # A resume from the full size gets 416 from the server
+    assert _download_stream(f"{base}/book.mp3", dest) == _checksum(src)
+    assert dest.read_bytes() == src.read_bytes()
+
+
+@pytest.mark.parametrize("connections", [1, 2])
+def test_redownload_never_writes_through_a_hard_link(http_root, tmp_path, connections):
+    server, base, root = http_root
+    src = _publish(root, "book.mp3", HASH_BLOCK_SIZE + 4321)
+    stored = tmp_path / "store-object"
+    stored.write_bytes(b"x" * 1000)  # a shorter, different file already in the store
+    dest = tmp_path / "book.mp3"
+    os.link(stored, dest)
+
+    server.ignore_range = connections == 1
+    assert download_audio(f"{base}/book.mp3", dest, connections) == _checksum(src)
+    assert dest.read_bytes() == src.read_bytes()
+    assert stored.read_bytes() == b"x" * 1000
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import json
+
+from book_sync import pipeline
+from book_sync.config import Settings
+from book_sync.models import SegmentEntry, SegmentsFile, State
+from book_sync.search import search_book
+from book_sync.segments import DraftOverlay, draft_path, load_segments_file, save_segments_file
+from book_sync.segstore import SegmentStore, store_path, write_segment_store
+
+
+def _segments(model: str, start: int, stop: int) -> SegmentsFile:
+    entries = [SegmentEntry(start=t * 10.0, end=t * 10.0 + 10, text=f"{model} line {t}") for t in range(start, stop)]
+    return SegmentsFile(model, "book.wav", f"created by {model}", entries, transcribed_until=stop * 10.0)
+
+
+def test_draft_tail_stays_lazy(tmp_path):
+    segments_path = tmp_path / "segments.json"
+    draft = draft_path(segments_path)
+    save_segments_file(_segments("draft", 0, 100), draft)
+    write_segment_store(_segments("draft", 0, 100), store_path(draft), source=draft)
+    save_segments_file(_segments("final", 0, 40), segments_path)
+
+    sf = load_segments_file(segments_path)
+    assert isinstance(sf.segments, DraftOverlay)
+    assert isinstance(sf.segments.draft, SegmentStore)
+    assert (len(sf.segments), sf.draft_from) == (100, 40)
+    assert [s.text for s in sf.segments[38:42]] == ["final line 38", "final line 39", "draft line 40", "draft line 41"]
+    assert sf.segments[-1].text == "draft line 99"
+
+    [match] = search_book(tmp_path, "draft line 70")
+    assert match.draft and match.seg_start == 70
+    [match] = search_book(tmp_path, "final line 7")
+    assert not match.draft
+
+
+def test_drafting_is_skipped_once_the_draft_model_is_cleared(tmp_path, monkeypatch):
+    def no_transcription(*args, **kwargs):
+        raise AssertionError("drafted without a draft model")
+
+    monkeypatch.setattr("book_sync.transcribe.transcribe_audio", no_transcription)
+    bdir = tmp_path / "Book"
+    bdir.mkdir()
+    state = State(stage="drafting")
+    settings = Settings(backend="stub", draft_model="", metrics_dir=str(tmp_path / "prom"))
+
+    pipeline.run_stage(bdir, "http://example.invalid/book.mp3", state, settings)
+
+    assert (state.stage, state.regions) == ("transcribing", [])
+    assert json.loads((bdir / "state.json").read_text())["stage"] == "transcribing"
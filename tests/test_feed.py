@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import feedparser
+
+from book_sync.feed import feed_books, parse_feed
+
+FEED = """<?xml version="1.0"?>
+<rss version="2.0"><channel>
+  <title>Moby Dick</title>
+  <item>
+    <title>Chapter 1</title><guid>ch1</guid>
+    <enclosure url="http://example.com/ch1.mp3" type="audio/mpeg" length="1"/>
+  </item>
+  <item><title>Notes</title><guid>notes</guid></item>
+  <item>
+    <title>Chapter 2</title><guid>ch2</guid>
+    <enclosure url="http://example.com/ch2.mp3" type="audio/mpeg" length="1"/>
+  </item>
+</channel></rss>
+"""
+
+
+def test_rss_names_the_book_after_the_feed(tmp_path):
+    path = tmp_path / "feed.xml"
+    path.write_text(FEED)
+
+    info = parse_feed(str(path))
+    assert (info.title, info.audio_url, info.rss_item["id"]) == ("Moby Dick", "http://example.com/ch1.mp3", "ch1")
+
+
+def test_watched_feeds_name_each_entry():
+    books = feed_books(feedparser.parse(FEED))
+    assert [(b.title, b.rss_item["id"]) for b in books] == [
+        ("Moby Dick - Chapter 1", "ch1"),
+        ("Moby Dick - Chapter 2", "ch2"),
+    ]
@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+import os
+
+import pytest
+
+from benchmarks.importtime import BUDGET_MS, FORBIDDEN, command_imports, read_only_commands
+
+# The budget is for a developer machine; slow shared CI runners can raise it
+BUDGET = float(os.environ.get("BOOK_SYNC_IMPORT_BUDGET_MS", BUDGET_MS))
+
+
+@pytest.fixture(scope="module")
+def commands(tmp_path_factory):
+    data_dir = tmp_path_factory.mktemp("importtime") / "data"
+    env = {**os.environ, "BOOK_SYNC_DATA": str(data_dir)}
+    return env, read_only_commands(data_dir, env)
+
+
+@pytest.mark.parametrize("name", ["list", "status", "search"])
+def test_read_only_commands_start_fast(commands, name):
+    env, command_lines = commands
+    imports = command_imports(command_lines[name], env, runs=9)
+
+    assert [m for m in FORBIDDEN if m in imports.modules] == []
+    heaviest = ", ".join(f"{module} {us / 1e3:.1f} ms" for module, us in imports.top[:5])
+    assert imports.total_us / 1e3 < BUDGET, f"{name} imports take {imports.total_us / 1e3:.1f} ms: {heaviest}"
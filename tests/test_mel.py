@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import numpy as np
+
+from book_sync.backends import timestamped_segments
+from book_sync.mel import HOP_LENGTH, N_FFT, N_FRAMES, N_SAMPLES, SAMPLE_RATE, log_mel_batch
+
+N_MELS = 80
+
+
+def _filters() -> np.ndarray:
+    return np.abs(np.random.default_rng(1).standard_normal((N_MELS, N_FFT // 2 + 1))).astype(np.float32) / 10
+
+
+def _reference(audio: np.ndarray, filters: np.ndarray) -> np.ndarray:
+    """Whisper's log_mel_spectrogram for one window, frame by frame with an FFT, in float64."""
+    padded = np.pad(audio.astype(np.float64), N_FFT // 2, mode="reflect")
+    window = np.hanning(N_FFT + 1)[:-1]
+    n_frames = 1 + (len(padded) - N_FFT) // HOP_LENGTH
+    frames = np.stack([padded[i * HOP_LENGTH : i * HOP_LENGTH + N_FFT] * window for i in range(n_frames)])
+    power = np.abs(np.fft.rfft(frames, axis=1)[:-1]) ** 2
+    log_spec = np.log10(np.maximum(filters.astype(np.float64) @ power.T, 1e-10))
+    log_spec = np.maximum(log_spec, log_spec.max() - 8.0)
+    return (log_spec + 4.0) / 4.0
+
+
+def _windows() -> np.ndarray:
+    """A loud tone, quiet noise, and a 7 s clip zero-padded to 30 s, like the last window of a chunk."""
+    rng = np.random.default_rng(0)
+    t = np.arange(N_SAMPLES) / SAMPLE_RATE
+    windows = np.zeros((3, N_SAMPLES), dtype=np.float32)
+    windows[0] = 0.5 * np.sin(2 * np.pi * 440 * t)
+    windows[1] = 0.01 * rng.standard_normal(N_SAMPLES)
+    windows[2, : 7 * SAMPLE_RATE] = 0.2 * rng.standard_normal(7 * SAMPLE_RATE)
+    return windows
+
+
+def test_log_mel_batch_matches_a_per_window_reference():
+    windows, filters = _windows(), _filters()
+    mel = log_mel_batch(windows, filters)
+
+    assert mel.shape == (3, N_MELS, N_FRAMES)
+    assert mel.dtype == np.float32
+    for window, got in zip(windows, mel):
+        np.testing.assert_allclose(got, _reference(window, filters), atol=2e-3)
+
+
+def test_windows_in_a_batch_do_not_affect_each_other():
+    windows, filters = _windows(), _filters()
+    batched = log_mel_batch(windows, filters)
+    for i in range(len(windows)):
+        np.testing.assert_allclose(batched[i], log_mel_batch(windows[i : i + 1], filters)[0], atol=1e-5)
+
+
+class _Tokenizer:
+    timestamp_begin = 1000
+    eot = 999
+
+    def decode(self, tokens: list[int]) -> str:
+        return " ".join(map(str, tokens))
+
+
+def _ts(seconds: float) -> int:
+    return _Tokenizer.timestamp_begin + round(seconds / 0.02)
+
+
+def test_timestamped_segments_drop_the_padding_of_a_short_window():
+    tokens = [_ts(0), 1, 2, _ts(3.0), _ts(3.0), 3, _ts(6.5), _ts(7.5), 4, _ts(9.0), 999]
+
+    assert timestamped_segments(tokens, _Tokenizer(), duration=7.0) == [
+        {"start": 0.0, "end": 3.0, "text": "1 2"},
+        {"start": 3.0, "end": 6.5, "text": "3"},
+    ]
+    # A window cut mid-sentence ends at its duration
+    assert timestamped_segments([_ts(0), 5, 6], _Tokenizer(), duration=4.2) == [
+        {"start": 0.0, "end": 4.2, "text": "5 6"},
+    ]
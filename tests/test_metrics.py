@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from book_sync import metrics
+from book_sync.config import Settings
+
+
+def test_profiled_stages_run_one_at_a_time(tmp_path):
+    settings = Settings(profile_stages="all", metrics_dir=str(tmp_path / "prom"))
+    spans = []
+
+    def stage(i: int) -> None:
+        book = tmp_path / f"book{i}"
+        book.mkdir()
+        with metrics.record_stage(book, "transcribing", settings):
+            start = time.monotonic()
+            time.sleep(0.05)
+            spans.append((start, time.monotonic()))
+
+    with ThreadPoolExecutor(4) as pool:
+        list(pool.map(stage, range(4)))
+
+    spans.sort()
+    assert all(end <= next_start for (_, end), (next_start, _) in zip(spans, spans[1:]))
+    for i in range(4):
+        book = tmp_path / f"book{i}"
+        assert (book / "profile-transcribing.pstats").exists()
+        assert json.loads((book / "metrics.json").read_text())["stages"]["transcribing"]["status"] == "ok"
+
+
+def test_concurrent_writers_never_share_a_temporary_file(tmp_path):
+    prom = tmp_path / "prom"
+    book = tmp_path / "Book"
+    book.mkdir()
+    settings = Settings(metrics_dir=str(prom))
+    result = {"seconds": 1.0, "status": "ok", "timers": {}, "counters": {}, "rates": {}}
+
+    def write(i: int) -> None:
+        for _ in range(50):
+            metrics.write_metrics(book, "transcribing", result, settings)
+            metrics.write_textfile("Book", {"stages": {"transcribing": result}}, prom)
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(write, range(8)))  # a shared temporary name fails here with FileNotFoundError
+
+    assert sorted(p.name for p in prom.iterdir()) == ["Book.prom"]
+    assert sorted(p.name for p in book.iterdir()) == ["metrics.json"]
+    assert json.loads((book / "metrics.json").read_text())["stages"]["transcribing"] == result
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import Counter, namedtuple
+
+import pytest
+
+from book_sync import scheduler
+from book_sync.config import Settings
+from book_sync.models import State
+from book_sync.pipeline import save_state
+from book_sync.scheduler import AUDIO_BYTES_PER_SECOND, Scheduler
+
+NEXT_STAGE = {"downloading": "converting", "converting": "transcribing", "transcribing": "done"}
+GIB = 1 << 30
+
+
+@pytest.fixture(autouse=True)
+def _short_disk_poll(monkeypatch):
+    monkeypatch.setattr(scheduler, "DISK_POLL_SECONDS", 0.05)
+
+
+class FakeStages:
+    """Stands in for pipeline.run_stage: sleeps, records what overlapped, and advances the stage."""
+
+    def __init__(self, seconds: dict[str, float] | None = None):
+        self.seconds = {"downloading": 0.02, "converting": 0.02, "transcribing": 0.02, **(seconds or {})}
+        self.starts: list[tuple[str, str]] = []  # (stage, book) in start order
+        self.running: Counter[str] = Counter()
+        self.peak: Counter[str] = Counter()
+        self.pending: set[str] = set()  # books from the start of their download until done
+        self.peak_pending = 0
+        self.overlapped: set[frozenset[str]] = set()  # pairs of stages that ran at the same time
+        self._lock = threading.Lock()
+
+    def __call__(self, bdir, audio_url, state, settings) -> None:
+        stage, name = state.stage, bdir.name
+        with self._lock:
+            self.starts.append((stage, name))
+            self.running[stage] += 1
+            self.peak[stage] = max(self.peak[stage], self.running[stage])
+            self.overlapped |= {frozenset((stage, s)) for s, n in self.running.items() if n and s != stage}
+            self.pending.add(name)
+            self.peak_pending = max(self.peak_pending, len(self.pending))
+        time.sleep(self.seconds[stage])
+        with self._lock:
+            self.running[stage] -= 1
+            state.stage = NEXT_STAGE[stage]
+            if state.stage == "done":
+                self.pending.discard(name)
+
+    def order(self, stage: str) -> list[str]:
+        return [name for s, name in self.starts if s == stage]
+
+
+def _settings(**overrides) -> Settings:
+    options = {
+        "parallel_downloads": 1, "parallel_conversions": 1, "parallel_transcriptions": 1,
+        "max_pending_books": 0, "min_free_gb": 0,
+    }
+    return Settings(**{**options, **overrides})
+
+
+def _run(monkeypatch, tmp_path, settings, books, stages=None) -> tuple[Scheduler, FakeStages]:
+    """Queue ``books`` (name -> priority, or (priority, duration)) and run them to the end."""
+    stages = stages or FakeStages()
+    monkeypatch.setattr(scheduler, "run_stage", stages)
+    s = Scheduler(settings)
+    for name, spec in books.items():
+        priority, duration = spec if isinstance(spec, tuple) else (spec, None)
+        bdir = tmp_path / name
+        bdir.mkdir()
+        assert s.add(bdir, f"http://example.com/{name}.mp3", priority, duration)
+    s.run()
+    assert sorted(s.completed) == sorted(books) and not s.failed
+    return s, stages
+
+
+def test_higher_priority_books_start_first(monkeypatch, tmp_path):
+    _, stages = _run(monkeypatch, tmp_path, _settings(), {"a": 0, "b": 5, "c": 0, "d": 9, "e": 5})
+    assert stages.order("downloading") == ["d", "b", "e", "a", "c"]
+    assert stages.order("transcribing") == ["d", "b", "e", "a", "c"]
+
+
+def test_stages_overlap_within_their_own_limits(monkeypatch, tmp_path):
+    settings = _settings(parallel_downloads=3, parallel_conversions=2)
+    stages = FakeStages({"downloading": 0.05, "converting": 0.05, "transcribing": 0.05})
+    _run(monkeypatch, tmp_path, settings, {f"book{i}": 0 for i in range(8)}, stages)
+
+    assert stages.peak == {"downloading": 3, "converting": 2, "transcribing": 1}
+    # While one book transcribes, others download and convert
+    assert frozenset(("downloading", "transcribing")) in stages.overlapped
+    assert frozenset(("converting", "transcribing")) in stages.overlapped
+
+
+def test_downloads_wait_while_too_many_books_are_pending(monkeypatch, tmp_path):
+    settings = _settings(parallel_downloads=4, max_pending_books=2)
+    stages = FakeStages({"transcribing": 0.1})
+    _run(monkeypatch, tmp_path, settings, {f"book{i}": 0 for i in range(5)}, stages)
+    assert stages.peak_pending == 2
+
+
+def test_downloads_wait_for_disk_space(monkeypatch, tmp_path, capsys):
+    duration = 3600.0
+    need = duration * AUDIO_BYTES_PER_SECOND
+    # Room above min_free_gb for one download's estimate at a time, but not two
+    usage = namedtuple("usage", "total used free")(100 * GIB, 0, int(GIB + 1.5 * need))
+    monkeypatch.setattr(scheduler.shutil, "disk_usage", lambda path: usage)
+    settings = _settings(parallel_downloads=4, min_free_gb=1, stream=True)  # stream: conversion writes no WAV
+
+    s, stages = _run(monkeypatch, tmp_path, settings, {f"book{i}": (0, duration) for i in range(3)})
+    assert stages.peak["downloading"] == 1
+    assert "Waiting for disk space" in capsys.readouterr().out
+    assert s._reserved == 0
+
+
+def test_books_resume_at_their_saved_stage_and_done_books_are_skipped(monkeypatch, tmp_path):
+    for name, stage in (("a", "transcribing"), ("b", "done")):
+        (tmp_path / name).mkdir()
+        save_state(State(stage=stage), tmp_path / name)
+    stages = FakeStages()
+    monkeypatch.setattr(scheduler, "run_stage", stages)
+
+    s = Scheduler(_settings())
+    assert s.add(tmp_path / "a", "http://example.com/a.mp3")
+    assert not s.add(tmp_path / "b", "http://example.com/b.mp3")
+    s.run()
+    assert stages.starts == [("transcribing", "a")]
+    assert s.completed == ["a"]
+
+
+def test_a_failed_stage_does_not_stop_the_other_books(monkeypatch, tmp_path):
+    stages = FakeStages()
+
+    def run_stage(bdir, audio_url, state, settings):
+        if bdir.name == "bad" and state.stage == "converting":
+            raise RuntimeError("ffmpeg failed")
+        stages(bdir, audio_url, state, settings)
+
+    monkeypatch.setattr(scheduler, "run_stage", run_stage)
+    s = Scheduler(_settings())
+    for name in ("bad", "good"):
+        (tmp_path / name).mkdir()
+        s.add(tmp_path / name, f"http://example.com/{name}.mp3")
+    s.run()
+    assert s.completed == ["good"]
+    assert s.failed == [("bad", "converting: ffmpeg failed")]
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from book_sync.index import BookIndex, index_path
+from book_sync.models import SegmentEntry, SegmentsFile
+from book_sync.search import open_book, search_book, search_library
+from book_sync.segments import save_segments_file
+from book_sync.segstore import SegmentStore, load_segment_store, store_path, write_segment_store
+
+TEXTS = [
+    "Call me Ishmael.",
+    "Some years ago, never mind how long precisely,",
+    "having little or no money in my purse,",
+    "I thought I would sail about a little",
+    "and see the watery part of the world.",
+    "  Ça, c'est la baleine blanche — naïve!  ",
+]
+
+
+@pytest.fixture
+def book(tmp_path):
+    """A finished book whose segments.json holds ``TEXTS``, ten seconds each."""
+    segments = [SegmentEntry(start=i * 10.0, end=i * 10.0 + 9.5, text=t) for i, t in enumerate(TEXTS)]
+    sf = SegmentsFile(model="stub", audio_file="book.wav", created_at="2024-01-01T00:00:00", segments=segments)
+    sf.transcribed_until = 60.0
+    save_segments_file(sf, tmp_path / "segments.json")
+    return tmp_path
+
+
+def test_segment_store_round_trip(book):
+    from book_sync.segments import read_segments_json
+
+    segments_path = book / "segments.json"
+    sf = read_segments_json(segments_path)
+    write_segment_store(sf, store_path(segments_path), source=segments_path)
+
+    loaded = load_segment_store(store_path(segments_path), segments_path)
+    assert isinstance(loaded.segments, SegmentStore)
+    assert list(loaded.segments) == sf.segments
+    assert (loaded.model, loaded.created_at, loaded.transcribed_until) == (sf.model, sf.created_at, 60.0)
+    assert list(loaded.segments.rows()) == [(s.start, s.end, s.text) for s in sf.segments]
+    assert not loaded.segments.stripped  # the last text has surrounding spaces
+    assert loaded.segments.joined_text() == " ".join(TEXTS)
+
+
+def test_segment_store_is_ignored_once_segments_json_changes(book):
+    from book_sync.segments import read_segments_json
+
+    segments_path = book / "segments.json"
+    write_segment_store(read_segments_json(segments_path), store_path(segments_path), source=segments_path)
+    os.utime(segments_path, ns=(0, 10**18))
+
+    assert load_segment_store(store_path(segments_path), segments_path) is None
+
+
+def test_index_matches_phrases_across_segments():
+    index = BookIndex("2024-01-01T00:00:00")
+    index.add_segments(TEXTS[:3])
+    index.add_segments(TEXTS[3:])  # appended later, as checkpoints do
+
+    first, last, total = index.find_phrase("LONG, precisely having little")
+    assert (first.tolist(), last.tolist(), total) == ([1], [2], 1)
+
+    first, last, total = index.find_phrase("little")
+    assert (first.tolist(), last.tolist(), total) == ([2, 3], [2, 3], 2)
+
+    first, _, total = index.find_phrase("little", limit=1)
+    assert (first.tolist(), total) == ([2], 2)
+
+    assert index.find_phrase("little money")[2] == 0
+    assert index.find_phrase("la baleine blanche")[0].tolist() == [5]
+
+
+def test_index_save_and_load(tmp_path):
+    index = BookIndex("2024-01-01T00:00:00")
+    index.add_segments(TEXTS)
+    index.save(index_path(tmp_path))
+
+    loaded = BookIndex.load(index_path(tmp_path))
+    assert (loaded.created_at, loaded.n_segments, loaded.n_tokens) == (index.created_at, 6, index.n_tokens)
+    assert loaded.find_phrase("the watery part")[0].tolist() == [4]
+
+
+def test_search_book_exact_and_substring(book):
+    [match] = search_book(book, "sail about")
+    assert (match.seg_start, match.seg_end, match.timestamp_start) == (3, 3, 30.0)
+
+    assert list(search_book(book, "ishm")) == []
+    [match] = search_book(book, "ishm", substring=True)
+    assert match.seg_start == 0
+
+
+def test_fuzzy_search_tolerates_misspellings_and_split_words(book):
+    [match] = search_book(book, "cal me ishmail", fuzzy=True)
+    assert match.seg_start == 0 and 0 < match.score < 1
+
+    [match] = search_book(book, "wat ery part of teh world", fuzzy=True)
+    assert match.seg_start == 4
+
+    [match] = search_book(book, "precisely having", fuzzy=True)
+    assert (match.seg_start, match.seg_end, match.score) == (1, 2, 1.0)
+
+    assert list(search_book(book, "harpoon the whale", fuzzy=True)) == []
+
+
+def _library(root) -> list:
+    """Three books: the phrase twice in four segments, twice in five, once in ten, and one without it."""
+    specs = {"Dense": (4, [0, 2]), "Mid": (5, [1, 4]), "Sparse": (10, [7]), "Silent": (3, [])}
+    books = []
+    for name, (count, hits) in specs.items():
+        texts = ["the white whale rose" if i in hits else f"{name.lower()} line {i}" for i in range(count)]
+        segments = [SegmentEntry(start=i * 10.0, end=i * 10.0 + 9.5, text=t) for i, t in enumerate(texts)]
+        sf = SegmentsFile(model="stub", audio_file="book.wav", created_at="2024-01-01T00:00:00", segments=segments)
+        (root / name).mkdir()
+        save_segments_file(sf, root / name / "segments.json")
+        books.append(root / name)
+    return books
+
+
+def test_search_library_merges_ranks_and_pages_across_books(tmp_path):
+    books = _library(tmp_path)
+    everything = [(m.book, m.seg_start) for m in search_library("white whale", books)[0]]
+    # Same score, so the denser book ranks first; then position within each book
+    assert everything == [("Dense", 0), ("Dense", 2), ("Mid", 1), ("Mid", 4), ("Sparse", 7)]
+
+    page, total = search_library("white whale", books, limit=2, offset=1)
+    assert total == 5
+    assert [(m.book, m.seg_start) for m in page] == everything[1:3]
+    page, total = search_library("white whale", books, limit=10, offset=4)
+    assert (total, [(m.book, m.seg_start) for m in page]) == (5, everything[4:])
+    assert search_library("white whale", books, limit=2, offset=5) == ([], 5)
+    assert search_library("narwhal", books) == ([], 0)
+
+
+def test_search_library_fans_out_over_threads(tmp_path):
+    books = _library(tmp_path)
+    threads = set()
+
+    def opener(path):
+        threads.add(threading.current_thread().name)
+        return open_book(path)
+
+    def results(**kwargs):
+        page, total = search_library("white whale", books, limit=3, opener=opener, **kwargs)
+        return [(m.book, m.seg_start, m.score) for m in page], total
+
+    alone = results(workers=1)
+    assert threads == {threading.current_thread().name}
+    threads.clear()
+    assert results() == alone
+    assert threads and threading.current_thread().name not in threads
+    with ThreadPoolExecutor(2, thread_name_prefix="shared") as pool:
+        assert results(executor=pool) == alone
+    assert any(name.startswith("shared") for name in threads)
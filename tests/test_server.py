@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from book_sync import server
+from book_sync.models import SegmentEntry, SegmentsFile
+from book_sync.search import Match, search_book
+from book_sync.segments import save_segments_file
+
+
+@pytest.fixture
+def book(tmp_path):
+    segments = [SegmentEntry(start=i * 10.0, end=i * 10.0 + 10, text=f"Line {i} of the book.") for i in range(50)]
+    save_segments_file(SegmentsFile("stub", "book.wav", "2024-01-01T00:00:00", segments), tmp_path / "segments.json")
+    return tmp_path
+
+
+def test_concurrent_misses_open_a_book_once(book, monkeypatch):
+    opened = []
+    open_book = server.open_book
+
+    def slow_open(path):
+        opened.append(threading.get_ident())
+        time.sleep(0.2)
+        return open_book(path)
+
+    monkeypatch.setattr(server, "open_book", slow_open)
+    cache = server.BookCache(1 << 20)
+    with ThreadPoolExecutor(8) as pool:
+        books = list(pool.map(lambda _: cache.get(book), range(8)))
+
+    assert len(opened) == 1
+    assert all(b is books[0] for b in books)
+    assert cache.get(book) is books[0]
+
+
+def test_failed_open_reaches_every_waiter_and_is_retried(book, monkeypatch):
+    def failing_open(path):
+        time.sleep(0.2)
+        raise FileNotFoundError(path)
+
+    monkeypatch.setattr(server, "open_book", failing_open)
+    cache = server.BookCache(1 << 20)
+    with ThreadPoolExecutor(4) as pool:
+        futures = [pool.submit(cache.get, book) for _ in range(4)]
+    for fut in futures:
+        assert isinstance(fut.exception(), FileNotFoundError)
+
+    monkeypatch.undo()
+    assert cache.get(book).segments[3].text == "Line 3 of the book."
+
+
+def test_searching_never_writes_to_the_book(book):
+    before = sorted(p.name for p in book.iterdir())
+    assert [m.seg_start for m in search_book(book, "line 7")] == [7]
+    assert next(search_book(book, "lin 7 of teh", fuzzy=True)).seg_start == 7
+    assert sorted(p.name for p in book.iterdir()) == before
+
+
+@pytest.fixture
+def search_server(book, monkeypatch):
+    """A search server over ``book``'s directory on an ephemeral port; yields its base URL."""
+    from http.server import ThreadingHTTPServer
+
+    monkeypatch.setattr(server, "transcribed_books", lambda filters=(): [book])
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), server._Handler)
+    httpd.cache = server.BookCache(1 << 20)
+    httpd.executor = ThreadPoolExecutor(2)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+        httpd.executor.shutdown()
+
+
+def test_search_response_is_one_json_document(search_server, monkeypatch):
+    import httpx
+
+    resp = httpx.get(f"{search_server}/search", params={"q": "of the book", "limit": 3, "offset": 1})
+    body = resp.json()
+    assert resp.status_code == 200
+    assert (body["query"], body["total"]) == ("of the book", 50)
+    assert [r["seg_start"] for r in body["results"]] == [1, 2, 3]
+    assert body["results"][0]["context"][1]["text"] == "Line 1 of the book."
+
+    def broken(self):
+        raise ValueError("unreadable segment")
+
+    monkeypatch.setattr(Match, "to_dict", broken)
+    resp = httpx.get(f"{search_server}/search", params={"q": "of the book"})
+    assert resp.status_code == 500 and resp.json() == {"error": "unreadable segment"}
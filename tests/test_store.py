@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import os
+from dataclasses import replace
+
+import numpy as np
+import pytest
+
+from book_sync import catalog, convert, store
+from book_sync.backends import StubBackend
+from book_sync.config import Settings
+from book_sync.models import State
+from book_sync.pipeline import load_state, run_stage
+from book_sync.wav import WavWriter
+
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    """A library of its own, whose "ffmpeg" turns any input into a minute of noise."""
+    data = tmp_path / "data"
+    for module in (catalog, store):
+        monkeypatch.setattr(module, "DATA_DIR", data)
+
+    def convert_to_wav(input_path, output_path, settings):
+        samples = np.random.default_rng(len(input_path.read_bytes())).integers(-300, 300, 60 * 16000, dtype=np.int16)
+        writer = WavWriter(output_path, settings.sample_rate)
+        writer.write(samples.tobytes())
+        return writer.close()
+
+    monkeypatch.setattr(convert, "convert_to_wav", convert_to_wav)
+    return data
+
+
+@pytest.fixture
+def transcriptions(monkeypatch):
+    calls = []
+    transcribe = StubBackend.transcribe
+
+    def counting(self, audio):
+        calls.append(len(audio))
+        return transcribe(self, audio)
+
+    monkeypatch.setattr(StubBackend, "transcribe", counting)
+    return calls
+
+
+def _settings() -> Settings:
+    return Settings(backend="stub", vad=False, workers=1, batch_size=1, chunk_seconds=100, checkpoint_seconds=0)
+
+
+def _process(library, name: str, url: str) -> tuple:
+    """Run a new book through every stage; returns its directory and the stages it ran."""
+    bdir = library / name
+    bdir.mkdir(parents=True)
+    catalog.record_feed(name, name, url, 60.0)
+    state, stages = State(), []
+    while state.stage != "done":
+        stages.append(state.stage)
+        run_stage(bdir, url, state, _settings())
+    assert load_state(bdir).stage == "done"
+    return bdir, stages
+
+
+def _publish(root, name: str, data: bytes) -> None:
+    (root / name).write_bytes(data)
+
+
+def test_a_second_book_with_the_same_url_links_the_audio_and_the_transcript(http_root, library, transcriptions):
+    server, base, root = http_root
+    _publish(root, "moby.mp3", os.urandom(100_000))
+
+    first, stages = _process(library, "Moby Dick", f"{base}/moby.mp3")
+    assert stages == ["downloading", "converting", "transcribing"]
+    assert len(transcriptions) == 1
+    digest = load_state(first).checksums["audio_original"]
+    assert os.path.samefile(first / "book.mp3", store.object_path(digest))
+    assert (store.transcript_path(digest, _settings()) / "cache.json").exists()
+
+    (root / "moby.mp3").unlink()  # a second download would fail
+    second, stages = _process(library, "Moby Dick (another feed)", f"{base}/moby.mp3")
+
+    assert stages == ["downloading", "converting"]  # the cached transcript finishes it before conversion
+    assert len(transcriptions) == 1
+    assert os.path.samefile(second / "book.mp3", first / "book.mp3")
+    for name in ("segments.json", "segments.bin", "transcript.txt", "index.bin", "trigrams.bin"):
+        assert os.path.samefile(second / name, first / name), name
+    assert not (second / "book.wav").exists()
+    state = load_state(second)
+    assert (state.checksums["audio_original"], state.last_segment) == (digest, load_state(first).last_segment)
+
+
+def test_identical_audio_from_another_url_is_stored_once(http_root, library, transcriptions):
+    server, base, root = http_root
+    audio = os.urandom(100_000)
+    _publish(root, "a.mp3", audio)
+    _publish(root, "b.mp3", audio)
+
+    first, _ = _process(library, "Walden", f"{base}/a.mp3")
+    second, stages = _process(library, "Walden (mirror)", f"{base}/b.mp3")
+
+    assert stages == ["downloading", "converting"]  # downloaded, then matched by checksum
+    assert len(transcriptions) == 1
+    assert os.path.samefile(second / "book.mp3", first / "book.mp3")
+    assert os.path.samefile(second / "segments.json", first / "segments.json")
+    assert (second / "book.mp3").stat().st_nlink == 3  # two books and the store object
+
+
+def test_a_different_model_transcribes_again(http_root, library, transcriptions):
+    server, base, root = http_root
+    _publish(root, "a.mp3", os.urandom(100_000))
+    _process(library, "Walden", f"{base}/a.mp3")
+
+    bdir = library / "Walden (large)"
+    bdir.mkdir()
+    catalog.record_feed(bdir.name, bdir.name, f"{base}/a.mp3", 60.0)
+    state = State()
+    settings = replace(_settings(), model="another-model")
+    while state.stage != "done":
+        run_stage(bdir, f"{base}/a.mp3", state, settings)
+    assert len(transcriptions) == 2
+    assert not os.path.samefile(bdir / "segments.json", library / "Walden" / "segments.json")
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import json
+
+import numpy as np
+import pytest
+
+from book_sync.backends import StubBackend
+from book_sync.config import Settings
+from book_sync.journal import journal_path, read_journal
+from book_sync.mel import WINDOW_SECONDS
+from book_sync.transcribe import _batch_windows, _transcribe_batched, transcribe_audio
+from book_sync.wav import WavWriter
+
+DURATION = 300.0
+
+
+@pytest.fixture
+def book(tmp_path):
+    """A book directory holding five minutes of quiet noise as book.wav."""
+    settings = _settings()
+    samples = np.random.default_rng(0).integers(-300, 300, int(DURATION * settings.sample_rate), dtype=np.int16)
+    writer = WavWriter(tmp_path / "book.wav", settings.sample_rate)
+    writer.write(samples.tobytes())
+    writer.close()
+    return tmp_path
+
+
+def _settings(**overrides) -> Settings:
+    options = {"backend": "stub", "vad": False, "workers": 1, "batch_size": 1, "chunk_seconds": 100, "checkpoint_seconds": 0}
+    return Settings(**{**options, **overrides})
+
+
+def test_chunks_cover_the_book_in_order(book, capsys):
+    sf = transcribe_audio(book / "book.wav", book, _settings())
+
+    assert "Chunk 3/3" in capsys.readouterr().out
+    assert [s.start for s in sf.segments] == [float(t) for t in range(0, 300, 10)]
+    assert [s.end for s in sf.segments] == [float(t) for t in range(10, 310, 10)]
+    # The stub's times are chunk-relative; the transcript's are absolute
+    assert sf.segments[10].text == "Segment at 0.00 seconds."
+    assert sf.transcribed_until == DURATION
+    assert not journal_path(book / "segments.json").exists()
+    assert len(json.loads((book / "segments.json").read_text())["segments"]) == 30
+
+
+def test_checkpoint_interval_caps_the_chunk_length(book):
+    reached = []
+    sf = transcribe_audio(book / "book.wav", book, _settings(checkpoint_seconds=60), reached.append)
+
+    assert reached == [60.0, 120.0, 180.0, 240.0, 300.0]
+    assert sf.segments[6].start == 60.0 and sf.segments[6].text == "Segment at 0.00 seconds."
+
+
+def test_resume_from_the_journal_after_a_crash(book, monkeypatch, capsys):
+    transcribe = StubBackend.transcribe
+    calls = []
+
+    def crash_on_second_chunk(self, audio):
+        calls.append(len(audio))
+        if len(calls) == 2:
+            raise RuntimeError("crash")
+        return transcribe(self, audio)
+
+    monkeypatch.setattr(StubBackend, "transcribe", crash_on_second_chunk)
+    with pytest.raises(RuntimeError):
+        transcribe_audio(book / "book.wav", book, _settings())
+
+    journal = journal_path(book / "segments.json")
+    header, entries, _ = read_journal(journal)
+    assert header["base_segments"] == 0
+    assert [e["transcribed_until"] for e in entries if "transcribed_until" in e] == [100.0]
+    assert not (book / "segments.json").exists()
+
+    monkeypatch.setattr(StubBackend, "transcribe", transcribe)
+    capsys.readouterr()
+    sf = transcribe_audio(book / "book.wav", book, _settings())
+
+    assert "Resuming transcription from 00:01:40 (10 segments)" in capsys.readouterr().out
+    assert [s.start for s in sf.segments] == [float(t) for t in range(0, 300, 10)]
+    assert sf.transcribed_until == DURATION
+    assert not journal.exists()
+
+
+def test_index_is_saved_once_at_the_end(book):
+    from book_sync.index import index_path, load_index
+    from book_sync.search import search_book
+
+    seen = []
+
+    def checkpoint(until: float) -> None:
+        seen.append(index_path(book).exists())
+        # Mid-transcription searches index the journalled segments in memory
+        assert [m.seg_start for m in search_book(book, "segment at 0.00")] == list(range(0, len(seen) * 10, 10))
+
+    sf = transcribe_audio(book / "book.wav", book, _settings(), checkpoint)
+
+    assert seen == [False, False, False]
+    assert load_index(book, sf.created_at, len(sf.segments)).n_segments == 30
+
+
+class _Fingerprint(StubBackend):
+    """One segment per call, naming the exact samples it was given."""
+
+    def transcribe(self, audio):
+        return [{"start": 0.0, "end": len(audio) / self.sample_rate, "text": f"{len(audio)} {audio.sum():.3f}"}]
+
+    def transcribe_batch(self, windows, durations):
+        assert windows.shape == (len(durations), WINDOW_SECONDS * self.sample_rate)
+        # Windows arrive padded to 30 s; durations must trim the padding off again
+        return super().transcribe_batch(windows, durations)
+
+
+def test_batched_windows_match_decoding_each_window_alone():
+    settings = _settings()
+    sr = settings.sample_rate
+    rng = np.random.default_rng(0)
+    audio = (0.1 * rng.standard_normal(int(100.5 * sr))).astype(np.float32)
+    bounds = _batch_windows(audio, sr)
+    assert len(bounds) == 4 and bounds[-1][1] - bounds[-1][0] < WINDOW_SECONDS * sr
+
+    one_by_one = _Fingerprint(settings)
+    expected = [
+        {**seg, "start": lo / sr + seg["start"], "end": lo / sr + seg["end"]}
+        for lo, hi in bounds
+        for seg in one_by_one.transcribe(audio[lo:hi])
+    ]
+    for batch_size in (3, 8):  # a short last batch, and everything in one call
+        batched = _transcribe_batched(_Fingerprint(_settings(batch_size=batch_size)), audio, sr)
+        assert batched == expected
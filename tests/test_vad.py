@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from book_sync.vad import HANGOVER_SECONDS, VoiceActivity
+
+SR = 16000
+PAD = HANGOVER_SECONDS + 0.03  # hangover plus a frame of rounding
+
+
+def _audio(*parts: tuple[float, float]) -> np.ndarray:
+    """Concatenated ``(seconds, amplitude)`` parts of a 220 Hz tone; amplitude 0 is silence."""
+    out = []
+    for seconds, amplitude in parts:
+        t = np.arange(int(seconds * SR)) / SR
+        out.append(amplitude * 32767 * np.sin(2 * np.pi * 220 * t))
+    return np.concatenate(out).astype(np.int16)
+
+
+def _length(chunk: list[tuple[float, float]]) -> float:
+    return sum(e - s for s, e in chunk)
+
+
+def test_long_silences_are_dropped_and_short_ones_bridged():
+    vad = VoiceActivity(_audio((10, 0.3), (5, 0), (5, 0.3), (1, 0), (9, 0.3)), SR)
+
+    [chunk] = vad.plan(target_seconds=100, skip_silence=3)
+    (s1, e1), (s2, e2) = chunk
+    assert s1 == 0
+    assert e1 == pytest.approx(10, abs=PAD)
+    assert s2 == pytest.approx(15, abs=PAD)
+    assert e2 == pytest.approx(30, abs=PAD)  # across the one-second pause
+    # Nothing in the long silence is transcribed
+    assert e1 < 10 + PAD and s2 > 15 - PAD
+
+
+def test_silence_shorter_than_skip_silence_is_kept():
+    vad = VoiceActivity(_audio((10, 0.3), (5, 0), (10, 0.3)), SR)
+    assert vad.plan(target_seconds=100, skip_silence=6) == [[(0.0, pytest.approx(25, abs=0.03))]]
+
+
+def test_chunks_are_capped_and_cut_at_the_quietest_frame():
+    # 90 s of speech with one near-silent dip at 40 s, quiet but still above the speech threshold
+    vad = VoiceActivity(_audio((40, 0.3), (0.5, 0.01), (49.5, 0.3)), SR)
+    assert vad.speech.all()
+
+    chunks = vad.plan(target_seconds=50, skip_silence=3)
+    assert all(_length(c) <= 50 for c in chunks)
+    assert sum(_length(c) for c in chunks) == pytest.approx(90, abs=0.03)
+    cut = chunks[0][-1][1]
+    assert 40 <= cut <= 40.5
+    assert chunks[1][0][0] == cut  # the next chunk picks up exactly where this one stops
+    assert vad.quietest_point(25, 50) == cut
+
+
+def test_continuous_speech_is_cut_within_the_search_window():
+    vad = VoiceActivity(_audio((130, 0.3)), SR)
+    chunks = vad.plan(target_seconds=60, skip_silence=3)
+    assert all(len(c) == 1 for c in chunks)
+    spans = [c[0] for c in chunks]
+    for (s, e), (next_s, _) in zip(spans, spans[1:]):
+        assert s + 30 - 0.03 <= e <= s + 60  # in the last CUT_SEARCH_SECONDS before the limit, to a frame
+        assert next_s == e
+    assert (spans[0][0], spans[-1][1]) == (0, pytest.approx(130, abs=0.03))
+
+
+def test_times_are_shifted_to_book_time():
+    samples = _audio((10, 0.3), (5, 0), (10, 0.3), (0.5, 0.01), (20, 0.3))
+    local = VoiceActivity(samples, SR)
+    book = VoiceActivity(samples, SR, offset=1000.0)
+
+    assert book.duration == local.duration
+    assert book.spans(3) == [(s + 1000, e + 1000) for s, e in local.spans(3)]
+    assert book.quietest_point(1020, 1030) == pytest.approx(local.quietest_point(20, 30) + 1000)
+    shifted = [[(s + 1000, e + 1000) for s, e in c] for c in local.plan(20, 3)]
+    assert book.plan(20, 3) == [[(pytest.approx(s), pytest.approx(e)) for s, e in c] for c in shifted]
+
+
+def test_plan_skips_audio_before_start():
+    vad = VoiceActivity(_audio((10, 0.3), (5, 0), (10, 0.3)), SR, offset=100.0)
+    assert vad.plan(100, 3, start=112)[0][0][0] == pytest.approx(115 - HANGOVER_SECONDS, abs=0.03)
+    assert vad.plan(100, 3, start=117) == [[(117, pytest.approx(125, abs=0.03))]]
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import asyncio
+import errno
+import sqlite3
+
+import httpx
+
+from book_sync import catalog, watch
+from book_sync.config import Settings
+from book_sync.models import WatchedFeed
+
+FEED = """<?xml version="1.0"?>
+<rss version="2.0"><channel>
+  <title>{title}</title>
+  <item>
+    <title>Chapter 1</title><guid>{title}-ch1</guid>
+    <enclosure url="http://example.com/{title}/ch1.mp3" type="audio/mpeg" length="1"/>
+  </item>
+</channel></rss>
+"""
+FEEDS = {"http://feeds.test/a.xml": "Feed A", "http://feeds.test/b.xml": "Feed B"}
+
+
+def _feed_server(request: httpx.Request) -> httpx.Response:
+    etag = f'"{request.url.path}"'
+    if request.headers.get("if-none-match") == etag:
+        return httpx.Response(304)
+    return httpx.Response(200, text=FEED.format(title=FEEDS[str(request.url)]), headers={"ETag": etag})
+
+
+def _poll_all(feeds) -> int:
+    """Poll every feed once, as ``watch --once`` does; return how many times new books were announced."""
+    announced = []
+
+    async def poll() -> None:
+        limit = asyncio.Semaphore(watch.MAX_CONCURRENT_POLLS)
+        async with httpx.AsyncClient(transport=httpx.MockTransport(_feed_server)) as client:
+            await asyncio.gather(*(watch._poll_once(client, f, limit, lambda: announced.append(1)) for f in feeds))
+
+    asyncio.run(poll())
+    return len(announced)
+
+
+def _watched() -> list:
+    return sorted((f for f in catalog.watched_feeds() if f.url in FEEDS), key=lambda f: f.url)
+
+
+def test_a_failed_save_leaves_other_feeds_polling_and_is_retried(monkeypatch):
+    for url in FEEDS:
+        catalog.watch_feed(url, 60.0)
+    saved = []
+    disk_full = True
+
+    def save_feed_json(info):
+        if disk_full and info.title.startswith("Feed A"):
+            raise OSError(errno.ENOSPC, "No space left on device")
+        saved.append(info.title)
+
+    monkeypatch.setattr(watch, "save_feed_json", save_feed_json)
+
+    assert _poll_all(_watched()) == 1
+    assert saved == ["Feed B"]
+    a, b = _watched()
+    assert (a.known, a.etag) == ([], None)  # not marked known, and refetched in full next time
+    assert (b.known, b.etag) == (["Feed B-ch1"], '"/b.xml"')
+    assert a.checked_at and b.checked_at
+
+    disk_full = False
+    assert _poll_all(_watched()) == 1
+    assert saved == ["Feed B", "Feed A"]  # feed B answered 304
+    assert [f.known for f in _watched()] == [["Feed A-ch1"], ["Feed B-ch1"]]
+
+
+def test_a_failed_poll_record_leaves_other_feeds_polling(monkeypatch):
+    record_poll = catalog.record_poll
+    recorded = []
+
+    def flaky_record_poll(feed):
+        if feed.url.endswith("a.xml"):
+            raise sqlite3.OperationalError("database is locked")
+        record_poll(feed)
+        recorded.append(feed.url)
+
+    monkeypatch.setattr(watch, "save_feed_json", lambda info: None)
+    monkeypatch.setattr(catalog, "record_poll", flaky_record_poll)
+    feeds = [WatchedFeed(url, 60.0) for url in FEEDS]
+    _poll_all(feeds)
+    assert recorded == ["http://feeds.test/b.xml"]
+    assert [f.failures for f in feeds] == [0, 0]
+
+
+def test_the_queue_survives_a_failed_schedule(monkeypatch):
+    runs = []
+
+    def run_schedule(titles, settings):
+        runs.append(titles)
+        if len(runs) == 1:
+            raise RuntimeError("ffmpeg failed")
+
+    monkeypatch.setattr(watch, "run_schedule", run_schedule)
+
+    async def main() -> None:
+        pending = asyncio.Event()
+        task = asyncio.create_task(watch._process_queue(pending, Settings()))
+        for run in (1, 2):
+            pending.set()
+            while len(runs) < run:
+                await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+        assert not task.done()
+        task.cancel()
+
+    asyncio.run(asyncio.wait_for(main(), 5))
+    assert len(runs) == 2
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import os
+import struct
+
+import numpy as np
+
+from book_sync.utils import HASH_BLOCK_SIZE, checksum_file
+from book_sync.wav import (
+    MAX_CHUNK_SIZE, SAMPLE_WIDTH, WAV_HEADER_SIZE, WavRangeWriter, WavReader, WavWriter, finish_wav, wav_header,
+)
+
+SAMPLE_RATE = 16000
+OVER_4GIB = 5 << 30  # about 47 h at 16 kHz
+
+
+def _sizes(header: bytes) -> tuple[int, int]:
+    riff_size, = struct.unpack_from("<I", header, 4)
+    data_size, = struct.unpack_from("<I", header, 40)
+    return riff_size, data_size
+
+
+def _read_header(path) -> bytes:
+    with open(path, "rb") as f:
+        return f.read(WAV_HEADER_SIZE)
+
+
+def test_header_sizes():
+    header = wav_header(1000, SAMPLE_RATE)
+    assert len(header) == WAV_HEADER_SIZE
+    assert _sizes(header) == (1036, 1000)
+
+
+def test_header_clamps_sizes_over_4gib():
+    header = wav_header(OVER_4GIB, SAMPLE_RATE)
+    assert len(header) == WAV_HEADER_SIZE
+    assert _sizes(header) == (MAX_CHUNK_SIZE, MAX_CHUNK_SIZE)
+
+
+def test_writer_closes_a_book_over_4gib(tmp_path):
+    path = tmp_path / "book.wav"
+    writer = WavWriter(path, SAMPLE_RATE)
+    writer.write(np.arange(100, dtype="<i2").tobytes())
+    writer.data_size = OVER_4GIB  # as if the rest of a long decode had been written
+    digest = writer.close()
+
+    assert _sizes(_read_header(path)) == (MAX_CHUNK_SIZE, MAX_CHUNK_SIZE)
+    assert digest == checksum_file(path)
+
+
+def test_reader_takes_a_clamped_size_from_the_file(tmp_path):
+    path = tmp_path / "book.wav"
+    path.write_bytes(wav_header(OVER_4GIB, SAMPLE_RATE))
+    os.truncate(path, WAV_HEADER_SIZE + OVER_4GIB)  # sparse, so nothing is written
+    with open(path, "r+b") as f:
+        f.seek(-SAMPLE_RATE * 2, os.SEEK_END)
+        f.write(np.full(SAMPLE_RATE, 7, dtype="<i2").tobytes())
+
+    with WavReader(path) as wav:
+        assert len(wav.samples) == OVER_4GIB // 2
+        assert wav.duration == OVER_4GIB / 2 / SAMPLE_RATE
+        assert (wav.slice(wav.duration - 1, wav.duration) == 7).all()
+
+
+def test_ranges_finish_a_book_over_4gib(tmp_path):
+    path = tmp_path / "book.wav"
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT)
+    split = ((OVER_4GIB // HASH_BLOCK_SIZE) * HASH_BLOCK_SIZE - WAV_HEADER_SIZE) // SAMPLE_WIDTH
+    first, last = WavRangeWriter(fd, 0), WavRangeWriter(fd, split)
+    first.write(np.full(100, 3, dtype="<i2").tobytes())
+    first.size = split * SAMPLE_WIDTH  # as if the first range had been decoded in full
+    last.write(np.full(SAMPLE_RATE, 7, dtype="<i2").tobytes())
+    try:
+        finish_wav(fd, SAMPLE_RATE, [first, last])
+    finally:
+        os.close(fd)
+
+    assert _sizes(_read_header(path)) == (MAX_CHUNK_SIZE, MAX_CHUNK_SIZE)
+    with WavReader(path) as wav:
+        assert len(wav.samples) == split + SAMPLE_RATE
+        assert (wav.samples[:100] == 3).all()
+        assert (wav.samples[split:] == 7).all()
+
+
+def test_reader_reads_rf64(tmp_path):
+    samples = np.arange(-50, 50, dtype="<i2")
+    pcm = samples.tobytes()
+    fmt = struct.pack("<HHIIHH", 1, 1, SAMPLE_RATE, SAMPLE_RATE * 2, 2, 16)
+    ds64 = struct.pack("<QQQI", 4 + 36 + 8 + 16 + 8 + len(pcm), len(pcm), len(samples), 0)
+    path = tmp_path / "book.wav"
+    path.write_bytes(
+        b"RF64" + struct.pack("<I", MAX_CHUNK_SIZE) + b"WAVE"
+        + b"ds64" + struct.pack("<I", len(ds64)) + ds64
+        + b"fmt " + struct.pack("<I", len(fmt)) + fmt
+        + b"data" + struct.pack("<I", MAX_CHUNK_SIZE) + pcm
+        + b"LIST" + struct.pack("<I", 4) + b"INFO"  # trailing chunk the ds64 size excludes
+    )
+
+    with WavReader(path) as wav:
+        assert wav.samples.tolist() == samples.tolist()
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import os
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from book_sync import worker
+from book_sync.config import Settings
+from book_sync.transcribe import transcribe_audio
+from book_sync.wav import WavWriter
+
+ROOT = Path(__file__).resolve().parent.parent
+START_WORKER = (
+    "from book_sync.config import Settings; from book_sync.worker import run_worker; "
+    "run_worker(Settings(backend='stub', worker_max_jobs=2), 1)"
+)
+
+
+@pytest.fixture
+def data_dir(tmp_path_factory):
+    # Unix socket paths are short; keep this one well under the limit
+    return tmp_path_factory.mktemp("w")
+
+
+def _env(data_dir: Path) -> dict[str, str]:
+    return {**os.environ, "BOOK_SYNC_DATA": str(data_dir), "PYTHONPATH": str(ROOT)}
+
+
+def _settings(data_dir: Path, **overrides) -> Settings:
+    options = {"backend": "stub", "vad": False, "chunk_seconds": 100, "checkpoint_seconds": 0}
+    return Settings(worker_socket=str(data_dir / worker.SOCKET_NAME), **{**options, **overrides})
+
+
+def _start(data_dir: Path) -> subprocess.Popen:
+    proc = subprocess.Popen([sys.executable, "-c", START_WORKER], cwd=ROOT, env=_env(data_dir), stdout=subprocess.PIPE)
+    deadline = time.monotonic() + 60
+    while worker.connect(_settings(data_dir)) is None:
+        assert proc.poll() is None, "worker exited while starting"
+        assert time.monotonic() < deadline, "worker did not start"
+        time.sleep(0.1)
+    return proc
+
+
+def _cli(data_dir: Path, *args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, "cli.py", "worker", *args], cwd=ROOT, env=_env(data_dir), capture_output=True, text=True
+    )
+
+
+def _book(path: Path, seconds: float = 300.0) -> Path:
+    path.mkdir()
+    samples = np.random.default_rng(0).integers(-300, 300, int(seconds * 16000), dtype=np.int16)
+    writer = WavWriter(path / "book.wav", 16000)
+    writer.write(samples.tobytes())
+    writer.close()
+    return path
+
+
+def test_transcribe_through_the_worker_then_stop_it(data_dir, tmp_path, capsys):
+    proc = _start(data_dir)
+    try:
+        status = _cli(data_dir, "--status")
+        assert status.returncode == 0
+        assert f"on {data_dir / worker.SOCKET_NAME}" in status.stdout
+        assert "stub" in status.stdout
+
+        book = _book(tmp_path / "book")
+        sf = transcribe_audio(book / "book.wav", book, _settings(data_dir, model_worker=True))
+        assert "Transcribing with the model worker" in capsys.readouterr().out
+        local = tmp_path / "local"
+        local.mkdir()
+        (local / "book.wav").symlink_to(book / "book.wav")
+        expected = transcribe_audio(local / "book.wav", local, _settings(data_dir, workers=1))
+        assert [(s.start, s.end, s.text) for s in sf.segments] == [(s.start, s.end, s.text) for s in expected.segments]
+
+        health = worker.worker_health(_settings(data_dir))
+        assert (health["jobs"], health["failed"]) == (3, 0)
+        assert health["restarts"] == 1  # recycled after worker_max_jobs=2 chunks
+        assert health["processes"][0]["state"] in ("loading", "ready")
+
+        stop = _cli(data_dir, "--stop")
+        assert (stop.returncode, stop.stdout.strip()) == (0, "Model worker stopping")
+        assert proc.wait(30) == 0
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+
+    assert not (data_dir / worker.SOCKET_NAME).exists()
+    assert not (data_dir / (worker.SOCKET_NAME + ".key")).exists()
+    status = _cli(data_dir, "--status")
+    assert (status.returncode, status.stdout.strip()) == (1, "No model worker running")
+    assert _cli(data_dir, "--stop").returncode == 1
+
+
+def test_a_stale_socket_is_replaced(data_dir):
+    proc = _start(data_dir)
+    proc.send_signal(signal.SIGKILL)  # no cleanup: the socket and key file stay behind
+    proc.wait()
+    assert (data_dir / worker.SOCKET_NAME).exists()
+    assert worker.connect(_settings(data_dir)) is None
+    assert _cli(data_dir, "--status").returncode == 1
+
+    proc = _start(data_dir)
+    try:
+        assert worker.worker_health(_settings(data_dir))["pid"] == proc.pid
+        with pytest.raises(RuntimeError, match="already running"):
+            worker.run_worker(_settings(data_dir), 1)
+    finally:
+        assert worker.stop_worker(_settings(data_dir))
+        proc.wait(30)